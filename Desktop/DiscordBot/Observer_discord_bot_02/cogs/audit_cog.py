@@ -1,26 +1,121 @@
 # cogs/audit_cog.py
+import re
+import time
 import discord
 from discord.ext import commands
 from config_manager import ConfigManager  # ConfigManager を import
+from utils.message_cache import MessageCache
+from utils.audit_batcher import AuditBurstBatcher
+from utils.audit_store import AuditStore
+from utils.attachment_archive import AttachmentArchive, ARCHIVE_ENABLED
+
+SEARCH_PAGE_SIZE = 10
+SEARCH_TIMEOUT_SECONDS = 300
+USER_ARG = re.compile(r"<@!?(\d+)>|(\d+)")
+
+
+class AuditSearchView(discord.ui.View):
+    """監査ログ検索の結果をページ送りする（前後ページは (at, id) カーソルで引く）"""
+
+    def __init__(self, store: AuditStore, author_id: int, filters: dict, label: str, first_page: list):
+        super().__init__(timeout=SEARCH_TIMEOUT_SECONDS)
+        self.store = store
+        self.author_id = author_id
+        self.filters = filters
+        self.label = label
+        self.rows = first_page
+        self.cursors = [None]   # 各ページの開始カーソル（戻る用）
+        self._sync_buttons()
+
+    def _sync_buttons(self):
+        self.prev_page.disabled = len(self.cursors) <= 1
+        self.next_page.disabled = len(self.rows) < SEARCH_PAGE_SIZE
+
+    def embed(self) -> discord.Embed:
+        lines = []
+        for _, kind, user_id, channel_id, at, summary in self.rows:
+            where = f" <#{channel_id}>" if channel_id else ""
+            lines.append(f"<t:{int(at)}:f> `{kind}`{where} {summary[:150]}")
+        embed = discord.Embed(
+            title="🔎 監査ログ検索",
+            description="\n".join(lines) or "該当なし",
+            color=0x5865F2,
+        )
+        embed.set_footer(text=f"ページ {len(self.cursors)} ・ 条件: {self.label}")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ 検索した本人だけが操作できます。", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, cursor):
+        self.rows = await self.store.query(**self.filters, cursor=cursor, limit=SEARCH_PAGE_SIZE)
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.pop()
+        await self._show(interaction, self.cursors[-1])
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        last = self.rows[-1]
+        cursor = (last[4], last[0])
+        self.cursors.append(cursor)
+        await self._show(interaction, cursor)
+
 
 class AuditCog(commands.Cog):
     def __init__(self, bot: commands.Bot, config_manager: ConfigManager):
         self.bot = bot
         self.config_manager = config_manager
-        # {message_id: {"content": str, "author": str, "attachments": [{"url": str, "type": str}]}}
-        self.message_cache = {}
+        # メモリ予算・TTL 付きのキャッシュ（あふれた分は SQLite に退避）
+        self.message_cache = MessageCache()
+        # 参加・退出・BAN などの連発は種別ごとに要約して送る
+        self.bursts = AuditBurstBatcher(lambda channel, embeds: self.bot.send_scheduler.send(channel, embeds=embeds))
+        # 全イベントを検索できるよう SQLite に残す
+        self.store = AuditStore()
+        # 有効なら添付を投稿時に保存し、削除ログで再アップロードする
+        self.archive = AttachmentArchive() if ARCHIVE_ENABLED else None
+        bot.router.register("audit", self.route_channels, self.on_routed_message)
+
+    async def cog_unload(self):
+        self.bot.router.unregister("audit")
+        self.bursts.close()
+        await self.message_cache.close()
+        await self.store.close()
+        if self.archive:
+            await self.archive.close()
 
     # ---------- 監査ログ送信 ----------
     async def send_audit_embed(
-        self, title: str, description: str, fields=None, color=0x00ff00, guild: discord.Guild = None
+        self, title: str, description: str, fields=None, color=0x00ff00, guild: discord.Guild = None, dedup_key: str = None,
+        image_url: str = None, event: str = None, line: str = None, coalesce: bool = True,
+        user_id: int = None, channel_id: int = None, files: list = None,
     ):
+        """dedup_key を渡すと、同じキーの監査ログは1回しか送らない（再接続時の再送対策）
+        event（イベント種別）を渡すとイベントストアに記録し、coalesce なら
+        連発したときに line を並べた要約へまとめられる
+        files（(パス, ファイル名) のリスト）は添付して送る（この場合は要約にまとめない）
+        """
         if not guild:
             return
+        if dedup_key and self.bot.dedup.seen(f"audit:{guild.id}:{dedup_key}"):
+            return
 
         server_config = self.config_manager.get_server_config(guild.id)
         if not server_config:
             return
 
+        if event:
+            self.store.record(
+                guild.id, event, line or description, user_id=user_id, channel_id=channel_id,
+                detail={"title": title, "description": description, "fields": [(n, v) for n, v, _ in fields or []]},
+            )
+
         audit_channel_id = server_config.get("AUDIT_LOG_CHANNEL")
         if not audit_channel_id:
             return
@@ -38,78 +133,190 @@ class AuditCog(commands.Cog):
         if fields:
             for name, value, inline in fields:
                 embed.add_field(name=name, value=value, inline=inline)
+        if image_url:
+            embed.set_image(url=image_url)
 
-        await channel.send(embed=embed)
+        # 送信先ごとのキューに積むだけで、レート制限の待ちはイベント処理を止めない
+        if files:
+            self.bot.send_scheduler.send(
+                channel, embed=embed, files=[discord.File(path, filename=filename) for path, filename in files],
+            )
+        elif event and coalesce:
+            self.bursts.submit(channel, guild.id, event, embed, line or description)
+        else:
+            self.bot.send_scheduler.send(channel, embed=embed)
 
     # ---------- メッセージをキャッシュ ----------
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if not message.guild:
-            return
+    def route_channels(self, guild_id: int) -> set:
+        """MONITORED_CHANNELS のメッセージだけを MessageRouter から受け取る"""
+        server_config = self.config_manager.get_server_config(guild_id)
+        return set(server_config.get("MONITORED_CHANNELS", [])) if server_config else set()
 
-        server_config = self.config_manager.get_server_config(message.guild.id)
-        if not server_config:
-            return
-
-        monitored_channels = server_config.get("MONITORED_CHANNELS", [])
-        if message.channel.id not in monitored_channels:
-            return
-
-        self.message_cache[message.id] = {
-            "content": message.content,
-            "author": message.author.display_name,
-            "attachments": [
-                {"url": a.url, "type": a.content_type} for a in message.attachments
-            ],
-        }
+    async def on_routed_message(self, message: discord.Message):
+        self.message_cache.put(message)
+        if self.archive and message.attachments:
+            self.archive.submit(message)
 
     # ---------- メッセージ削除 ----------
+    # discord.py 内部のメッセージキャッシュに無い古いメッセージでも拾えるよう raw イベントを使う
     @commands.Cog.listener()
-    async def on_message_delete(self, message: discord.Message):
-        if not message.guild:
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        guild = self.bot.get_guild(payload.guild_id) if payload.guild_id else None
+        if not guild:
             return
 
-        info = self.message_cache.get(message.id)
-        if not info:
+        record = await self.message_cache.pop(payload.message_id)
+        if not record:
             return  # キャッシュにない場合は諦める
 
-        images = [a["url"] for a in info["attachments"] if a["type"] and a["type"].startswith("image/")]
-        videos = [a["url"] for a in info["attachments"] if a["type"] and a["type"].startswith("video/")]
-        others = [a["url"] for a in info["attachments"] if not (a["type"] and (a["type"].startswith("image/") or a["type"].startswith("video/")))]
+        # 保存済みの添付は再アップロードする（送信先の上限・10件に収まる分だけ）
+        archived = await self.archive.restore(payload.message_id) if self.archive else {}
+        files = []
+        uploaded = set()
+        total = 0
+        image_url = None
+        for url, (path, filename, kind, size) in archived.items():
+            if len(files) >= 10 or total + size > guild.filesize_limit:
+                continue
+            filename = f"{len(files)}_{filename}"
+            files.append((path, filename))
+            uploaded.add(url)
+            total += size
+            if image_url is None and kind and kind.startswith("image/"):
+                image_url = f"attachment://{filename}"
+        remaining = [(url, kind) for url, kind in record.attachments if url not in uploaded]
 
-        embed = discord.Embed(
-            title="🗑 メッセージ削除",
-            description=f"{info['author']} のメッセージが削除されました",
-            color=0xFF4500,
-            timestamp=discord.utils.utcnow(),
-        )
+        images = [url for url, kind in remaining if kind and kind.startswith("image/")]
+        videos = [url for url, kind in remaining if kind and kind.startswith("video/")]
+        others = [url for url, kind in remaining if not (kind and (kind.startswith("image/") or kind.startswith("video/")))]
+        if image_url is None and images:
+            image_url = images.pop(0)
 
-        embed.add_field(name="内容", value=info["content"] or "なし", inline=False)
+        fields = [("内容", record.content[:1024] or "なし", False)]
+        if files:
+            fields.append(("保存済み添付", f"{len(files)}件を再アップロード", False))
         if images:
-            embed.set_image(url=images[0])
-        if len(images) > 1:
-            embed.add_field(name="添付画像(残り)", value="\n".join(images[1:]), inline=False)
+            fields.append(("添付画像(残り)", "\n".join(images)[:1024], False))
         if videos:
-            embed.add_field(name="添付動画", value="\n".join(videos), inline=False)
+            fields.append(("添付動画", "\n".join(videos)[:1024], False))
         if others:
-            embed.add_field(name="その他添付", value="\n".join(others), inline=False)
+            fields.append(("その他添付", "\n".join(others)[:1024], False))
 
         await self.send_audit_embed(
             title="🗑 メッセージ削除",
-            description=f"{info['author']} のメッセージが削除されました",
-            guild=message.guild,
-            fields=[],
-            color=0xFF4500
+            description=f"{record.author} のメッセージが削除されました（<#{record.channel_id}>）",
+            guild=guild,
+            fields=fields,
+            color=0xFF4500,
+            dedup_key=f"delete:{payload.message_id}",
+            image_url=image_url,
+            files=files,
+            event="delete",
+            user_id=record.author_id,
+            channel_id=record.channel_id,
+            line=f"**{record.author}** <#{record.channel_id}>: {record.content[:100] or '（本文なし）'}",
+        )
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        guild = self.bot.get_guild(payload.guild_id) if payload.guild_id else None
+        if not guild:
+            return
+
+        # 一括削除は最大100件 → キャッシュ・ディスクともまとめて1回で引く
+        records = await self.message_cache.pop_many(sorted(payload.message_ids))
+        if not records:
+            return
+        # 一括削除でも1件ずつ記録して、投稿者で検索できるようにする
+        for record in records.values():
+            self.store.record(
+                guild.id, "delete", f"{record.author}: {record.content[:200]}",
+                user_id=record.author_id, channel_id=record.channel_id,
+                detail={"content": record.content, "attachments": record.attachments, "bulk": True},
+            )
+        lines = []
+        length = 0
+        for record in records.values():
+            line = f"**{record.author}**: {record.content[:200] or '（本文なし）'}"
+            if record.attachments:
+                line += f" 📎{len(record.attachments)}"
+            if length + len(line) + 1 > 4000:
+                lines.append(f"…ほか {len(records) - len(lines)} 件")
+                break
+            lines.append(line)
+            length += len(line) + 1
+
+        await self.send_audit_embed(
+            title=f"🗑 メッセージ一括削除（{len(payload.message_ids)}件）",
+            description="\n".join(lines),
+            guild=guild,
+            fields=[("チャンネル", f"<#{payload.channel_id}>", True), ("復元できた件数", len(records), True)],
+            color=0xFF4500,
+            dedup_key=f"bulk_delete:{min(payload.message_ids)}:{len(payload.message_ids)}",
+            event="bulk_delete",
+            coalesce=False,
+            channel_id=payload.channel_id,
         )
 
+    @commands.command(name="audit_cache_stats")
+    async def audit_cache_stats(self, ctx: commands.Context):
+        if not self.config_manager.is_admin(ctx.guild.id, ctx.author.id):
+            await ctx.send("❌ 管理者ではありません。")
+            return
+        await ctx.send(
+            f"📊 監査キャッシュ\n```\n{self.message_cache.stats()}\nbursts: {self.bursts.stats()}\nstore: {self.store.stats()}\n"
+            f"archive: {self.archive.stats() if self.archive else '無効'}\n```"
+        )
+
+    @commands.command(name="audit_search")
+    async def audit_search(self, ctx: commands.Context, *conditions: str):
+        """監査ログ検索: !audit_search user=@名前 type=ban days=7（どれも省略可）"""
+        if not self.config_manager.is_admin(ctx.guild.id, ctx.author.id):
+            await ctx.send("❌ 管理者ではありません。")
+            return
+        filters = {"guild_id": ctx.guild.id, "user_id": None, "kind": None, "since": None}
+        for condition in conditions:
+            key, _, value = condition.partition("=")
+            if key == "user" and (m := USER_ARG.fullmatch(value)):
+                filters["user_id"] = int(m.group(1) or m.group(2))
+            elif key == "type" and value:
+                filters["kind"] = value
+            elif key == "days" and value.isdigit():
+                filters["since"] = time.time() - int(value) * 86400
+            else:
+                await ctx.send(f"⚠️ 条件が読めません: `{condition}`（user=@名前 / type=種別 / days=日数）")
+                return
+        await self.store.flush()   # 直前のイベントも検索に出るように
+        rows = await self.store.query(**filters, limit=SEARCH_PAGE_SIZE)
+        view = AuditSearchView(self.store, ctx.author.id, filters, " ".join(conditions) or "なし", rows)
+        await ctx.send(embed=view.embed(), view=view)
+
     # ---------- メンバーイベント ----------
+    @staticmethod
+    def _membership_key(kind: str, member: discord.Member) -> str:
+        # 参加日時で在籍期間を区別する（退出して再参加した場合は別のキー）
+        joined = int(member.joined_at.timestamp()) if member.joined_at else 0
+        return f"{kind}:{member.id}:{joined}"
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # 退出イベントはキャッシュにいるメンバーしか届かないので、監査ログのあるギルドだけ一覧を取る
+        for guild in self.bot.guilds:
+            server_config = self.config_manager.get_server_config(guild.id)
+            if server_config and server_config.get("AUDIT_LOG_CHANNEL"):
+                self.bot.gateway_profile.request_chunk(guild)
+
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         await self.send_audit_embed(
             "✅ メンバー参加",
             f"{member.display_name} がサーバーに参加しました",
             fields=[("ID", member.id, True)],
-            guild=member.guild
+            guild=member.guild,
+            dedup_key=self._membership_key("join", member),
+            event="join",
+            user_id=member.id,
+            line=f"{member.mention} {member.display_name} ({member.id})",
         )
 
     @commands.Cog.listener()
@@ -118,27 +325,42 @@ class AuditCog(commands.Cog):
             "❌ メンバー退出",
             f"{member.display_name} がサーバーから退出しました",
             fields=[("ID", member.id, True)],
-            guild=member.guild
+            guild=member.guild,
+            dedup_key=self._membership_key("remove", member),
+            event="remove",
+            user_id=member.id,
+            line=f"{member.display_name} ({member.id})",
         )
 
     @commands.Cog.listener()
     async def on_member_ban(self, guild: discord.Guild, user: discord.User):
+        # BAN と解除は交互にしか起きないので、片方を送ったらもう片方のキーを忘れる
+        self.bot.dedup.forget(f"audit:{guild.id}:unban:{user.id}")
         await self.send_audit_embed(
             "⛔ メンバーBAN",
             f"{user.name} がBANされました",
             fields=[("ID", user.id, True)],
             color=0xFF0000,
-            guild=guild
+            guild=guild,
+            dedup_key=f"ban:{user.id}",
+            event="ban",
+            user_id=user.id,
+            line=f"{user.name} ({user.id})",
         )
 
     @commands.Cog.listener()
     async def on_member_unban(self, guild: discord.Guild, user: discord.User):
+        self.bot.dedup.forget(f"audit:{guild.id}:ban:{user.id}")
         await self.send_audit_embed(
             "✅ メンバーBAN解除",
             f"{user.name} のBANが解除されました",
             fields=[("ID", user.id, True)],
             color=0x00FF00,
-            guild=guild
+            guild=guild,
+            dedup_key=f"unban:{user.id}",
+            event="unban",
+            user_id=user.id,
+            line=f"{user.name} ({user.id})",
         )
 
     # ---------- 招待イベント ----------
@@ -156,7 +378,12 @@ class AuditCog(commands.Cog):
                 ("一時メンバー", "はい" if invite.temporary else "いいえ", True)
             ],
             color=0x00FF7F,
-            guild=invite.guild
+            guild=invite.guild,
+            dedup_key=f"invite_create:{invite.code}",
+            event="invite_create",
+            user_id=invite.inviter.id if invite.inviter else None,
+            channel_id=invite.channel.id if invite.channel else None,
+            line=f"`{invite.code}` {invite.inviter.mention if invite.inviter else '不明'}",
         )
 
     @commands.Cog.listener()
@@ -165,10 +392,15 @@ class AuditCog(commands.Cog):
             "❌ 招待削除",
             f"招待コード `{invite.code}` が削除されました",
             color=0xFF0000,
-            guild=invite.guild
+            guild=invite.guild,
+            dedup_key=f"invite_delete:{invite.code}",
+            event="invite_delete",
+            channel_id=invite.channel.id if invite.channel else None,
+            line=f"`{invite.code}`",
         )
 
     # ---------- サーバー更新 ----------
+    # 再送された GUILD_UPDATE はキャッシュ更新済みで before == after になるため、キーは不要
     @commands.Cog.listener()
     async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
         changes = []
@@ -187,7 +419,10 @@ class AuditCog(commands.Cog):
                 "サーバー設定が変更されました",
                 fields=[("変更内容", "\n".join(changes), False)],
                 color=0xFFA500,
-                guild=after
+                guild=after,
+                event="guild_update",
+                line=" / ".join(changes),
+                coalesce=False,
             )
 
     # ---------- ロール操作コマンド ----------
@@ -2,28 +2,27 @@
 import discord
 from discord.ext import commands
 from config_manager import ConfigManager
+from utils.message_router import ALL_CHANNELS
 
 class LoggingCog(commands.Cog):
     def __init__(self, bot: commands.Bot, config_manager: ConfigManager):
         self.bot = bot
         self.config_manager = config_manager
+        bot.router.register("logging", self.route_channels, self.on_routed_message)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot or not message.guild:
-            return
-
-        server_config = self.config_manager.get_server_config(message.guild.id)
-        if not server_config:
-            return
+    async def cog_unload(self):
+        self.bot.router.unregister("logging")
 
-        log_channel_id = server_config.get("LOG_CHANNEL")
-        if not log_channel_id:
-            return
+    def route_channels(self, guild_id: int):
+        """LOG_CHANNEL が設定されたサーバーは全チャンネルを MessageRouter から受け取る"""
+        server_config = self.config_manager.get_server_config(guild_id)
+        return ALL_CHANNELS if server_config and server_config.get("LOG_CHANNEL") else set()
 
+    async def on_routed_message(self, message: discord.Message):
+        log_channel_id = self.config_manager.get_server_config(message.guild.id).get("LOG_CHANNEL")
         channel = self.bot.get_channel(log_channel_id)
         if channel:
-            await channel.send(f"[{message.author.display_name}] {message.content}")
+            self.bot.send_scheduler.send(channel, f"[{message.author.display_name}] {message.content}")
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
@@ -43,7 +42,7 @@ class LoggingCog(commands.Cog):
             if channel:
                 before_name = before.channel.name if before.channel else "なし"
                 after_name = after.channel.name if after.channel else "なし"
-                await channel.send(f"{member.display_name} moved from {before_name} to {after_name}")
+                self.bot.send_scheduler.send(channel, f"{member.display_name} moved from {before_name} to {after_name}")
 
 # ---------- Cogセットアップ ----------
 async def setup(bot: commands.Bot):
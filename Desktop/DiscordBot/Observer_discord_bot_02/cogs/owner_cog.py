@@ -23,6 +23,7 @@ class OwnerCog(commands.Cog):
     @commands.check(admin_only)
     async def stopbot(self, ctx):
         await ctx.send("🛑 Bot を停止します…")
+        await self.config_manager.flush_config()
         await self.bot.close()
 
     # ---------- サーバー設定表示 ----------
@@ -35,7 +36,7 @@ class OwnerCog(commands.Cog):
             return
 
         # JSON全体を表示（長い場合は省略）
-        data_str = json.dumps(conf, indent=2, ensure_ascii=False)
+        data_str = json.dumps(dict(conf), indent=2, ensure_ascii=False)
         if len(data_str) > 1900:
             data_str = data_str[:1900] + "..."
         await ctx.send(f"🗂 サーバー設定:\n```json\n{data_str}\n```")
@@ -76,6 +77,47 @@ class OwnerCog(commands.Cog):
 
         await ctx.send("🧩 設定情報:\n```\n" + "\n".join(lines) + "\n```")
 
+    # ---------- 直近のデバッグ出力 ----------
+    @commands.command(name="debug_tail")
+    async def debug_tail(self, ctx, count: int = 20):
+        """送信の有無に関わらず手元に残っている直近のデバッグ行を表示"""
+        if not self.config_manager.is_admin(ctx.guild.id, ctx.author.id):
+            await ctx.send("❌ 管理者ではありません。")
+            return
+        sink = self.bot.debug_sink
+        text = "\n".join(sink.tail(max(1, min(count, 100))))
+        if len(text) > 1800:
+            text = "…" + text[-1800:]
+        await ctx.send(f"🪵 直近のデバッグ出力:\n```\n{text or 'なし'}\n```統計: {sink.stats()}")
+
+    # ---------- キャッシュ・メモリ使用量 ----------
+    @commands.command(name="cache_stats")
+    async def cache_stats(self, ctx):
+        """インテント・メンバーキャッシュの実際の大きさと RSS を表示"""
+        if not self.config_manager.is_admin(ctx.guild.id, ctx.author.id):
+            await ctx.send("❌ 管理者ではありません。")
+            return
+        profile = self.bot.gateway_profile
+        lines = [f"{key}: {value}" for key, value in profile.stats(self.bot).items()]
+        missing = profile.missing(self.config_manager.config)
+        if missing:
+            lines.append(f"⚠️ 再起動で有効になるインテント: {missing}")
+        await ctx.send("🧠 キャッシュ状況:\n```\n" + "\n".join(lines) + "\n```")
+
+    # ---------- 設定の保存・同期 ----------
+    @commands.command(name="config_stats")
+    async def config_stats(self, ctx):
+        """設定の遅延保存（まとめられた保存回数など）と Drive 同期の状況を表示"""
+        if not self.config_manager.is_admin(ctx.guild.id, ctx.author.id):
+            await ctx.send("❌ 管理者ではありません。")
+            return
+        lines = [
+            f"persister: {self.config_manager.persister.stats()}",
+            f"sync: {self.config_manager.sync.stats()}",
+            f"drive_ready: {self.config_manager.drive_ready}",
+        ]
+        await ctx.send("💾 設定の保存状況:\n```\n" + "\n".join(lines) + "\n```")
+
 # ---------- Cogセットアップ ----------
 async def setup(bot: commands.Bot):
     config_manager = getattr(bot, "config_manager", None)
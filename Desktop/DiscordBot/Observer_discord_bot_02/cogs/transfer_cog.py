@@ -2,145 +2,499 @@
 from discord.ext import commands
 import discord
 import asyncio
-from discord.utils import get
+import datetime
+import time
+from utils.webhook_pool import WebhookPool
+from utils.mention_resolver import MentionResolver, rewrite_mentions
+from utils.relay_index import RelayIndex, BODY_KINDS, KIND_EMBED, KIND_WEBHOOK, KIND_FILE, KIND_LINKS, KIND_MENTION
+from utils.attachment_relay import AttachmentRelay
+from utils.relay_checkpoints import RelayCheckpoints
+
+CATCHUP_CONCURRENCY = 4          # 起動時に同時に履歴を読むチャンネル数
+CATCHUP_MAX_MESSAGES = 500       # 1チャンネルあたり、起動時に追いかける最大件数
+MAX_QUEUED_PER_DESTINATION = 20  # 追いつき・backfill 中、転送先の送信待ちがこれを超えたら読むのを待つ
+BACKFILL_PROGRESS_EVERY = 50
 
 class TransferCog(commands.Cog):
     def __init__(self, bot: commands.Bot, config_manager):
         self.bot = bot
         self.config_manager = config_manager
+        self.webhooks = WebhookPool(bot)
+        self.attachments = AttachmentRelay()
+        self.mentions = MentionResolver()
+        self.relays = RelayIndex()
+        self.checkpoints = RelayCheckpoints(config_manager)
+        self._relaying = set()   # 送信が終わっていない "relay:<メッセージID>"
+        self._catchup_task = None
+        if bot.is_ready():
+            # 再読み込み時は on_ready が来ないのでここで追いつく
+            self._catchup_task = asyncio.create_task(self.catch_up())
+        bot.router.register("transfer", self.route_channels, self.on_routed_message)
         try:
             asyncio.create_task(self.config_manager.send_debug("[DEBUG] TransferCog loaded"))
         except Exception:
             print("[DEBUG] TransferCog loaded")
 
-    async def send_debug(self, message: str, fallback_channel: discord.TextChannel = None):
-        target_channel = fallback_channel
-        if not target_channel:
-            try:
-                for pair in self.config_manager.config.get("server_pairs", []):
-                    debug_id = pair.get("DEBUG_CHANNEL")
-                    if debug_id:
-                        target_channel = self.bot.get_channel(debug_id)
-                        if target_channel:
-                            break
-            except Exception:
-                target_channel = None
-
-        if target_channel:
-            try:
-                await target_channel.send(f"[DEBUG] {message}")
-                return
-            except Exception as e:
-                print(f"[DEBUG送信失敗] {message} ({e})")
-
-        print(f"[DEBUG] {message} (チャンネル未設定または送信失敗)")
+    def debug(self, message: str, guild_id: int = None, level: str = "DEBUG"):
+        """共通デバッグ出力へ積む（送信はまとめて行われるので await 不要）"""
+        channel_id = self.config_manager.get_fixed_channel(guild_id, "DEBUG_CHANNEL") if guild_id else None
+        self.bot.debug_sink.log(message, level=level, channel_id=channel_id)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot or not message.guild:
-            return
+    async def send_debug(self, message: str, fallback_channel: discord.TextChannel = None):
+        self.bot.debug_sink.log(message, channel_id=fallback_channel.id if fallback_channel else None)
 
-        # ----------------------------
-        # ① まずコマンド処理
-        ctx = await self.bot.get_context(message)
-        if ctx.valid:
-            await self.bot.process_commands(message)
+    # ---------- MessageRouter からの受信 ----------
+    def route_channels(self, guild_id: int) -> set:
+        """転送元（A）サーバーのマッピング済みチャンネルだけを受け取る"""
+        pair = self.config_manager.get_pair_by_a(guild_id)
+        return {int(src_id) for src_id in pair.get("CHANNEL_MAPPING", {})} if pair else set()
 
+    async def on_routed_message(self, message: discord.Message):
+        # Bot・DM の除外とコマンド処理は MessageRouter で済んでいる
         # ----------------------------
-        # ② デバッグログ
-        await self.send_debug(
+        # ① デバッグログ
+        guild_id = message.guild.id
+        self.debug(
             f"受信: guild={message.guild.name} ({message.guild.id}), "
             f"channel={message.channel.name} ({message.channel.id}), "
             f"author={message.author.display_name}, content={message.content}",
-            fallback_channel=message.channel
+            guild_id
         )
 
         # ----------------------------
-        # ③ 転送処理
+        # ② 転送処理
+        await self.relay(message)
+
+    async def relay(self, message: discord.Message) -> bool:
+        """message を対応する転送先へ送る（送信はキューに積むだけ）。転送したら True"""
+        guild_id = message.guild.id
         pair = self.config_manager.get_pair_by_a(message.guild.id)
         if not pair:
-            await self.send_debug("このサーバーは転送ペアに登録されていません", fallback_channel=message.channel)
-            return
+            self.debug("このサーバーは転送ペアに登録されていません", guild_id)
+            return False
 
-        dest_id = pair.get("CHANNEL_MAPPING", {}).get(str(message.channel.id))
+        dest_id = self.config_manager.get_dest_channel_id(message.channel.id)
         if not dest_id:
-            await self.send_debug("このチャンネルには対応する転送先が設定されていません", fallback_channel=message.channel)
-            return
+            self.debug("このチャンネルには対応する転送先が設定されていません", guild_id)
+            return False
 
         dest_guild = self.bot.get_guild(pair.get("B_ID"))
         if not dest_guild:
-            await self.send_debug(f"Bサーバーが見つかりません（ID: {pair.get('B_ID')}）", fallback_channel=message.channel)
-            return
+            self.debug(f"Bサーバーが見つかりません（ID: {pair.get('B_ID')}）", guild_id, level="WARN")
+            return False
 
         dest_channel = dest_guild.get_channel(dest_id)
         if not dest_channel:
-            await self.send_debug(f"転送先チャンネルが見つかりません（ID: {dest_id}）", fallback_channel=message.channel)
-            return
+            self.debug(f"転送先チャンネルが見つかりません（ID: {dest_id}）", guild_id, level="WARN")
+            return False
+
+        self.debug(f"転送先チャンネル取得: {dest_channel.name} ({dest_channel.id})", guild_id)
 
-        await self.send_debug(f"転送先チャンネル取得: {dest_channel.name} ({dest_channel.id})", fallback_channel=message.channel)
+        # 再接続での再送・追いつきとライブ受信の重なりで同じメッセージを2回送らない
+        # 転送済みとして記録するのは送信がすべて成功してから（失敗・停止時に積み残した分は追いつきで送り直す）
+        key = f"relay:{message.id}"
+        if key in self._relaying or self.bot.dedup.contains(key):
+            self.debug(f"転送済みのためスキップ: {message.id}", guild_id)
+            return False
+        self._relaying.add(key)
 
+        # 添付の取得などで await する前に送信先キューの順番を確保する
+        # 送信そのものはスケジューラが行うので、ここでは 429 待ちをしない
+        ticket = self.bot.send_scheduler.reserve(dest_channel)
         try:
-            # ===== Embed用テキスト生成 =====
-            embed_text = message.content or " "
-            for user in message.mentions:
-                embed_text = embed_text.replace(f"<@{user.id}>", f"@{user.display_name}")
-                embed_text = embed_text.replace(f"<@!{user.id}>", f"@{user.display_name}")
-            for role in message.role_mentions:
-                embed_text = embed_text.replace(f"<@&{role.id}>", f"@{role.name}")
-
-            # ===== おしゃれEmbed生成（ユーザーごとに色変化） =====
-            color_seed = (hash(message.author.id) % 0xFFFFFF)
-            embed_color = discord.Color(color_seed)
-
-            embed = discord.Embed(description=embed_text, color=embed_color)
-            try:
-                embed.set_author(
-                    name=message.author.display_name,
-                    icon_url=message.author.display_avatar.url
-                )
-            except Exception:
-                embed.set_author(name=message.author.display_name)
+            if not (pair.get("RELAY_MODE") == "webhook" and await self.relay_via_webhook(message, dest_channel, dest_guild, ticket)):
+                await self.relay_via_embed(message, dest_channel, dest_guild, ticket)
+        except Exception as e:
+            self._relaying.discard(key)
+            self.debug(f"転送失敗: {e}", guild_id, level="WARN")
+        else:
+            self._checkpoint_when_sent(message, ticket.futures)
+        finally:
+            ticket.close()
+        return True
 
-            await dest_channel.send(embed=embed)
-            await self.send_debug(f"Embed転送完了: {message.channel.id} → {dest_channel.id}", fallback_channel=message.channel)
+    def _checkpoint_when_sent(self, message: discord.Message, futures: list):
+        """message の送信がすべて成功したら転送済みとして記録し、到達点を進める
 
-            # ===== 添付ファイル（画像・動画など） =====
-            for att in message.attachments:
-                try:
-                    file = await att.to_file()
-                    await dest_channel.send(file=file)
-                    await self.send_debug(f"添付ファイル転送完了: {att.filename}", fallback_channel=message.channel)
-                except Exception as e:
-                    await self.send_debug(f"添付ファイル送信失敗 ({att.filename}): {e}", fallback_channel=message.channel)
-
-            # ===== メンション実際に通知 =====
-            mention_parts = []
-
-            # ユーザーメンション
-            for user in message.mentions:
-                member = dest_guild.get_member(user.id)
-                if not member:
-                    try:
-                        member = await dest_guild.fetch_member(user.id)
-                    except Exception:
-                        member = None
-                if member:
-                    mention_parts.append(member.mention)
-
-            # ロールメンション
-            for role in message.role_mentions:
-                dest_role = dest_guild.get_role(role.id)
-                if not dest_role:
-                    dest_role = get(dest_guild.roles, name=role.name)
-                if dest_role:
-                    mention_parts.append(dest_role.mention)
-
-            if mention_parts:
-                await dest_channel.send(" ".join(mention_parts))
-                await self.send_debug(f"メンション通知転送完了: {' '.join(mention_parts)}", fallback_channel=message.channel)
+        キューに積んだだけ・失敗した転送で進めると、再起動後の追いつきで取りこぼす。
+        結果が None の送信（Webhook が使えず Embed 方式に切り替えたもの）は、切り替え先が改めて呼ぶ。
+        """
+        key = f"relay:{message.id}"
+
+        def done(f):
+            results = [] if f.cancelled() else f.result()
+            failed = f.cancelled() or any(isinstance(r, BaseException) for r in results)
+            if not failed and any(r is None for r in results):
+                return
+            self._relaying.discard(key)
+            if not failed:
+                self.bot.dedup.add(key)
+                self.checkpoints.advance(message.channel.id, message.id)
+        asyncio.gather(*futures, return_exceptions=True).add_done_callback(done)
+
+    def _on_sent(self, future: asyncio.Future, label: str, guild_id: int, source_id: int = None, kind: str = None):
+        """送信完了時にデバッグ出力へ積み、source_id があれば転送先メッセージとの対応を記録する"""
+        def done(f):
+            if f.cancelled():
+                return
+            if f.exception():
+                self.debug(f"{label} 失敗: {f.exception()}", guild_id, level="WARN")
+                return
+            sent = f.result()
+            if source_id and sent is not None:
+                self.relays.add(source_id, sent.channel.id, sent.id, kind)
+            self.debug(f"{label} 完了", guild_id)
+        future.add_done_callback(done)
 
+    def _reply_target(self, message: discord.Message, dest_channel: discord.TextChannel):
+        """返信元メッセージが転送済みなら、その転送先メッセージ（PartialMessage）を返す"""
+        ref = message.reference
+        if not ref or not ref.message_id or ref.channel_id != message.channel.id:
+            return None
+        dest_message_id = self.relays.body(ref.message_id, dest_channel.id)
+        if not dest_message_id:
+            return None
+        return dest_channel.get_partial_message(dest_message_id)
+
+    # ---------- 転送先でのメンション解決 ----------
+    async def resolve_mentions(self, message: discord.Message, dest_guild: discord.Guild):
+        """転送元のメンションに対応する B サーバーのメンバー・ロールを {転送元ID: 転送先} で返す"""
+        if message.mentions:
+            # 転送先のメンバー一覧は最初に必要になった時点で取得する（それまでは fetch_member）
+            self.bot.gateway_profile.request_chunk(dest_guild)
+        return await self.mentions.resolve(message, dest_guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        self.mentions.invalidate_roles(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.name != after.name or before.position != after.position:
+            self.mentions.invalidate_roles(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.mentions.invalidate_roles(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        self.mentions.forget_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        self.mentions.forget_member(member.guild.id, member.id)
+
+    # ---------- Embed で転送（従来方式） ----------
+    def build_embed(self, message: discord.Message) -> discord.Embed:
+        # ===== Embed用テキスト生成 =====
+        embed_text = rewrite_mentions(
+            message.content,
+            {user.id: f"@{user.display_name}" for user in message.mentions},
+            {role.id: f"@{role.name}" for role in message.role_mentions},
+        ) or " "
+
+        # ===== おしゃれEmbed生成（ユーザーごとに色変化） =====
+        color_seed = (hash(message.author.id) % 0xFFFFFF)
+        embed_color = discord.Color(color_seed)
+
+        embed = discord.Embed(description=embed_text, color=embed_color)
+        try:
+            embed.set_author(
+                name=message.author.display_name,
+                icon_url=message.author.display_avatar.url
+            )
+        except Exception:
+            embed.set_author(name=message.author.display_name)
+        return embed
+
+    async def relay_via_embed(self, message: discord.Message, dest_channel: discord.TextChannel, dest_guild: discord.Guild, ticket):
+        guild_id = message.guild.id
+        embed = self.build_embed(message)
+
+        # 返信は転送先でも返信として送る（返信元が転送されていない場合は通常送信）
+        kwargs = {"embed": embed}
+        reply_to = self._reply_target(message, dest_channel)
+        if reply_to:
+            kwargs["reference"] = reply_to.to_reference(fail_if_not_exists=False)
+            kwargs["mention_author"] = False
+        self._on_sent(ticket.send(dest_channel, **kwargs), f"Embed転送: {message.channel.id} → {dest_channel.id}", guild_id, message.id, KIND_EMBED)
+
+        # ===== 添付ファイル（画像・動画など） =====
+        try:
+            files, oversized = await self.attachments.to_files(message.attachments, dest_guild)
         except Exception as e:
-            await self.send_debug(f"転送失敗: {e}", fallback_channel=message.channel)
+            files, oversized = [], []
+            self.debug(f"添付ファイル取得失敗: {e}", guild_id, level="WARN")
+        for file in files:
+            self._on_sent(ticket.send(dest_channel, file=file), f"添付ファイル転送 ({file.filename})", guild_id, message.id, KIND_FILE)
+        if oversized:
+            # 転送先のアップロード上限を超えるものはリンクで送る
+            links = "\n".join(f"📎 {att.filename}: {att.url}" for att in oversized)
+            self._on_sent(ticket.send(dest_channel, links), "添付リンク転送", guild_id, message.id, KIND_LINKS)
+
+        # ===== メンション実際に通知 =====
+        members, roles = await self.resolve_mentions(message, dest_guild)
+        mention_parts = [m.mention for m in members.values()] + [r.mention for r in roles.values()]
+        if mention_parts:
+            self._on_sent(ticket.send(dest_channel, " ".join(mention_parts)), f"メンション通知転送: {' '.join(mention_parts)}", guild_id, message.id, KIND_MENTION)
+
+    # ---------- Webhook で転送（1リクエスト） ----------
+    async def relay_via_webhook(self, message: discord.Message, dest_channel: discord.TextChannel, dest_guild: discord.Guild, ticket) -> bool:
+        """投稿者名・アイコン・本文・添付・メンションを1回で送る。Webhook が使えなければ False（Embed 方式へ）"""
+        if await self.webhooks.get(dest_channel) is None:
+            return False
+        members, roles = await self.resolve_mentions(message, dest_guild)
+        text = self.webhook_text(message, members, roles)
+        # Webhook は返信できないので、返信元の転送先へのリンクを付ける
+        reply_to = self._reply_target(message, dest_channel)
+        if reply_to:
+            text = f"↪ {reply_to.jump_url}\n{text}"
+        files, oversized = await self.attachments.to_files(message.attachments[:10], dest_guild)
+        if oversized:
+            text += "".join(f"\n📎 {att.filename}: {att.url}" for att in oversized)
+        if len(text) > 2000:
+            for file in files:
+                file.close()
+            return False
+
+        kwargs = dict(
+            content=text or ("\u200b" if not files else None),
+            username=message.author.display_name[:80],
+            avatar_url=message.author.display_avatar.url,
+            allowed_mentions=discord.AllowedMentions(everyone=False, users=list(members.values()), roles=list(roles.values())),
+        )
+        prepared = [files]
+
+        async def make_files():
+            # 初回は作成済みの File を使い、再送（Webhook の作り直し・レート制限）ではキャッシュから作り直す
+            if prepared:
+                return prepared.pop()
+            return (await self.attachments.to_files(message.attachments[:10], dest_guild))[0]
+
+        async def send_or_fallback():
+            # 送信までの間に Webhook が使えなくなった場合は、その場で Embed 方式に切り替える
+            sent = await self.webhooks.send(dest_channel, make_files=make_files, **kwargs)
+            if sent is None:
+                for file in prepared.pop() if prepared else ():
+                    file.close()
+                # 添付はキャッシュ済みなので Embed 方式側で取り直しても再ダウンロードにはならない
+                fallback = self.bot.send_scheduler.reserve(dest_channel)
+                try:
+                    await self.relay_via_embed(message, dest_channel, dest_guild, fallback)
+                    self._checkpoint_when_sent(message, fallback.futures)
+                finally:
+                    fallback.close()
+            return sent
+
+        self._on_sent(ticket.call(send_or_fallback), f"Webhook転送: {message.channel.id} → {dest_channel.id}", message.guild.id, message.id, KIND_WEBHOOK)
+        return True
+
+    def webhook_text(self, message: discord.Message, members: dict, roles: dict) -> str:
+        """転送先に居るメンバー・ロールは本物のメンションに、居なければ名前に置き換える"""
+        return rewrite_mentions(
+            message.content,
+            {user.id: members[user.id].mention if user.id in members else f"@{user.display_name}" for user in message.mentions},
+            {role.id: roles[role.id].mention if role.id in roles else f"@{role.name}" for role in message.role_mentions},
+        )
+
+    # ---------- 編集・削除の反映 ----------
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        # 埋め込みの展開だけの更新など、本文を含まないイベントは無視する
+        if "content" not in payload.data or not payload.guild_id:
+            return
+        rows = self.relays.lookup(payload.message_id)
+        if not rows:
+            return
+        message = payload.message
+        for dest_channel_id, dest_message_id, kind in rows:
+            dest_channel = self.bot.get_channel(dest_channel_id)
+            if dest_channel is None or kind not in BODY_KINDS:
+                continue
+            if kind == KIND_EMBED:
+                partial = dest_channel.get_partial_message(dest_message_id)
+                future = self.bot.send_scheduler.reserve_call(dest_channel, partial.edit, embed=self.build_embed(message))
+            else:
+                webhook = await self.webhooks.get(dest_channel)
+                if webhook is None:
+                    continue
+                members, roles = await self.resolve_mentions(message, dest_channel.guild)
+                future = self.bot.send_scheduler.reserve_call(
+                    dest_channel, webhook.edit_message, dest_message_id,
+                    content=self.webhook_text(message, members, roles) or "\u200b",
+                    allowed_mentions=discord.AllowedMentions(everyone=False, users=list(members.values()), roles=list(roles.values())),
+                )
+            self._on_sent(future, f"編集反映: {payload.message_id} → {dest_message_id}", payload.guild_id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        await self.propagate_delete(payload.message_id, payload.guild_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            await self.propagate_delete(message_id, payload.guild_id)
+
+    async def propagate_delete(self, source_id: int, guild_id: int):
+        rows = self.relays.lookup(source_id)
+        if not rows:
+            return
+        self.relays.remove(source_id)
+        for dest_channel_id, dest_message_id, kind in rows:
+            dest_channel = self.bot.get_channel(dest_channel_id)
+            if dest_channel is None:
+                continue
+            webhook = await self.webhooks.get(dest_channel) if kind == KIND_WEBHOOK else None
+            if webhook:
+                future = self.bot.send_scheduler.reserve_call(dest_channel, webhook.delete_message, dest_message_id)
+            else:
+                future = self.bot.send_scheduler.reserve_call(dest_channel, dest_channel.get_partial_message(dest_message_id).delete)
+            self._on_sent(future, f"削除反映: {source_id} → {dest_message_id}", guild_id)
+
+    # ---------- 停止中に投稿された分の追いつき ----------
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self._catchup_task is None or self._catchup_task.done():
+            self._catchup_task = asyncio.create_task(self.catch_up())
+
+    async def catch_up(self):
+        # この時点より後の投稿は on_message で転送されるので、ここまでを追いかける
+        until = discord.Object(discord.utils.time_snowflake(discord.utils.utcnow()))
+        semaphore = asyncio.Semaphore(CATCHUP_CONCURRENCY)
+        # 到達点は Drive の config にあるので、再デプロイ直後は取り込むまで待つ
+        await self.config_manager.drive_synced.wait()
+        mappings = self.config_manager.get_channel_mappings()
+        starts = {src_id: self.config_manager.get_relay_checkpoint(src_id) for src_id, _ in mappings}
+        self.checkpoints.release()
+
+        async def one(src_id, dest_id):
+            channel = self.bot.get_channel(src_id)
+            if channel is None:
+                return 0
+            checkpoint = starts[src_id]
+            if checkpoint is None:
+                # 初めて見るチャンネルは今の位置から追跡を始める（過去分は backfill で）
+                if channel.last_message_id:
+                    self.checkpoints.advance(src_id, channel.last_message_id)
+                return 0
+            async with semaphore:
+                return await self.replay(channel, dest_id, discord.Object(checkpoint), until, CATCHUP_MAX_MESSAGES)
+
+        results = await asyncio.gather(
+            *(one(src_id, dest_id) for src_id, dest_id in mappings),
+            return_exceptions=True,
+        )
+        relayed = sum(r for r in results if isinstance(r, int))
+        for e in (r for r in results if isinstance(r, Exception)):
+            self.debug(f"追いつき失敗: {e}", level="WARN")
+        if relayed:
+            self.debug(f"停止中の投稿を {relayed} 件転送しました", level="INFO")
+
+    async def replay(self, channel, dest_id: int, after, before, limit=None, on_progress=None) -> int:
+        """channel の after〜before の履歴を古い順に転送する（100件ずつページングして読む）"""
+        relayed = 0
+        async for message in channel.history(after=after, before=before, limit=limit, oldest_first=True):
+            if message.author.bot or self.relays.lookup(message.id):
+                continue
+            # 転送先が詰まっている間は読み進めない（キューを際限なく伸ばさない）
+            while self.bot.send_scheduler.depth(dest_id) > MAX_QUEUED_PER_DESTINATION:
+                await asyncio.sleep(0.5)
+            if await self.relay(message):
+                relayed += 1
+            if on_progress:
+                await on_progress(message, relayed)
+        return relayed
+
+    # ---------- 過去ログの転送（中断しても続きから） ----------
+    @commands.command(name="backfill")
+    async def backfill(self, ctx: commands.Context, channel_id: int, days: int = 7):
+        """転送元チャンネルの過去 days 日分を転送する。途中で止まっても再実行で続きから"""
+        if not self.config_manager.is_admin(ctx.guild.id, ctx.author.id):
+            await ctx.send("❌ 管理者ではありません。")
+            return
+        # A・B どちらのサーバーから実行してもよいが、同じペアの転送元チャンネルに限る
+        pair = self.config_manager.get_server_config(ctx.guild.id)
+        channel = self.bot.get_channel(channel_id)
+        if not channel or channel.guild.id != pair.get("A_ID"):
+            await ctx.send("⚠️ このペアの転送元チャンネルIDを指定してください。")
+            return
+        dest_id = self.config_manager.get_dest_channel_id(channel.id)
+        if not dest_id:
+            await ctx.send("⚠️ このチャンネルには転送先が設定されていません。")
+            return
+
+        state = self.checkpoints.get_backfill(channel.id)
+        if state:
+            resumed = True
+        else:
+            resumed = False
+            start = discord.utils.utcnow() - datetime.timedelta(days=days)
+            state = {
+                "after": discord.utils.time_snowflake(start),
+                "before": discord.utils.time_snowflake(discord.utils.utcnow()),
+                "relayed": 0,
+            }
+            self.checkpoints.set_backfill(channel.id, state)
+
+        first = state["after"]
+        span = max(1, (state["before"] >> 22) - (first >> 22))
+        started = time.monotonic()
+        base = state["relayed"]
+        status = await ctx.send(f"⏳ backfill {'再開' if resumed else '開始'}: {channel.mention}")
+
+        async def on_progress(message, relayed):
+            state["after"] = message.id
+            state["relayed"] = base + relayed
+            self.checkpoints.set_backfill(channel.id, state)
+            if relayed and relayed % BACKFILL_PROGRESS_EVERY == 0:
+                percent = 100 * ((message.id >> 22) - (first >> 22)) / span
+                rate = relayed / max(time.monotonic() - started, 1e-6)
+                await status.edit(content=f"⏳ backfill {channel.mention}: {state['relayed']}件 ({percent:.0f}%) {rate:.1f}件/秒")
+
+        relayed = await self.replay(channel, dest_id, discord.Object(state["after"]), discord.Object(state["before"]), on_progress=on_progress)
+        self.checkpoints.set_backfill(channel.id, None)
+        elapsed = time.monotonic() - started
+        await status.edit(content=f"✅ backfill 完了 {channel.mention}: 今回 {relayed}件 / 合計 {base + relayed}件（{elapsed:.0f}秒, {relayed / max(elapsed, 1e-6):.1f}件/秒）")
+
+    # ---------- 転送方式の切り替え ----------
+    @commands.command(name="relay_mode")
+    async def relay_mode(self, ctx: commands.Context, mode: str):
+        """転送方式を切り替える: webhook（1リクエストで転送）/ embed（従来方式）"""
+        pair = self.config_manager.get_pair_by_guild(ctx.guild.id)
+        if not pair or ctx.author.id not in pair.get("ADMIN_IDS", []):
+            await ctx.send("⚠️ 管理者のみ使用可能です。")
+            return
+        if mode not in ("webhook", "embed"):
+            await ctx.send("⚠️ webhook か embed を指定してください。")
+            return
+        self.config_manager.set_pair_value(pair, "RELAY_MODE", mode)
+        await ctx.send(f"✅ 転送方式を {mode} にしました。Webhook が使えないチャンネルは自動で embed 方式になります。\n{self.webhooks.stats()}")
+
+    async def cog_unload(self):
+        self.bot.router.unregister("transfer")
+        if self._catchup_task and not self._catchup_task.done():
+            self._catchup_task.cancel()
+        self.checkpoints.close()
+        await self.attachments.close()
+        self.relays.close()
+
+    # ---------- 転送の統計 ----------
+    @commands.command(name="relay_stats")
+    async def relay_stats(self, ctx: commands.Context):
+        if not self.config_manager.is_admin(ctx.guild.id, ctx.author.id):
+            await ctx.send("❌ 管理者ではありません。")
+            return
+        lines = [
+            f"router: {self.bot.router.stats()}",
+            f"dedup: {self.bot.dedup.stats()}",
+            f"webhook: {self.webhooks.stats()}",
+            f"attachments: {self.attachments.stats()}",
+            f"mentions: {self.mentions.stats()}",
+            f"relay index: {self.relays.stats()}",
+            f"send queues: {self.bot.send_scheduler.stats()}",
+        ]
+        await ctx.send("📊 転送統計\n```\n" + "\n".join(lines) + "\n```")
 
     @commands.command(name="debug_test")
     async def debug_test(self, ctx: commands.Context):
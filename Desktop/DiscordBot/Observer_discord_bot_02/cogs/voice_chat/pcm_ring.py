@@ -0,0 +1,120 @@
+# cogs/voice_chat/pcm_ring.py
+import math
+import numpy as np
+
+
+class PcmRingBuffer:
+    """int16 PCM フレームを確保済みの配列に上書きしていくリングバッファ
+
+    フレームは (容量, 1フレームのサンプル数) の配列の行へその場でコピーするだけで、
+    1フレームごとの bytes や配列は作らない。RMS は同じ大きさの float32 作業領域で計算する。
+    切り出しはフレーム番号（書き込んだ通し番号）で指定し、折り返しの有無に応じて
+    連続した最大2つのスライス（コピーではなくビュー）で返す。
+    """
+
+    def __init__(self, capacity_frames: int, frame_samples: int):
+        self.capacity = capacity_frames
+        self.frame_samples = frame_samples
+        self._buf = np.zeros((capacity_frames, frame_samples), dtype=np.int16)
+        self._flat = self._buf.reshape(-1)
+        self._scratch = np.empty(frame_samples, dtype=np.float32)
+        self.written = 0   # これまでに書いたフレーム数（次に書くフレーム番号）
+
+    @property
+    def oldest(self) -> int:
+        """まだ上書きされていない最古のフレーム番号"""
+        return max(0, self.written - self.capacity)
+
+    def write(self, frame) -> np.ndarray:
+        """bytes 等の PCM フレームを書き込み、書いた行（ビュー）を返す。短いフレームは無音で埋める"""
+        row = self._buf[self.written % self.capacity]
+        src = np.frombuffer(frame, dtype=np.int16)
+        n = min(src.size, self.frame_samples)
+        row[:n] = src[:n]
+        if n < self.frame_samples:
+            row[n:] = 0
+        self.written += 1
+        return row
+
+    def rms(self, row: np.ndarray) -> float:
+        """サンプルごとの RMS（0～1、int16 の最大値で正規化）"""
+        scratch = self._scratch
+        # int16 → float32 の変換は作業領域へ直接（混在型の ufunc は内部で一時配列を作るので避ける）
+        np.copyto(scratch, row)
+        return math.sqrt(float(np.dot(scratch, scratch)) / scratch.size) / 32768.0
+
+    def slices(self, start: int, end: int) -> list:
+        """フレーム番号 [start, end) を連続したビュー（最大2つ）で返す"""
+        start = max(start, self.oldest)
+        end = min(end, self.written)
+        if end <= start:
+            return []
+        first = (start % self.capacity) * self.frame_samples
+        count = (end - start) * self.frame_samples
+        total = self._flat.size
+        if first + count <= total:
+            return [self._flat[first:first + count]]
+        return [self._flat[first:], self._flat[:first + count - total]]
+
+
+# ---------- ベンチマーク: python -m cogs.voice_chat.pcm_ring ----------
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+    from collections import deque
+
+    SAMPLE_RATE = 48000
+    CHANNELS = 2
+    SAMPLES_PER_FRAME = 960
+    FRAME_SAMPLES = SAMPLES_PER_FRAME * CHANNELS
+    PRE_FRAMES = 17 * SAMPLE_RATE // SAMPLES_PER_FRAME
+    POST_FRAMES = 3 * SAMPLE_RATE // SAMPLES_PER_FRAME
+    TICKS = 3000   # 60 秒分
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(-3000, 3000, FRAME_SAMPLES, dtype=np.int16).tobytes() for _ in range(64)]
+
+    def legacy():
+        """従来方式: bytes の deque ＋ フレームごとの配列変換、トリガー時に deque を丸ごとコピー"""
+        ring = deque(maxlen=PRE_FRAMES)
+        queue = deque()
+
+        def tick(i):
+            frame = frames[i % len(frames)]
+            ring.append(frame)
+            samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32) / 32768.0
+            float(np.sqrt(np.mean(samples ** 2)))
+            if i % 1000 == 999:
+                queue.extend(ring)
+                b"".join(queue)
+                queue.clear()
+        return tick
+
+    def ring_buffer():
+        ring = PcmRingBuffer(PRE_FRAMES + POST_FRAMES, FRAME_SAMPLES)
+
+        def tick(i):
+            row = ring.write(frames[i % len(frames)])
+            ring.rms(row)
+            if i % 1000 == 999:
+                for part in ring.slices(ring.written - PRE_FRAMES, ring.written):
+                    memoryview(part).cast("B")
+        return tick
+
+    # バッファの確保は含めず、tick の繰り返しで確保される量だけを測る
+    for name, make in (("deque + np.array", legacy), ("PcmRingBuffer", ring_buffer)):
+        tick = make()
+        for i in range(TICKS):   # ウォームアップ（リングを一周させる）
+            tick(i)
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        for i in range(TICKS):
+            tick(i)
+        elapsed = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{name:18s} {elapsed / TICKS * 1e6:8.1f} µs/tick  "
+            f"transient peak {(peak - base) / 1024:9.1f} KiB  retained {(current - base) / 1024:7.1f} KiB"
+        )
@@ -0,0 +1,384 @@
+# cogs/voice_chat/vc_analytics.py
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import discord
+from discord.ext import commands, tasks
+from config_manager import ConfigManager
+from config_persister import write_snapshot, read_checked_json
+
+ANALYTICS_DIR = os.path.join("data", "voice_analytics")
+SLOT_SECONDS = 300                        # 1日を5分刻みで持つ
+SLOTS_PER_DAY = 24 * 3600 // SLOT_SECONDS
+SAMPLE_SECONDS = 60                       # 在室者を数え直す間隔
+RETENTION_DAYS = int(os.getenv("VC_ANALYTICS_DAYS", 400))
+TZ = timezone(timedelta(hours=int(os.getenv("VC_ANALYTICS_TZ", 9))))   # 日付・曜日の区切り（既定 JST）
+ROW_GROWTH = 32                           # 行が足りなくなったときに増やす単位
+HEAT_LEVELS = " ░▒▓█"
+WEEKDAYS = "月火水木金土日"
+
+
+def _day_key(at: float) -> str:
+    return datetime.fromtimestamp(at, TZ).strftime("%Y%m%d")
+
+
+def _slot(at: float) -> int:
+    local = datetime.fromtimestamp(at, TZ)
+    return (local.hour * 3600 + local.minute * 60 + local.second) // SLOT_SECONDS
+
+
+class _RowIndex:
+    """ID → 配列の行番号（ギルドごと・追加のみ）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        data = read_checked_json(path)
+        self.rows = {int(k): v for k, v in data.items()} if isinstance(data, dict) else {}
+        self.dirty = False
+
+    def row(self, key: int) -> int:
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.rows)
+            self.dirty = True
+        return row
+
+    def save(self):
+        if self.dirty:
+            write_snapshot(self.path, json.dumps(self.rows))
+            self.dirty = False
+
+
+class VoiceOccupancyStore:
+    """VC の在室人数と在室時間を日ごとの固定長配列で持つ（NumPy の memmap）
+
+    data/voice_analytics/<guild_id>/ に日ごとのファイルを置く:
+      occ_<日付>.npy  uint16 (チャンネル行, 288)  5分枠ごとの最大在室人数
+      sec_<日付>.npy  uint32 (メンバー行,)        その日の在室秒数
+    チャンネル・メンバーの行番号は channels.json / members.json に持つ。
+    生のイベントは残さないので、数か月分でも「チャンネル数 × 576 バイト／日」程度で済み、
+    集計は日ファイルを重ねた配列へのまとめての演算になる。
+    """
+
+    def __init__(self, root: str = ANALYTICS_DIR, retention_days: int = RETENTION_DAYS):
+        self.root = root
+        self.retention_days = retention_days
+        self._guilds = {}   # guild_id → {"channels": _RowIndex, "members": _RowIndex}
+        self._open = {}     # (guild_id, 種別, 日付) → 書き込み用 memmap（今日の分だけ）
+
+        # 統計
+        self.samples = 0
+        self.grown = 0
+        self.pruned_files = 0
+
+    def _dir(self, guild_id: int) -> str:
+        path = os.path.join(self.root, str(guild_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _index(self, guild_id: int) -> dict:
+        index = self._guilds.get(guild_id)
+        if index is None:
+            base = self._dir(guild_id)
+            index = self._guilds[guild_id] = {
+                "channels": _RowIndex(os.path.join(base, "channels.json")),
+                "members": _RowIndex(os.path.join(base, "members.json")),
+            }
+        return index
+
+    # ---------- 書き込み ----------
+    def _array(self, guild_id: int, kind: str, day: str, rows: int):
+        """今日の配列を開く（行が足りなければ ROW_GROWTH 単位で作り直す）"""
+        key = (guild_id, kind, day)
+        array = self._open.get(key)
+        if array is not None and array.shape[0] >= rows:
+            return array
+        path = os.path.join(self._dir(guild_id), f"{kind}_{day}.npy")
+        old = array if array is not None else (np.load(path, mmap_mode="r+") if os.path.exists(path) else None)
+        if old is not None and old.shape[0] >= rows:
+            self._open[key] = old
+            return old
+        # 行数の多いギルドで作り直しが続かないよう、既存の1.5倍以上に増やす
+        capacity = max(-(-rows // ROW_GROWTH) * ROW_GROWTH, old.shape[0] * 3 // 2 if old is not None else 0)
+        dtype, tail = (np.uint16, (SLOTS_PER_DAY,)) if kind == "occ" else (np.uint32, ())
+        tmp = path + ".tmp"
+        array = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(capacity,) + tail)
+        if old is not None:
+            array[:old.shape[0]] = old
+            old.flush()
+            del old
+        array.flush()
+        os.replace(tmp, path)
+        self.grown += 1
+        # 置き換えたファイルを開き直す（tmp 名のままの memmap を持たない）
+        array = self._open[key] = np.load(path, mmap_mode="r+")
+        return array
+
+    def record_occupancy(self, guild_id: int, counts: dict, at: float = None):
+        """counts: {channel_id: 在室人数}。5分枠の最大値を更新する"""
+        if not counts:
+            return
+        at = time.time() if at is None else at
+        channels = self._index(guild_id)["channels"]
+        rows = np.fromiter((channels.row(cid) for cid in counts), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(counts)).clip(0, np.iinfo(np.uint16).max)
+        # 新しい日のファイルは既知のチャンネル全部の行を持たせる（日ごとに作り直さない）
+        array = self._array(guild_id, "occ", _day_key(at), len(channels.rows))
+        slot = _slot(at)
+        array[rows, slot] = np.maximum(array[rows, slot], values)
+        self.samples += 1
+
+    def add_seconds(self, guild_id: int, seconds: dict, at: float = None):
+        """seconds: {member_id: 加算する在室秒数}"""
+        if not seconds:
+            return
+        at = time.time() if at is None else at
+        members = self._index(guild_id)["members"]
+        rows = np.fromiter((members.row(mid) for mid in seconds), dtype=np.int64, count=len(seconds))
+        values = np.fromiter(seconds.values(), dtype=np.float64, count=len(seconds)).round().astype(np.uint32)
+        array = self._array(guild_id, "sec", _day_key(at), len(members.rows))
+        np.add.at(array, rows, values)
+
+    def flush(self, at: float = None):
+        """書き込み中の配列と行番号を保存し、日付が変わった配列は閉じる"""
+        today = _day_key(time.time() if at is None else at)
+        for key, array in list(self._open.items()):
+            array.flush()
+            if key[2] != today:
+                del self._open[key]
+        for index in self._guilds.values():
+            index["channels"].save()
+            index["members"].save()
+
+    def prune(self, at: float = None):
+        cutoff = _day_key((time.time() if at is None else at) - self.retention_days * 86400)
+        if not os.path.isdir(self.root):
+            return
+        for guild_dir in os.listdir(self.root):
+            base = os.path.join(self.root, guild_dir)
+            for name in os.listdir(base):
+                if name.endswith(".npy") and name.split("_", 1)[-1][:8] < cutoff:
+                    os.remove(os.path.join(base, name))
+                    self.pruned_files += 1
+
+    # ---------- 読み出し ----------
+    def _days(self, guild_id: int, kind: str, days: int, at: float = None) -> list:
+        """[(日付, 読み取り専用の配列), ...] を古い順に（ファイルが無い日は飛ばす）"""
+        at = time.time() if at is None else at
+        base = self._dir(guild_id)
+        found = []
+        for back in range(days - 1, -1, -1):
+            day = _day_key(at - back * 86400)
+            path = os.path.join(base, f"{kind}_{day}.npy")
+            if os.path.exists(path):
+                found.append((day, np.load(path, mmap_mode="r")))
+        return found
+
+    def heatmap(self, guild_id: int, days: int = 28, channel_id: int = None, at: float = None) -> np.ndarray:
+        """曜日×時間 (7, 24) の平均同時在室人数（channel_id を省くとサーバー全体の合計）"""
+        totals = np.zeros((7, 24), dtype=np.float64)
+        counts = np.zeros((7, 1), dtype=np.float64)
+        row = self._index(guild_id)["channels"].rows.get(channel_id) if channel_id else None
+        for day, array in self._days(guild_id, "occ", days, at):
+            if channel_id:
+                if row is None or row >= array.shape[0]:
+                    continue
+                per_slot = array[row].astype(np.float64)
+            else:
+                per_slot = array.sum(axis=0, dtype=np.float64)
+            weekday = datetime.strptime(day, "%Y%m%d").weekday()
+            totals[weekday] += per_slot.reshape(24, -1).mean(axis=1)
+            counts[weekday] += 1
+        return np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+
+    def peaks(self, guild_id: int, days: int = 28, top: int = 5, at: float = None) -> dict:
+        """サーバー全体とチャンネルごとの最大同時在室人数とその時刻"""
+        by_row = {}
+        server = (0, None)
+        for day, array in self._days(guild_id, "occ", days, at):
+            if not array.shape[0]:
+                continue
+            per_slot = array.sum(axis=0)
+            slot = int(per_slot.argmax())
+            if per_slot[slot] > server[0]:
+                server = (int(per_slot[slot]), (day, slot))
+            row_max = array.max(axis=1)
+            row_slot = array.argmax(axis=1)
+            for row in np.flatnonzero(row_max):
+                if row_max[row] > by_row.get(row, (0,))[0]:
+                    by_row[int(row)] = (int(row_max[row]), (day, int(row_slot[row])))
+        channel_of = {row: cid for cid, row in self._index(guild_id)["channels"].rows.items()}
+        ranked = sorted(by_row.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        return {
+            "server": server,
+            "channels": [(channel_of.get(row), value, when) for row, (value, when) in ranked],
+        }
+
+    def member_totals(self, guild_id: int, days: int = 28, top: int = 10, at: float = None) -> list:
+        """[(member_id, 在室秒数), ...] を長い順に"""
+        arrays = [array for _, array in self._days(guild_id, "sec", days, at)]
+        if not arrays:
+            return []
+        width = max(array.shape[0] for array in arrays)
+        total = np.zeros(width, dtype=np.uint64)
+        for array in arrays:
+            total[:array.shape[0]] += array
+        order = np.argsort(total)[::-1][:top]
+        member_of = {row: mid for mid, row in self._index(guild_id)["members"].rows.items()}
+        return [(member_of.get(int(row)), int(total[row])) for row in order if total[row]]
+
+    def stats(self) -> dict:
+        return {
+            "guilds": len(self._guilds),
+            "channels": sum(len(i["channels"].rows) for i in self._guilds.values()),
+            "members": sum(len(i["members"].rows) for i in self._guilds.values()),
+            "open_arrays": len(self._open),
+            "samples": self.samples,
+            "grown": self.grown,
+            "pruned_files": self.pruned_files,
+        }
+
+
+def _when(when) -> str:
+    if not when:
+        return "-"
+    day, slot = when
+    minutes = slot * SLOT_SECONDS // 60
+    return f"{day[:4]}/{day[4:6]}/{day[6:]} {minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class VcAnalyticsCog(commands.Cog):
+    def __init__(self, bot: commands.Bot, config_manager: ConfigManager):
+        self.bot = bot
+        self.config_manager = config_manager
+        self.store = VoiceOccupancyStore()
+        self._credited = {}   # (guild_id, member_id) → 在室秒数を最後に加算した時刻
+        self._last_prune = 0.0
+        self.sample_loop.start()
+
+    async def cog_unload(self):
+        self.sample_loop.cancel()
+        self.sample(time.time())
+        self.store.flush()
+
+    # ---------- 記録 ----------
+    def sample(self, now: float):
+        """ペアの A サーバーの全 VC の在室人数を記録し、在室中のメンバーに経過時間を加算する"""
+        for guild in self.bot.guilds:
+            # vc_here と同じく、設定済みの A サーバーだけを対象にする
+            if not self.config_manager.get_pair_by_a(guild.id):
+                continue
+            counts = {}
+            seconds = {}
+            for vc in guild.voice_channels:
+                humans = [m for m in vc.members if not m.bot]
+                if not humans:
+                    continue
+                counts[vc.id] = len(humans)
+                for m in humans:
+                    since = self._credited.get((guild.id, m.id), now)
+                    # 取りこぼし（切断中など）で大きく数えないよう上限を付ける
+                    seconds[m.id] = min(now - since, 2 * SAMPLE_SECONDS)
+                    self._credited[(guild.id, m.id)] = now
+            self.store.record_occupancy(guild.id, counts, now)
+            self.store.add_seconds(guild.id, {k: v for k, v in seconds.items() if v > 0}, now)
+
+    @tasks.loop(seconds=SAMPLE_SECONDS)
+    async def sample_loop(self):
+        now = time.time()
+        self.sample(now)
+        self.store.flush(now)
+        if now - self._last_prune > 86400:
+            self._last_prune = now
+            self.store.prune(now)
+
+    @sample_loop.before_loop
+    async def before_sample_loop(self):
+        await self.bot.wait_until_ready()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        if member.bot or before.channel == after.channel or not self.config_manager.get_pair_by_a(member.guild.id):
+            return
+        now = time.time()
+        key = (member.guild.id, member.id)
+        if before.channel is not None and key in self._credited:
+            # 前回の集計から退室までの分
+            self.store.add_seconds(member.guild.id, {member.id: min(now - self._credited.pop(key), 2 * SAMPLE_SECONDS)}, now)
+        if after.channel is not None:
+            self._credited[key] = now
+        # 次の集計を待たずに、変化した VC の人数（短時間のピーク）を記録する
+        counts = {
+            ch.id: len([m for m in ch.members if not m.bot])
+            for ch in (before.channel, after.channel) if ch is not None
+        }
+        self.store.record_occupancy(member.guild.id, counts, now)
+
+    # ---------- コマンド ----------
+    async def _target_guild(self, ctx: commands.Context):
+        """管理者チェックし、集計対象のギルド（ペアの A サーバー、無ければ実行したサーバー）を返す"""
+        if not self.config_manager.is_admin(ctx.guild.id, ctx.author.id):
+            await ctx.send("❌ 管理者ではありません。")
+            return None
+        pair = self.config_manager.get_pair_by_guild(ctx.guild.id)
+        guild = self.bot.get_guild(pair.get("A_ID")) if pair else None
+        return guild or ctx.guild
+
+    @commands.command(name="vc_heatmap")
+    async def vc_heatmap(self, ctx: commands.Context, days: int = 28, channel: discord.VoiceChannel = None):
+        """曜日×時間の平均同時在室人数（濃いほど多い）"""
+        guild = await self._target_guild(ctx)
+        if guild is None:
+            return
+        grid = self.store.heatmap(guild.id, max(1, min(days, RETENTION_DAYS)), channel.id if channel else None)
+        peak = grid.max()
+        if peak <= 0:
+            await ctx.send("📭 この期間の記録がありません。")
+            return
+        levels = np.ceil(grid / peak * (len(HEAT_LEVELS) - 1)).astype(int)
+        lines = ["   " + "".join(f"{h:<3d}" if h % 3 == 0 else "" for h in range(24))]
+        for weekday in range(7):
+            lines.append(f"{WEEKDAYS[weekday]} " + "".join(HEAT_LEVELS[v] for v in levels[weekday]))
+        target = channel.name if channel else guild.name
+        await ctx.send(f"🗓 {target} 直近{days}日（最大 平均{peak:.1f}人）\n```\n" + "\n".join(lines) + "\n```")
+
+    @commands.command(name="vc_peak")
+    async def vc_peak(self, ctx: commands.Context, days: int = 28):
+        """最大同時在室人数（サーバー全体・チャンネル別）"""
+        guild = await self._target_guild(ctx)
+        if guild is None:
+            return
+        result = self.store.peaks(guild.id, max(1, min(days, RETENTION_DAYS)))
+        value, when = result["server"]
+        lines = [f"サーバー全体: {value}人（{_when(when)}）"]
+        for channel_id, value, when in result["channels"]:
+            channel = guild.get_channel(channel_id)
+            lines.append(f"{getattr(channel, 'name', channel_id)}: {value}人（{_when(when)}）")
+        await ctx.send(f"📈 直近{days}日の最大同時在室\n```\n" + "\n".join(lines) + "\n```")
+
+    @commands.command(name="vc_top")
+    async def vc_top(self, ctx: commands.Context, days: int = 28, count: int = 10):
+        """メンバー別の在室時間ランキング"""
+        guild = await self._target_guild(ctx)
+        if guild is None:
+            return
+        totals = self.store.member_totals(guild.id, max(1, min(days, RETENTION_DAYS)), max(1, min(count, 50)))
+        if not totals:
+            await ctx.send("📭 この期間の記録がありません。")
+            return
+        lines = []
+        for i, (member_id, seconds) in enumerate(totals, start=1):
+            member = guild.get_member(member_id)
+            name = member.display_name if member else str(member_id)
+            lines.append(f"{i:>2}. {name}: {seconds // 3600}時間{seconds % 3600 // 60:02d}分")
+        await ctx.send(f"🏆 直近{days}日の在室時間\n```\n" + "\n".join(lines) + "\n```")
+
+
+# ---------- Cogセットアップ ----------
+async def setup(bot: commands.Bot):
+    config_manager = getattr(bot, "config_manager", None)
+    if not config_manager:
+        raise RuntimeError("ConfigManager が bot にセットされていません")
+    await bot.add_cog(VcAnalyticsCog(bot, config_manager))
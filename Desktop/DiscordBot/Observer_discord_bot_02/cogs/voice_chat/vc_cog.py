@@ -1,138 +1,285 @@
 # cogs/voice_chat/vc_cog.py
-from discord.ext import commands
+from discord.ext import commands, tasks
 import discord
 from config_manager import ConfigManager
+import time
 from datetime import datetime
+from cogs.voice_chat.vc_session import VoiceSession, VoiceSessionTracker, format_duration
+from utils.audit_batcher import pack_embeds
+
+SUMMARY_MINUTES = 15  # summary モードでまとめを送る間隔
+VC_HERE_DESCRIPTION_CHARS = 1400  # 1メッセージに複数の VC が収まる大きさ
+VC_HERE_TIMEOUT_SECONDS = 300
 
 class VcCog(commands.Cog):
     def __init__(self, bot: commands.Bot, config_manager: ConfigManager):
         self.bot = bot
         self.config_manager = config_manager
+        # VC ごとの通話状態（通話の開始・終了と在室時間）
+        self.sessions = VoiceSessionTracker()
+        self._finished = {}  # guild_id → summary モードで次のまとめに載せる終了済みの通話
+        self._warned_no_log = set()  # VC_LOG_CHANNEL が無いことを警告済みのギルド
+        self.summary_loop.start()
         self.bot.loop.create_task(self.wait_until_ready_debug())
 
+    async def cog_unload(self):
+        self.summary_loop.cancel()
+
     async def wait_until_ready_debug(self):
         await self.bot.wait_until_ready()
         await self.send_debug("[DEBUG] VcCog loaded")
 
     # ---------------- DEBUG送信 ----------------
-    async def send_debug(self, message: str = None, fallback_channel: discord.TextChannel = None, mention_everyone: bool = False):
-        target_channel = fallback_channel
-        if not target_channel:
-            for pair in self.config_manager.config.get("server_pairs", []):
-                debug_id = pair.get("DEBUG_CHANNEL")
-                if debug_id:
-                    target_channel = self.bot.get_channel(debug_id)
-                    if target_channel:
-                        break
-        if target_channel and message:
-            try:
-                if mention_everyone:
-                    await target_channel.send(f"@everyone {message}")
-                else:
-                    await target_channel.send(message)
-            except Exception as e:
-                print(f"[DEBUG送信失敗] {message} ({e})")
+    async def send_debug(self, message: str = None, fallback_channel: discord.TextChannel = None, mention_everyone: bool = False, guild_id: int = None):
+        """共通デバッグ出力へ積む（guild_id を渡すとそのペアの DEBUG_CHANNEL へ）"""
+        if not message:
+            return
+        if fallback_channel:
+            channel_id = fallback_channel.id
+        elif guild_id:
+            channel_id = self.config_manager.get_fixed_channel(guild_id, "DEBUG_CHANNEL")
         else:
-            print(f"[DEBUG] {message} (チャンネル未設定または送信失敗)")
+            channel_id = None
+        if mention_everyone:
+            message = f"@everyone {message}"
+        self.bot.debug_sink.log(message, channel_id=channel_id)
 
     # ---------------- VC_LOG送信（Embed用） ----------------
-    async def send_vc_log(self, embed: discord.Embed, fallback_channel: discord.TextChannel = None, mention_everyone: bool = False):
+    async def send_vc_log(self, embed: discord.Embed, fallback_channel: discord.TextChannel = None, mention_everyone: bool = False, guild_id: int = None):
+        """guild_id を渡すとそのギルドのペアの VC_LOG_CHANNEL へ送る（ペア未登録のギルドでは何もしない）"""
         target_channel = fallback_channel
-        if not target_channel:
-            for pair in self.config_manager.config.get("server_pairs", []):
-                vc_log_id = pair.get("VC_LOG_CHANNEL")
-                if vc_log_id:
-                    target_channel = self.bot.get_channel(vc_log_id)
-                    if target_channel:
-                        break
+        if not target_channel and guild_id:
+            if not self.config_manager.get_server_config(guild_id):
+                return
+            vc_log_id = self.config_manager.get_fixed_channel(guild_id, "VC_LOG_CHANNEL")
+            target_channel = self.bot.get_channel(vc_log_id) if vc_log_id else None
         if target_channel:
-            try:
-                if mention_everyone:
-                    await target_channel.send("@everyone", embed=embed)
-                else:
-                    await target_channel.send(embed=embed)
-            except Exception as e:
-                print(f"[VC_LOG送信失敗] embed ({e})")
-        else:
-            print(f"[VC_LOG] embed (チャンネル未設定または送信失敗)")
+            self._warned_no_log.discard(guild_id)
+            # 失敗はスケジューラ側で [WARN] として出力される
+            if mention_everyone:
+                self.bot.send_scheduler.send(target_channel, "@everyone", embed=embed)
+            else:
+                self.bot.send_scheduler.send(target_channel, embed=embed)
+        elif guild_id not in self._warned_no_log:
+            # 通話が終わるたびに出さないよう、ギルドごとに1回だけ
+            self._warned_no_log.add(guild_id)
+            print(f"[WARN] VC_LOG_CHANNEL が未設定か見つからないため VC ログを送れません（guild={guild_id}）")
+
+    def log_mode(self, guild_id: int) -> str:
+        """call: 通話ごとに開始・終了を送る / summary: SUMMARY_MINUTES ごとにまとめて送る"""
+        server_config = self.config_manager.get_server_config(guild_id) or {}
+        return server_config.get("VC_LOG_MODE", "call")
+
+    # ---------------- 通話の開始・終了 ----------------
+    async def on_session_start(self, session: VoiceSession):
+        if self.log_mode(session.guild_id) != "call" or session.reconciled:
+            return
+        embed = discord.Embed(title="通話開始", color=discord.Color.green(), timestamp=datetime.utcnow())
+        embed.add_field(name="チャンネル", value=session.channel_name, inline=True)
+        embed.add_field(name="始めた人", value=session.starter, inline=True)
+        embed.add_field(name="開始時間", value=f"<t:{int(session.started_at)}:T>", inline=True)
+        await self.send_vc_log(embed=embed, guild_id=session.guild_id)
+
+    async def on_session_end(self, session: VoiceSession):
+        if self.log_mode(session.guild_id) != "call":
+            self._finished.setdefault(session.guild_id, []).append(session)
+            return
+        embed = discord.Embed(title="通話終了", color=discord.Color.red(), timestamp=datetime.utcnow())
+        embed.add_field(name="チャンネル", value=session.channel_name, inline=True)
+        embed.add_field(name="通話時間", value=format_duration(session.duration()), inline=True)
+        embed.add_field(name="最大人数", value=f"{session.peak}人", inline=True)
+        started = f"<t:{int(session.started_at)}:T>" + ("（確認時刻）" if session.reconciled else "")
+        embed.add_field(name="開始 → 終了", value=f"{started} → <t:{int(session.ended_at)}:T>", inline=False)
+        embed.add_field(name=f"参加者（{len(session.totals)}人）", value=self._member_lines(session), inline=False)
+        await self.send_vc_log(embed=embed, guild_id=session.guild_id)
+
+    @staticmethod
+    def _member_lines(session: VoiceSession, count: int = 10) -> str:
+        lines = [f"{name}: {format_duration(seconds)}" for name, seconds in session.top_members(count)]
+        rest = len(session.names) - len(lines)
+        if rest > 0:
+            lines.append(f"…ほか{rest}人")
+        return "\n".join(lines)[:1024] or "なし"
+
+    # ---------------- 定期まとめ（summary モード） ----------------
+    @tasks.loop(minutes=SUMMARY_MINUTES)
+    async def summary_loop(self):
+        finished, self._finished = self._finished, {}
+        guild_ids = set(finished) | {s.guild_id for s in self.sessions.active()}
+        for guild_id in guild_ids:
+            if self.log_mode(guild_id) != "summary":
+                continue
+            ended = finished.get(guild_id, [])
+            ongoing = self.sessions.active(guild_id)
+            if not ended and not ongoing:
+                continue
+            embed = discord.Embed(title=f"VC まとめ（{SUMMARY_MINUTES}分間）", color=discord.Color.blurple(), timestamp=datetime.utcnow())
+            lines = [
+                f"🔴 {s.channel_name}: <t:{int(s.started_at)}:t>〜<t:{int(s.ended_at)}:t> "
+                f"{format_duration(s.duration())} / {len(s.totals)}人（最大{s.peak}人）"
+                for s in ended
+            ]
+            lines += [
+                f"🟢 {s.channel_name}: <t:{int(s.started_at)}:t>〜 {format_duration(s.duration())} / 在室{len(s.present)}人"
+                for s in ongoing
+            ]
+            text = "\n".join(lines)
+            embed.description = text if len(text) <= 4000 else text[:4000] + "\n…"
+            await self.send_vc_log(embed=embed, guild_id=guild_id)
+
+    @summary_loop.before_loop
+    async def before_summary_loop(self):
+        await self.bot.wait_until_ready()
+
+    # ---------------- 再接続時の突き合わせ ----------------
+    @commands.Cog.listener()
+    async def on_ready(self):
+        await self.reconcile_all()
+
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        await self.reconcile_all()
+
+    async def reconcile_all(self):
+        for guild in self.bot.guilds:
+            started, ended = self.sessions.reconcile(guild)
+            for session in started:
+                await self.on_session_start(session)
+            for session in ended:
+                await self.on_session_end(session)
 
     # ---------------- VC参加/退出/移動イベント ----------------
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
         if member.bot or not member.guild:
             return
+        if before.channel == after.channel:
+            return  # ミュート・画面共有などの変化
+
+        # 移動は「移動元から退室 → 移動先へ入室」として数える（個別の通知は送らない）
+        if before.channel is not None:
+            ended = self.sessions.leave(before.channel.id, member.id)
+            if ended:
+                await self.on_session_end(ended)
+        if after.channel is not None:
+            started = self.sessions.join(member.guild.id, after.channel, member.id, member.display_name)
+            if started:
+                await self.on_session_start(started)
 
-        await self.send_debug(
-            f"VC状態変化受信: member={member.display_name}, "
-            f"before={getattr(before.channel,'name',None)}, "
-            f"after={getattr(after.channel,'name',None)}"
-        )
-
-        embed = None
-        if before.channel != after.channel:
-            timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-
-            if before.channel is None and after.channel is not None:
-                embed = discord.Embed(title="通話開始", color=discord.Color.green(), timestamp=datetime.utcnow())
-                embed.add_field(name="チャンネル", value=after.channel.name, inline=True)
-                embed.add_field(name="始めた人", value=member.display_name, inline=True)
-                embed.add_field(name="開始時間", value=timestamp, inline=True)
-
-            elif before.channel is not None and after.channel is None:
-                embed = discord.Embed(title="通話終了", color=discord.Color.red(), timestamp=datetime.utcnow())
-                embed.add_field(name="チャンネル", value=before.channel.name, inline=True)
-                embed.add_field(name="退出した人", value=member.display_name, inline=True)
-                embed.add_field(name="終了時間", value=timestamp, inline=True)
-
-            elif before.channel is not None and after.channel is not None:
-                embed = discord.Embed(title="VC移動", color=discord.Color.orange(), timestamp=datetime.utcnow())
-                embed.add_field(name="移動元", value=before.channel.name, inline=True)
-                embed.add_field(name="移動先", value=after.channel.name, inline=True)
-                embed.add_field(name="メンバー", value=member.display_name, inline=True)
-
-        if embed:
-            embed.set_footer(text=f"member id: {member.id}")
-            if member.avatar:
-                embed.set_thumbnail(url=member.avatar.url)
-            await self.send_vc_log(embed=embed)
+    @commands.command(name="vc_log_mode")
+    async def vc_log_mode(self, ctx: commands.Context, mode: str):
+        """VC_LOG の送り方を切り替える: call（通話ごと）/ summary（定期まとめ）"""
+        pair = self.config_manager.get_pair_by_guild(ctx.guild.id)
+        if not pair or ctx.author.id not in pair.get("ADMIN_IDS", []):
+            await ctx.send("⚠️ 管理者のみ使用可能です。")
+            return
+        if mode not in ("call", "summary"):
+            await ctx.send("⚠️ call か summary を指定してください。")
+            return
+        self.config_manager.set_pair_value(pair, "VC_LOG_MODE", mode)
+        await ctx.send(f"✅ VC_LOG を {mode} モードにしました。\n{self.sessions.stats()}")
 
     # ---------------- VC状況確認コマンド ----------------
+    def snapshot_embeds(self, guild: discord.Guild) -> list:
+        """guild の在室状況を VC ごとの表形式 Embed にする（ゲートウェイのキャッシュだけを見る）"""
+        embeds = []
+        now = time.time()
+        for vc in guild.voice_channels:
+            members = vc.members
+            if not members:
+                continue
+            session = self.sessions.session(vc.id)
+            seconds = session.member_seconds(now) if session else {}
+            lines = []
+            for i, m in enumerate(members, start=1):
+                stay = f" ・{format_duration(seconds[m.id])}" if m.id in seconds else ""
+                flags = "🤖" if m.bot else ""
+                lines.append(f"`{i:>2}.` {flags}{m.display_name}{stay}")
+            title = f"🔊 {guild.name} / {vc.name}（{len(members)}人）"
+            if session:
+                title += f" 通話 {format_duration(session.duration(now))}"
+            # 1つの Embed の説明文に収まらない人数なら続きの Embed に分ける
+            chunk = []
+            length = 0
+            for line in lines:
+                if chunk and length + len(line) + 1 > VC_HERE_DESCRIPTION_CHARS:
+                    embeds.append(discord.Embed(title=title[:256], description="\n".join(chunk), color=discord.Color.blue()))
+                    title = f"{vc.name}（続き）"
+                    chunk = []
+                    length = 0
+                chunk.append(line)
+                length += len(line) + 1
+            embeds.append(discord.Embed(title=title[:256], description="\n".join(chunk), color=discord.Color.blue()))
+        return embeds
+
     @commands.command(name="vc_here")
     async def vc_here(self, ctx: commands.Context):
-        """AサーバーのVC状況をチャンネルごとにメンバー1人1Embedで表示"""
-
-        server_pairs = self.config_manager.config.get("server_pairs", [])
-
-        for pair in server_pairs:
+        """全ペアの AサーバーのVC状況を、VCごとの表 Embed（1メッセージ最大10個）でページ表示"""
+        embeds = []
+        for pair in self.config_manager.config.get("server_pairs", []):
             a_server_id = pair.get("A_ID")
             server = self.bot.get_guild(a_server_id)
             if not server:
                 await self.send_debug(f"Aサーバー取得失敗: server_id={a_server_id}")
                 continue
+            embeds.extend(self.snapshot_embeds(server))
+
+        if not embeds:
+            await ctx.send("🔇 VC に誰もいません。")
+            return
+        pages = pack_embeds(embeds)
+        if len(pages) == 1:
+            await ctx.send(embeds=pages[0])
+            return
+        view = VcHerePager(ctx.author.id, pages)
+        view.message = await ctx.send(content=view.label(), embeds=pages[0], view=view)
 
-            for vc in server.voice_channels:
-                members = vc.members
-                if not members:
-                    continue
-
-                # チャンネル名を先に表示
-                await ctx.send(f"**{vc.name}（{len(members)}人）**")
-
-                # メンバーごとにEmbed作成
-                for i, m in enumerate(members, start=1):
-                    embed = discord.Embed(
-                        title=f"member No.{i}",
-                        timestamp=datetime.utcnow(),
-                        color=discord.Color.blue()
-                    )
-                    embed.add_field(name="channel", value=vc.name, inline=True)
-                    embed.add_field(name="name", value=m.display_name, inline=True)
-                    embed.add_field(name="開始時間", value=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"), inline=True)
-                    embed.set_footer(text=f"member id: {m.id}")
-                    if m.avatar:
-                        embed.set_thumbnail(url=m.avatar.url)
-
-                    await ctx.send(embed=embed)
+
+class VcHerePager(discord.ui.View):
+    """vc_here のページ送り（1ページ = 1メッセージ分の Embed）"""
+
+    def __init__(self, author_id: int, pages: list):
+        super().__init__(timeout=VC_HERE_TIMEOUT_SECONDS)
+        self.author_id = author_id
+        self.pages = pages
+        self.index = 0
+        self.message = None
+        self._sync_buttons()
+
+    def label(self) -> str:
+        return f"📄 {self.index + 1}/{len(self.pages)}"
+
+    def _sync_buttons(self):
+        self.prev_page.disabled = self.index == 0
+        self.next_page.disabled = self.index >= len(self.pages) - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ 実行した本人だけが操作できます。", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction):
+        self._sync_buttons()
+        await interaction.response.edit_message(content=self.label(), embeds=self.pages[self.index], view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index -= 1
+        await self._show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index += 1
+        await self._show(interaction)
+
+    async def on_timeout(self):
+        # 期限切れ後はボタンを外す（押しても反応しないため）
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
 
 # ---------------- Cogセットアップ ----------------
 async def setup(bot: commands.Bot):
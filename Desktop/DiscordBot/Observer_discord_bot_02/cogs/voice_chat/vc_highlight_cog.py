@@ -2,11 +2,10 @@
 import discord
 from discord.ext import commands, tasks
 import asyncio
-import numpy as np
 import wave
 import io
-from collections import deque
 import time
+from cogs.voice_chat.pcm_ring import PcmRingBuffer
 
 THRESHOLD = 0.05  # 音量閾値（0～1の範囲）
 PRE_BUFFER_SECONDS = 17
@@ -14,14 +13,17 @@ POST_BUFFER_SECONDS = 3
 SAMPLE_RATE = 48000  # Discord PCM は 48kHz
 CHANNELS = 2  # ステレオ
 SAMPLES_PER_FRAME = 960  # Discord voice frame: 20ms
+PRE_FRAMES = PRE_BUFFER_SECONDS * SAMPLE_RATE // SAMPLES_PER_FRAME
+POST_FRAMES = POST_BUFFER_SECONDS * SAMPLE_RATE // SAMPLES_PER_FRAME
 
 class VCHighlightCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.ring_buffer = deque(maxlen=int(PRE_BUFFER_SECONDS * SAMPLE_RATE / SAMPLES_PER_FRAME))
+        # 前後バッファ分を確保済みの int16 リング（切り出しが終わるまで前バッファは上書きされない）
+        self.ring = PcmRingBuffer(PRE_FRAMES + POST_FRAMES, SAMPLES_PER_FRAME * CHANNELS)
         self.recording = False
-        self.post_frames_remaining = 0
-        self.audio_queue = deque()
+        self.clip_start = 0  # 切り出すフレーム番号 [clip_start, clip_end)
+        self.clip_end = 0
         self.vc = None
         self.listen_task = None
         self.target_channel_id = None  # WAV送信先チャンネル
@@ -59,23 +61,21 @@ class VCHighlightCog(commands.Cog):
         while True:
             await asyncio.sleep(0.02)  # 20msごと
             frame = self.get_audio_frame()  # 自作関数でPCMデータ取得
-            self.ring_buffer.append(frame)
+            row = self.ring.write(frame)  # 確保済みの行へその場でコピー
 
-            # RMSで音量判定
-            rms = np.sqrt(np.mean(np.array(frame, dtype=np.float32)**2))
-            if rms >= THRESHOLD and not self.recording:
-                self.recording = True
-                self.post_frames_remaining = int(POST_BUFFER_SECONDS * SAMPLE_RATE / SAMPLES_PER_FRAME)
-                self.audio_queue.extend(self.ring_buffer)  # 前バッファをコピー
-                print(f"トリガー検出: RMS={rms:.3f}")
+            if not self.recording:
+                # RMSで音量判定（サンプル単位、0～1）
+                rms = self.ring.rms(row)
+                if rms >= THRESHOLD:
+                    self.recording = True
+                    # 今のフレームまでの前バッファ＋この後の後バッファ
+                    self.clip_end = self.ring.written + POST_FRAMES
+                    self.clip_start = max(self.ring.oldest, self.clip_end - PRE_FRAMES - POST_FRAMES)
+                    print(f"トリガー検出: RMS={rms:.3f}")
 
-            if self.recording:
-                self.audio_queue.append(frame)
-                self.post_frames_remaining -= 1
-                if self.post_frames_remaining <= 0:
-                    await self.save_and_send()
-                    self.recording = False
-                    self.audio_queue.clear()
+            if self.recording and self.ring.written >= self.clip_end:
+                await self.save_and_send()
+                self.recording = False
 
     async def save_and_send(self):
         """
@@ -94,9 +94,9 @@ class VCHighlightCog(commands.Cog):
         wf.setnchannels(CHANNELS)
         wf.setsampwidth(2)  # 16bit
         wf.setframerate(SAMPLE_RATE)
-        # PCMデータを結合して書き込み
-        for frame in self.audio_queue:
-            wf.writeframes(frame)
+        # リング上の連続区間（折り返していれば2つ）をそのまま書き込む。送信を待つ前に書き終えるので上書きされない
+        for part in self.ring.slices(self.clip_start, self.clip_end):
+            wf.writeframes(memoryview(part).cast("B"))
         wf.close()
         wav_buffer.seek(0)
         await channel.send(file=discord.File(fp=wav_buffer, filename=f"highlight_{int(time.time())}.wav"))
@@ -0,0 +1,156 @@
+# cogs/voice_chat/vc_session.py
+import time
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}時間{minutes:02d}分"
+    if minutes:
+        return f"{minutes}分{seconds:02d}秒"
+    return f"{seconds}秒"
+
+
+class VoiceSession:
+    """1つの VC での1回の通話（最初の1人が入ってから最後の1人が出るまで）"""
+
+    __slots__ = (
+        "guild_id", "channel_id", "channel_name", "started_at", "ended_at",
+        "starter", "present", "totals", "names", "peak", "reconciled",
+    )
+
+    def __init__(self, guild_id: int, channel_id: int, channel_name: str, started_at: float, starter: str, reconciled: bool = False):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.channel_name = channel_name
+        self.started_at = started_at
+        self.ended_at = None
+        self.starter = starter
+        self.present = {}   # member_id → 入室時刻
+        self.totals = {}    # member_id → 退室済みの在室秒数
+        self.names = {}     # member_id → 表示名
+        self.peak = 0
+        # 起動・再接続時に既に始まっていた通話（開始時刻は確認した時刻）
+        self.reconciled = reconciled
+
+    def _now(self, at: float = None) -> float:
+        if self.ended_at is not None:
+            return self.ended_at
+        return time.time() if at is None else at
+
+    def duration(self, at: float = None) -> float:
+        return self._now(at) - self.started_at
+
+    def member_seconds(self, at: float = None) -> dict:
+        """{member_id: 在室秒数}（在室中の分は at までを数える）"""
+        at = self._now(at)
+        seconds = dict(self.totals)
+        for member_id, since in self.present.items():
+            seconds[member_id] = seconds.get(member_id, 0.0) + at - since
+        return seconds
+
+    def top_members(self, count: int = 10, at: float = None) -> list:
+        """[(表示名, 在室秒数), ...] を在室時間の長い順に"""
+        seconds = self.member_seconds(at)
+        ranked = sorted(seconds.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [(self.names.get(member_id, str(member_id)), value) for member_id, value in ranked]
+
+
+class VoiceSessionTracker:
+    """VC ごとの通話状態を持つ状態機械
+
+    状態変化ごとに join / leave を呼ぶと、通話が始まったとき・終わったときだけ
+    VoiceSession を返す。途中の入退室・移動は在室時間の集計に使うだけで、
+    呼び出し側が1件ずつ通知する必要はない。
+    再接続で取りこぼしたイベントは reconcile() で実際の在室者と突き合わせて直す。
+    """
+
+    def __init__(self):
+        self._sessions = {}   # channel_id → VoiceSession
+
+        # 統計
+        self.events = 0
+        self.started = 0
+        self.ended = 0
+        self.reconciled = 0
+
+    def session(self, channel_id: int):
+        return self._sessions.get(channel_id)
+
+    def active(self, guild_id: int = None) -> list:
+        return [s for s in self._sessions.values() if guild_id is None or s.guild_id == guild_id]
+
+    def join(self, guild_id: int, channel, member_id: int, name: str, at: float = None, reconciled: bool = False):
+        """入室。通話が始まった場合はその VoiceSession を返す"""
+        self.events += 1
+        at = time.time() if at is None else at
+        started = None
+        session = self._sessions.get(channel.id)
+        if session is None:
+            session = self._sessions[channel.id] = VoiceSession(guild_id, channel.id, channel.name, at, name, reconciled)
+            self.started += 1
+            started = session
+        session.channel_name = channel.name
+        session.names[member_id] = name
+        session.present.setdefault(member_id, at)
+        session.peak = max(session.peak, len(session.present))
+        return started
+
+    def leave(self, channel_id: int, member_id: int, at: float = None):
+        """退室。最後の1人が出て通話が終わった場合はその VoiceSession を返す"""
+        self.events += 1
+        at = time.time() if at is None else at
+        session = self._sessions.get(channel_id)
+        if session is None or member_id not in session.present:
+            return None
+        since = session.present.pop(member_id)
+        session.totals[member_id] = session.totals.get(member_id, 0.0) + at - since
+        if session.present:
+            return None
+        session.ended_at = at
+        del self._sessions[channel_id]
+        self.ended += 1
+        return session
+
+    def reconcile(self, guild, at: float = None) -> tuple:
+        """guild.voice_channels の実際の在室者に合わせる → (始まった通話, 終わった通話)"""
+        at = time.time() if at is None else at
+        started, ended = [], []
+        live = {}
+        for channel in guild.voice_channels:
+            humans = {m.id: m for m in channel.members if not m.bot}
+            if humans:
+                live[channel.id] = (channel, humans)
+
+        # 先に入室を反映するので、切断中に顔ぶれが入れ替わっただけの通話は続いているものとして扱う
+        for channel, humans in live.values():
+            session = self._sessions.get(channel.id)
+            for member in humans.values():
+                if session is not None and member.id in session.present:
+                    continue
+                self.reconciled += 1
+                new = self.join(guild.id, channel, member.id, member.display_name, at, reconciled=True)
+                if new:
+                    started.append(new)
+                    session = new
+
+        for session in [s for s in self._sessions.values() if s.guild_id == guild.id]:
+            humans = live.get(session.channel_id, (None, {}))[1]
+            for member_id in [m for m in session.present if m not in humans]:
+                self.reconciled += 1
+                done = self.leave(session.channel_id, member_id, at)
+                if done:
+                    ended.append(done)
+        return started, ended
+
+    def stats(self) -> dict:
+        return {
+            "active_sessions": len(self._sessions),
+            "present": sum(len(s.present) for s in self._sessions.values()),
+            "events": self.events,
+            "started": self.started,
+            "ended": self.ended,
+            "reconciled": self.reconciled,
+        }
@@ -0,0 +1,125 @@
+# config_journal.py
+import copy
+import json
+import os
+import time
+
+JOURNAL_LOCAL_PATH = os.path.join("data", "config_journal.jsonl")
+# Drive にまだ反映されていない操作（競合時のマージ用）。ローカルのスナップショットとは別に持つ
+UNSYNCED_LOCAL_PATH = os.path.join("data", "config_unsynced.jsonl")
+
+# どちらかを超えたらスナップショットにまとめ直す（compaction）
+COMPACT_MAX_BYTES = 256 * 1024
+COMPACT_MAX_AGE_SECONDS = 30 * 60
+
+
+# ------------------------ 操作の適用 ------------------------
+# 操作は1行1件の JSON。ペアは変わらない B_ID で特定する。
+# どの操作も同じものを2回適用しても結果が変わらない（再生・マージで重複してよい）
+#   {"op": "add_pair",  "pair": {...}}
+#   {"op": "add_admin", "b_id": 1, "user_id": 2}
+#   {"op": "set",       "b_id": 1, "key": "A_ID", "value": 3}
+#   {"op": "map",       "b_id": 1, "src": "4", "dest": 5}
+#   {"op": "unmap",     "b_id": 1, "src": "4"}
+# 転送の到達点はペアではなく config 直下に持つ（到達点は大きい方を残すので順序に依存しない）
+#   {"op": "checkpoint", "src": "4", "message_id": 6}
+#   {"op": "backfill",   "src": "4", "state": {...} または null}
+def find_pair(config: dict, b_id):
+    for pair in config.get("server_pairs", []):
+        if pair.get("B_ID") == b_id:
+            return pair
+    return None
+
+
+def apply_op(config: dict, op: dict):
+    kind = op.get("op")
+    if kind == "add_pair":
+        if find_pair(config, op["pair"].get("B_ID")) is None:
+            config.setdefault("server_pairs", []).append(copy.deepcopy(op["pair"]))
+        return
+    if kind == "checkpoint":
+        checkpoints = config.setdefault("relay_checkpoints", {})
+        checkpoints[str(op["src"])] = max(checkpoints.get(str(op["src"]), 0), op["message_id"])
+        return
+    if kind == "backfill":
+        states = config.setdefault("backfill_state", {})
+        if op["state"] is None:
+            states.pop(str(op["src"]), None)
+        else:
+            states[str(op["src"])] = copy.deepcopy(op["state"])
+        return
+
+    pair = find_pair(config, op.get("b_id"))
+    if pair is None:
+        print(f"[WARN] ジャーナル適用先のペアがありません: {op}")
+        return
+    if kind == "add_admin":
+        admins = pair.setdefault("ADMIN_IDS", [])
+        if op["user_id"] not in admins:
+            admins.append(op["user_id"])
+    elif kind == "set":
+        pair[op["key"]] = op["value"]
+    elif kind == "map":
+        pair.setdefault("CHANNEL_MAPPING", {})[str(op["src"])] = op["dest"]
+    elif kind == "unmap":
+        pair.get("CHANNEL_MAPPING", {}).pop(str(op["src"]), None)
+    else:
+        print(f"[WARN] 未知のジャーナル操作: {op}")
+
+
+class ConfigJournal:
+    """config への小さな変更を追記していくジャーナル
+
+    スレッドから呼ばれる前提（ConfigPersister の flush 内）で、ループ上では使わない。
+    """
+
+    def __init__(self, path: str = JOURNAL_LOCAL_PATH):
+        self.path = path
+        try:
+            self.size = os.path.getsize(path)
+        except OSError:
+            self.size = 0
+        # 未コンパクションの最古の追記時刻（既存ジャーナルがあれば起動時刻から数える）
+        self.first_append_at = time.monotonic() if self.size else None
+        self.append_count = 0
+        self.compact_count = 0
+
+    def append(self, ops: list):
+        if not ops:
+            return
+        data = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops).encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.size += len(data)
+        self.append_count += len(ops)
+        if self.first_append_at is None:
+            self.first_append_at = time.monotonic()
+
+    def read_ops(self) -> list:
+        """ジャーナルの操作を順に返す（書きかけの末尾行は捨てる）"""
+        ops = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        ops.append(json.loads(line))
+                    except ValueError:
+                        print("[WARN] ジャーナルの壊れた行をスキップしました")
+        except OSError:
+            pass
+        return ops
+
+    def should_compact(self) -> bool:
+        if self.size >= COMPACT_MAX_BYTES:
+            return True
+        return self.first_append_at is not None and time.monotonic() - self.first_append_at >= COMPACT_MAX_AGE_SECONDS
+
+    def reset(self):
+        """スナップショットを書いた後に呼ぶ。操作は冪等なので、直前に落ちて再生が重なっても問題ない"""
+        with open(self.path, "wb"):
+            pass
+        self.size = 0
+        self.first_append_at = None
+        self.compact_count += 1
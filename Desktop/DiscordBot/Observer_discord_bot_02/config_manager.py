@@ -1,83 +1,364 @@
 # config_manager.py
 import os
+import copy
+from types import MappingProxyType
 import json
+import random
 import asyncio
 from discord.ext import commands
-import discord
 from google_api.sa_utils import build_service_account_json
 from google_api.drive_handler import DriveHandler
+from config_persister import ConfigPersister, read_snapshot
+from config_journal import ConfigJournal, apply_op
+from google_api.config_sync import ConfigSync
+from structure_sync import StructureSync, format_plan
 
 CONFIG_LOCAL_PATH = os.path.join("data", "config_store.json")
 ADMIN_CHANNEL_ID = int(os.getenv("ADMIN_CHANNEL_ID", 0))
 
+# 起動時に Drive から取得できなかった場合の再試行間隔（倍々に広げる）
+DRIVE_RETRY_INITIAL_SECONDS = 5
+DRIVE_RETRY_MAX_SECONDS = 300
+
+# Bサーバーに作る固定チャンネルのキー
+FIXED_CHANNEL_KEYS = ("DEBUG_CHANNEL", "VC_LOG_CHANNEL", "AUDIT_LOG_CHANNEL", "OTHER_CHANNEL")
+
+
+def load_local_config(journal: ConfigJournal = None):
+    """ローカルのスナップショット＋ジャーナルから設定を組み立てる（スナップショットが無ければ None）
+
+    Bot を作る前（インテントを決める段階）にも使うので、ConfigManager には依存しない。
+    """
+    config = read_snapshot(CONFIG_LOCAL_PATH)
+    if config is None:
+        return None
+    for op in (journal or ConfigJournal()).read_ops():
+        apply_op(config, op)
+    return config
+
 
 class ConfigManager:
     """Bot設定を管理し、Google Driveと同期するクラス"""
 
-    def __init__(self, bot: commands.Bot, drive_file_id: str):
+    def __init__(self, bot: commands.Bot, drive_file_id: str, drive_backend=None):
+        """drive_backend を渡すと DriveHandler の代わりに使う（InMemoryDriveBackend など）"""
         self.bot = bot
         self.drive_file_id = drive_file_id
 
         asyncio.create_task(self.send_debug("ConfigManager 初期化開始"))
 
-        # --- Google Drive初期化 ---
-        service_json = build_service_account_json()
-        self.drive_handler = DriveHandler(service_json, self.drive_file_id)
-
+        # --- Google Drive初期化（認証情報の構築はバックグラウンドで行う） ---
+        self.service_json = build_service_account_json() if drive_backend is None else {}
+        self.drive_handler = drive_backend
+        self._drive_init_task = None
+        # Drive から正常に読めるまでは Drive へアップロードしない
+        self.drive_ready = False
+        # 起動後に Drive の設定を初めて取り込めたらセットされる（Drive 側の状態を待つ処理用）
+        self.drive_synced = asyncio.Event()
+        # 複数インスタンス間の競合確認・変更の取り込み
+        self.sync = ConfigSync(self)
+
+        # --- ローカルのスナップショットから即座に起動 ---
         os.makedirs("data", exist_ok=True)
+        self.persister = ConfigPersister(self, CONFIG_LOCAL_PATH, ConfigJournal())
         self.config = self.load_config()
+        # 設定が変わるたびに進む番号（MessageRouter などの派生表の作り直しに使う）
+        self.version = 0
+        self._rebuild_indexes()
+        self._refresh_task = asyncio.create_task(self.refresh_from_drive())
 
         # --- コマンド登録 ---
         self.register_commands()
-        self.register_sa_check_command(service_json)
+        self.register_sa_check_command(self.service_json)
         self.register_drive_show_command()
 
         asyncio.create_task(self.send_debug("ConfigManager 初期化完了"))
 
     # ------------------------ デバッグ送信 ------------------------
     async def send_debug(self, message: str):
-        if ADMIN_CHANNEL_ID:
-            channel = self.bot.get_channel(ADMIN_CHANNEL_ID)
-            if channel:
-                await channel.send(f"[DEBUG] {message}")
-            else:
-                print(f"[WARN] 管理者チャンネル取得失敗: {ADMIN_CHANNEL_ID}")
+        sink = getattr(self.bot, "debug_sink", None)
+        if ADMIN_CHANNEL_ID and sink:
+            sink.log(message, channel_id=ADMIN_CHANNEL_ID)
         else:
             print(f"[DEBUG] {message}")
 
     # ------------------------ 設定の読み書き ------------------------
     def load_config(self):
+        """前回正常に保存したローカルスナップショット＋ジャーナルを読む（Drive は待たない）"""
+        config = load_local_config(self.persister.journal)
+        if config is None:
+            print("[WARN] ローカル設定が無いか破損しています。Drive の取得まで空の設定で起動します")
+            config = {"server_pairs": []}
+            for op in self.persister.journal.read_ops():
+                apply_op(config, op)
+        return config
+
+    async def get_drive_handler(self):
+        """DriveHandler を返す（初回のみスレッドで認証情報を構築する）"""
+        if self.drive_handler is None:
+            if self._drive_init_task is None:
+                self._drive_init_task = asyncio.ensure_future(
+                    asyncio.to_thread(DriveHandler, self.service_json, self.drive_file_id)
+                )
+            try:
+                self.drive_handler = await asyncio.shield(self._drive_init_task)
+            except Exception:
+                self._drive_init_task = None  # 次回呼び出しで再試行
+                raise
+        return self.drive_handler
+
+    async def refresh_from_drive(self):
+        """Drive 上の設定を取得できるまで間隔を広げながら再試行する。以後は他インスタンスの変更を監視する
+
+        取得できるまでは drive_ready が立たないので Drive へはアップロードされない。
+        一度の失敗で諦めると、その後の変更が Drive に届かず再デプロイで消えてしまう。
+        """
+        delay = DRIVE_RETRY_INITIAL_SECONDS
+        attempt = 1
+        while not await self._fetch_drive_config():
+            print(f"[WARN] {delay:.0f} 秒後に Google Drive からの取得を再試行します（{attempt} 回失敗）")
+            await asyncio.sleep(delay + random.uniform(0, delay / 4))
+            delay = min(delay * 2, DRIVE_RETRY_MAX_SECONDS)
+            attempt += 1
+        self.drive_synced.set()
+        self.sync.start_watching()
+
+    async def _fetch_drive_config(self) -> bool:
+        """Drive 上の設定を1回取得し、取得できた場合のみ差し替える → 成功したか"""
+        try:
+            handler = await self.get_drive_handler()
+            generation = self.sync.generation
+            meta = await asyncio.to_thread(handler.fetch_metadata)
+            text = await asyncio.to_thread(handler.download_text)
+        except Exception as e:
+            # 取得失敗時はローカル設定のまま。空の設定で Drive を上書きしないよう drive_ready は立てない
+            print(f"[WARN] Google Drive から設定を取得できませんでした: {e}")
+            return False
+
+        if not text.strip():
+            # Drive 側のファイルが空 → 初回利用なのでローカル設定をアップロードしてよい
+            self.sync.base_md5 = meta["md5"]
+            self.drive_ready = True
+            self.persister.mark_dirty()
+            return True
         try:
-            self.drive_handler.download_config(CONFIG_LOCAL_PATH)
-            with open(CONFIG_LOCAL_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            default = {"server_pairs": []}
-            self.save_config(default)
-            return default
+            if not await self.apply_remote_config(json.loads(text), meta["md5"], generation):
+                return False
+        except Exception as e:
+            print(f"[WARN] Google Drive の設定が不正なため無視します: {e}")
+            return False
+        await self.send_debug("Google Drive から設定を読み込みました")
+        return True
+
+    async def apply_remote_config(self, config: dict, md5: str, generation: int) -> bool:
+        """Drive 上の設定を取り込む（起動時・他インスタンスの変更検知時）
+
+        generation は取得前の self.sync.generation。取得中に自分のアップロードが
+        先に完了していた場合、取得した内容は古いので取り込まずに False を返す。
+        """
+        if not isinstance(config.get("server_pairs"), list):
+            raise ValueError("server_pairs がありません")
+
+        # Drive に未反映のローカル変更は、取得した設定の上に再生してマージする
+        unsynced_ops = await self.persister.read_unsynced_ops()
+        if self.sync.generation != generation:
+            return False
+        for op in unsynced_ops:
+            apply_op(config, op)
+
+        # await を挟まずに差し替えるので、途中の状態がコマンドから見えることはない
+        self.sync.base_md5 = md5
+        self.drive_ready = True
+        self._replace_config(config)
+        self.persister.mark_dirty(upload=bool(unsynced_ops))
+        return True
+
+    def adopt_config(self, config: dict, pending_ops: list):
+        """アップロード時にマージした config を採用する（まだ書き出していない操作は再適用）"""
+        for op in pending_ops:
+            apply_op(config, op)
+        self._replace_config(config)
+
+    def _replace_config(self, config: dict):
+        """self.config の中身を config に置き換える
+
+        既存のペア dict は B_ID で対応付けてその場で書き換える。StructureSync.pair のように
+        ペアの参照を持ったまま await する呼び出し側が、以後の変更を切り離された古い dict に
+        書いてしまわないようにするため。
+        """
+        current = {pair.get("B_ID"): pair for pair in self.config.get("server_pairs", [])}
+        pairs = []
+        for new in config.get("server_pairs", []):
+            pair = current.pop(new.get("B_ID"), None)
+            if pair is None:
+                pair = new
+            else:
+                pair.clear()
+                pair.update(new)
+            pairs.append(pair)
+        config["server_pairs"] = pairs
+        self.config.clear()
+        self.config.update(config)
+        self._rebuild_indexes()
 
     def save_config(self, data=None):
+        """config 全体の保存を予約する（個別の変更は add_pair などが自動でジャーナルに積む）"""
         if data is not None:
             self.config = data
-        with open(CONFIG_LOCAL_PATH, "w", encoding="utf-8") as f:
-            json.dump(self.config, f, indent=2, ensure_ascii=False)
-        try:
-            self.drive_handler.upload_config(CONFIG_LOCAL_PATH)
-        except Exception as e:
-            print(f"[WARN] Google Drive アップロード失敗: {e}")
+            self._rebuild_indexes()
+        self.persister.mark_dirty()
+
+    async def flush_config(self):
+        """予約済みの保存を即座に書き出す（停止前に呼ぶ）"""
+        if not self._refresh_task.done():
+            self._refresh_task.cancel()
+        self.sync.stop_watching()
+        await self.persister.close()
+
+    # ------------------------ インデックス ------------------------
+    # server_pairs を毎回線形走査しないよう、以下の副インデックスを保持する
+    #   _pair_by_guild : guild_id(A/B) → pair
+    #   _pair_by_a     : A_ID → pair
+    #   _channel_dest  : 転送元チャンネルID(int) → 転送先チャンネルID
+    #   _channel_owner : 転送元チャンネルID(int) → _channel_dest に登録したペア
+    #   _fixed_channels: guild_id(A/B) → {固定チャンネルキー: チャンネルID}
+    #   _server_views  : guild_id(A/B) → ペアの読み取り専用ビュー（get_server_config 用）
+    def _rebuild_indexes(self):
+        """config 全体からインデックスを作り直す（ロード・差し替え時のみ）"""
+        self._pair_by_guild = {}
+        self._pair_by_a = {}
+        self._channel_dest = {}
+        self._channel_owner = {}
+        self._fixed_channels = {}
+        self._server_views = {}
+        self.version += 1
+        for pair in self.config.get("server_pairs", []):
+            self._index_pair(pair)
+
+    def _index_pair(self, pair: dict):
+        # 同じギルドが複数ペアに現れた場合は従来通り先勝ち
+        a_id = pair.get("A_ID")
+        b_id = pair.get("B_ID")
+        if a_id is not None:
+            self._pair_by_a.setdefault(a_id, pair)
+        view = MappingProxyType(pair)
+        for guild_id in (a_id, b_id):
+            if guild_id is not None and self._pair_by_guild.setdefault(guild_id, pair) is pair:
+                self._fixed_channels[guild_id] = {key: pair.get(key) for key in FIXED_CHANNEL_KEYS}
+                self._server_views[guild_id] = view
+        for src_id, dest_id in pair.get("CHANNEL_MAPPING", {}).items():
+            self._channel_dest[int(src_id)] = dest_id
+            self._channel_owner[int(src_id)] = pair
+
+    def _unindex_guild(self, pair: dict, guild_id):
+        if guild_id is None:
+            return
+        if self._pair_by_a.get(guild_id) is pair:
+            del self._pair_by_a[guild_id]
+        if self._pair_by_guild.get(guild_id) is pair:
+            del self._pair_by_guild[guild_id]
+            self._fixed_channels.pop(guild_id, None)
+            self._server_views.pop(guild_id, None)
+
+    # ------------------------ 設定の変更（インデックスも差分更新） ------------------------
+    # 変更はすべて ConfigPersister 経由でジャーナルに記録される
+    def add_pair(self, pair: dict):
+        self.version += 1
+        self.config["server_pairs"].append(pair)
+        self._index_pair(pair)
+        self.persister.record({"op": "add_pair", "pair": copy.deepcopy(pair)})
+
+    def add_admin(self, pair: dict, user_id: int):
+        pair.setdefault("ADMIN_IDS", []).append(user_id)
+        self.persister.record({"op": "add_admin", "b_id": pair.get("B_ID"), "user_id": user_id})
+
+    def set_pair_value(self, pair: dict, key: str, value):
+        """A_ID・固定チャンネルなどペアの値を変更する"""
+        self.version += 1
+        self.persister.record({"op": "set", "b_id": pair.get("B_ID"), "key": key, "value": value})
+        if key == "A_ID":
+            self._unindex_guild(pair, pair.get(key))
+            pair[key] = value
+            self._index_pair(pair)
+            return
+        pair[key] = value
+        if key in FIXED_CHANNEL_KEYS:
+            for guild_id in (pair.get("A_ID"), pair.get("B_ID")):
+                if self._pair_by_guild.get(guild_id) is pair:
+                    self._fixed_channels[guild_id][key] = value
+
+    def set_channel_mapping(self, pair: dict, src_id: int, dest_id: int):
+        pair.setdefault("CHANNEL_MAPPING", {})[str(src_id)] = dest_id
+        self._channel_dest[int(src_id)] = dest_id
+        self._channel_owner[int(src_id)] = pair
+        self.version += 1
+        self.persister.record({"op": "map", "b_id": pair.get("B_ID"), "src": str(src_id), "dest": dest_id})
+
+    def remove_channel_mapping(self, pair: dict, src_id: int):
+        pair.get("CHANNEL_MAPPING", {}).pop(str(src_id), None)
+        if self._channel_owner.get(int(src_id)) is pair:
+            # 同じ転送元を別のペアもマッピングしていれば、そちらを引き継ぐ
+            self._channel_dest.pop(int(src_id), None)
+            self._channel_owner.pop(int(src_id), None)
+            for other in self.config.get("server_pairs", []):
+                dest_id = other.get("CHANNEL_MAPPING", {}).get(str(src_id))
+                if dest_id is not None:
+                    self._channel_dest[int(src_id)] = dest_id
+                    self._channel_owner[int(src_id)] = other
+        self.version += 1
+        self.persister.record({"op": "unmap", "b_id": pair.get("B_ID"), "src": str(src_id)})
+
+    # 転送の到達点（RelayCheckpoints がまとめて呼ぶ）
+    def advance_relay_checkpoint(self, src_id: int, message_id: int):
+        checkpoints = self.config.setdefault("relay_checkpoints", {})
+        if message_id > checkpoints.get(str(src_id), 0):
+            checkpoints[str(src_id)] = message_id
+            self.persister.record({"op": "checkpoint", "src": str(src_id), "message_id": message_id})
+
+    def set_backfill_state(self, src_id: int, state):
+        states = self.config.setdefault("backfill_state", {})
+        if state is not None:
+            states[str(src_id)] = copy.deepcopy(state)
+        elif states.pop(str(src_id), None) is None:
+            return
+        self.persister.record({"op": "backfill", "src": str(src_id), "state": copy.deepcopy(state)})
+
+    async def checkpoint(self):
+        """ここまでの変更をジャーナルに書き出す（遅延保存を待たない）"""
+        await self.persister.flush()
 
     # ------------------------ データ取得ヘルパ ------------------------
     def get_pair_by_guild(self, guild_id: int):
-        for pair in self.config.get("server_pairs", []):
-            if pair.get("A_ID") == guild_id or pair.get("B_ID") == guild_id:
-                return pair
-        return None
+        return self._pair_by_guild.get(guild_id)
 
     def get_pair_by_a(self, a_id: int):
-        for pair in self.config.get("server_pairs", []):
-            if pair.get("A_ID") == a_id:
-                return pair
-        return None
+        return self._pair_by_a.get(a_id)
+
+    def get_server_config(self, guild_id: int):
+        """ギルド（A/Bどちらでも）に対応するペア設定の読み取り専用ビューを返す
+
+        ビューはペアの変更をそのまま反映する。変更は set_pair_value などを通すこと。
+        """
+        return self._server_views.get(guild_id)
+
+    def get_dest_channel_id(self, src_channel_id: int):
+        """転送元チャンネルIDから転送先チャンネルIDを返す（未マッピングなら None）"""
+        return self._channel_dest.get(src_channel_id)
+
+    def get_channel_mappings(self):
+        """[(転送元チャンネルID, 転送先チャンネルID), ...]"""
+        return list(self._channel_dest.items())
+
+    def get_relay_checkpoint(self, src_id: int):
+        """転送元チャンネルで最後に転送したメッセージID（未記録なら None）"""
+        return self.config.get("relay_checkpoints", {}).get(str(src_id))
+
+    def get_backfill_state(self, src_id: int):
+        return self.config.get("backfill_state", {}).get(str(src_id))
+
+    def get_fixed_channel(self, guild_id: int, key: str):
+        """固定チャンネル（DEBUG_CHANNEL など）のIDを返す"""
+        return self._fixed_channels.get(guild_id, {}).get(key)
 
     def is_admin(self, guild_id: int, user_id: int):
         pair = self.get_pair_by_guild(guild_id)
@@ -104,8 +385,7 @@ class ConfigManager:
                     "OTHER_CHANNEL": None,
                     "READ_USERS": []
                 }
-                self.config["server_pairs"].append(pair)
-                self.save_config()
+                self.add_pair(pair)
                 await ctx.send(f"✅ {ctx.author.name} を管理者登録しました。")
                 return
 
@@ -113,12 +393,16 @@ class ConfigManager:
                 await ctx.send("⚠️ すでに管理者として登録されています。")
                 return
 
-            pair["ADMIN_IDS"].append(author_id)
-            self.save_config()
+            self.add_admin(pair, author_id)
             await ctx.send(f"✅ {ctx.author.name} を管理者登録しました。")
 
         @bot.command(name="set_server")
-        async def set_server(ctx: commands.Context, server_a_id: int):
+        async def set_server(ctx: commands.Context, server_a_id: int, *options: str):
+            """
+            A サーバーのチャンネル構造を B に反映する（既定は足りないチャンネルの作成だけ）
+            options: dry = 手順の表示だけ / prune = A から消えたチャンネルを B からも削除
+                     rename = B のチャンネル名・カテゴリを A に合わせる
+            """
             pair = self.get_pair_by_guild(ctx.guild.id)
             if not pair:
                 await ctx.send("⚠️ このサーバーはまだペア登録されていません。まず adomin を使ってください。")
@@ -127,9 +411,15 @@ class ConfigManager:
                 await ctx.send("⚠️ 管理者のみ使用可能です。")
                 return
 
-            pair["A_ID"] = server_a_id
-            self.save_config()
-            await ctx.send(f"✅ SERVER_A_ID を {server_a_id} に設定しました。")
+            dry_run = "dry" in options
+            prune = "prune" in options
+            if prune and pair.get("A_ID") != server_a_id and pair.get("CHANNEL_MAPPING"):
+                # 別の A に切り替えると既存の転送先がすべて「消えた」扱いになり、履歴ごと削除してしまう
+                await ctx.send("⚠️ A サーバーを切り替えるときは prune を使えません。まず prune なしで実行してください。")
+                return
+            if not dry_run and pair.get("A_ID") != server_a_id:
+                self.set_pair_value(pair, "A_ID", server_a_id)
+                await ctx.send(f"✅ SERVER_A_ID を {server_a_id} に設定しました。")
 
             guild_a = self.bot.get_guild(server_a_id)
             guild_b = self.bot.get_guild(pair["B_ID"])
@@ -137,48 +427,17 @@ class ConfigManager:
                 await ctx.send("⚠️ Bot が両方のサーバーに参加しているか確認してください。")
                 return
 
-            # --- 固定チャンネルをBサーバーに作成（存在しなければ作成） ---
-            fixed_channels = {
-                "DEBUG_CHANNEL": pair.get("DEBUG_CHANNEL"),
-                "VC_LOG_CHANNEL": pair.get("VC_LOG_CHANNEL"),
-                "AUDIT_LOG_CHANNEL": pair.get("AUDIT_LOG_CHANNEL"),
-                "OTHER_CHANNEL": pair.get("OTHER_CHANNEL")
-            }
-
-            for key, ch_id in fixed_channels.items():
-                if ch_id is None:
-                    # 新規作成
-                    new_channel = await guild_b.create_text_channel(name=key)
-                    pair[key] = new_channel.id
-
-            # --- Aサーバーのチャンネルをコピー ---
-            for channel in guild_a.channels:
-                # 既にマッピング済みならスキップ
-                if str(channel.id) in pair["CHANNEL_MAPPING"]:
-                    continue
-
-                if isinstance(channel, discord.CategoryChannel):
-                    new_cat = await guild_b.create_category(name=channel.name)
-                    pair["CHANNEL_MAPPING"][str(channel.id)] = new_cat.id
-                elif isinstance(channel, discord.TextChannel):
-                    category_id = pair["CHANNEL_MAPPING"].get(str(channel.category_id))
-                    cat = guild_b.get_channel(category_id) if category_id else None
-                    new_ch = await guild_b.create_text_channel(name=channel.name, category=cat)
-                    pair["CHANNEL_MAPPING"][str(channel.id)] = new_ch.id
-                elif isinstance(channel, discord.VoiceChannel):
-                    category_id = pair["CHANNEL_MAPPING"].get(str(channel.category_id))
-                    cat = guild_b.get_channel(category_id) if category_id else None
-                    new_ch = await guild_b.create_voice_channel(name=channel.name, category=cat)
-                    pair["CHANNEL_MAPPING"][str(channel.id)] = new_ch.id
-
-            self.save_config()
-            await ctx.send("✅ Aサーバーのチャンネル構造をBサーバーにコピーしました。")
+            # 既にマッピング済みで変化のないチャンネルは手順に含まれない
+            sync = StructureSync(self, pair, guild_b, FIXED_CHANNEL_KEYS)
+            steps = sync.plan_sync(guild_a, prune=prune, rename="rename" in options)
+            await self.run_structure_sync(ctx, sync, steps, dry_run)
 
         # ---------------------------- 今回用: マッピング外チャンネル削除 ----------------------------
         @bot.command(name="cleanup_unmapped")
-        async def cleanup_unmapped(ctx: commands.Context):
+        async def cleanup_unmapped(ctx: commands.Context, mode: str = None):
             """
             ⚠️ 今回用コマンド: Bサーバーのマッピングされていないチャンネルを削除する
+            mode に dry を渡すと削除対象の表示だけ
             後で消す
             """
             pair = self.get_pair_by_guild(ctx.guild.id)
@@ -191,29 +450,22 @@ class ConfigManager:
                 await ctx.send("⚠️ Bサーバーが見つかりません。")
                 return
 
-            # 固定チャンネルは削除しない
-            protected_channels = {
-                pair.get("DEBUG_CHANNEL"),
-                pair.get("VC_LOG_CHANNEL"),
-                pair.get("AUDIT_LOG_CHANNEL"),
-                pair.get("OTHER_CHANNEL"),
-            }
-
-            # マッピング済みチャンネルID
-            mapped_ids = set(pair["CHANNEL_MAPPING"].values())
-            all_protected = mapped_ids.union(protected_channels)
-
-            deleted_count = 0
-            for channel in guild_b.channels:
-                if channel.id in all_protected:
-                    continue  # マッピング済み・固定は削除しない
-                try:
-                    await channel.delete(reason="今回用: マッピング外チャンネル削除")
-                    deleted_count += 1
-                except Exception as e:
-                    await ctx.send(f"⚠️ {channel.name} の削除失敗: {e}")
-
-            await ctx.send(f"✅ マッピング外チャンネルを {deleted_count} 個削除しました。")
+            # マッピング済み・固定チャンネルは削除しない
+            sync = StructureSync(self, pair, guild_b, FIXED_CHANNEL_KEYS)
+            await self.run_structure_sync(ctx, sync, sync.plan_cleanup(), mode == "dry")
+
+    async def run_structure_sync(self, ctx: commands.Context, sync: StructureSync, steps: list, dry_run: bool):
+        if dry_run or not steps:
+            for text in format_plan(steps):
+                await ctx.send(text)
+            return
+        await ctx.send(f"⏳ {len(steps)} 件の手順を実行します…")
+        applied, failures = await sync.apply(steps)
+        lines = [f"✅ 構造同期完了: 成功 {applied} 件 / 失敗 {len(failures)} 件"]
+        lines += [f"⚠️ {step.describe()}: {step.error}" for step in failures[:10]]
+        if len(failures) > 10:
+            lines.append(f"…ほか {len(failures) - 10} 件（再実行すると残りだけを処理します）")
+        await ctx.send("\n".join(lines))
 
     # ---------------------------- SA チェックコマンド ----------------------------
     def register_sa_check_command(self, service_json: dict):
@@ -233,17 +485,17 @@ class ConfigManager:
         async def show_config(ctx: commands.Context):
             try:
                 asyncio.create_task(self.send_debug(f"Google Drive からファイル取得開始: {self.drive_file_id}"))
-                self.drive_handler.download_config(CONFIG_LOCAL_PATH)
-                asyncio.create_task(self.send_debug(f"ファイル取得成功: {CONFIG_LOCAL_PATH}"))
-
-                with open(CONFIG_LOCAL_PATH, "r", encoding="utf-8") as f:
-                    config = json.load(f)
+                handler = await self.get_drive_handler()
+                config = await asyncio.to_thread(handler.get_config_cached)
+                asyncio.create_task(self.send_debug("ファイル取得成功"))
 
                 json_text = json.dumps(config, indent=2, ensure_ascii=False)
-                if len(json_text) < 1900:
-                    await ctx.send(f"✅ Google Drive 上の設定 JSON\n```json\n{json_text}\n```")
+                stats = handler.cache_stats()
+                cache_line = f"キャッシュ: hit {stats['hits']} / 再検証 {stats['revalidated']} / miss {stats['misses']}"
+                if len(json_text) < 1800:
+                    await ctx.send(f"✅ Google Drive 上の設定 JSON\n```json\n{json_text}\n```{cache_line}")
                 else:
-                    await ctx.send(f"✅ Google Drive 上の設定 JSON（先頭のみ表示）\n```json\n{json_text[:1900]}...\n```")
+                    await ctx.send(f"✅ Google Drive 上の設定 JSON（先頭のみ表示）\n```json\n{json_text[:1800]}...\n```{cache_line}")
 
                 asyncio.create_task(self.send_debug("show コマンド実行完了"))
             except Exception as e:
@@ -0,0 +1,225 @@
+# config_persister.py
+import asyncio
+import hashlib
+import json
+import os
+from config_journal import ConfigJournal, UNSYNCED_LOCAL_PATH
+
+# Drive へのアップロードに失敗したとき、次に再試行するまでの時間（秒）
+UPLOAD_RETRY_SECONDS = 60
+
+# ------------------------ ローカルスナップショット ------------------------
+# 本体と同じ場所に <path>.sha256 を置き、読み込み時に壊れていないか確認する
+def write_snapshot(path: str, text: str):
+    data = text.encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    with open(path + ".sha256.tmp", "w", encoding="utf-8") as f:
+        f.write(hashlib.sha256(data).hexdigest())
+    os.replace(path + ".sha256.tmp", path + ".sha256")
+
+
+def read_checked_json(path: str):
+    """チェックサムが一致する JSON ファイルを読んで返す（無い・壊れている場合は None）"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path + ".sha256", "r", encoding="utf-8") as f:
+            expected = f.read().strip()
+    except OSError:
+        return None
+    if hashlib.sha256(data).hexdigest() != expected:
+        print(f"[WARN] スナップショットのチェックサム不一致: {path}")
+        return None
+    try:
+        return json.loads(data.decode("utf-8"))
+    except ValueError:
+        return None
+
+
+def read_snapshot(path: str):
+    """チェックサムが一致する設定スナップショットを dict で返す（無い・壊れている場合は None）
+
+    .sha256 が無いのはチェックサム導入前の config_store.json なので、そのまま読んで
+    チェックサム付きで書き直す（移行）。
+    """
+    if os.path.exists(path) and not os.path.exists(path + ".sha256"):
+        config = _migrate_legacy_snapshot(path)
+    else:
+        config = read_checked_json(path)
+    if not isinstance(config, dict) or not isinstance(config.get("server_pairs"), list):
+        return None
+    return config
+
+
+def _migrate_legacy_snapshot(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        config = json.loads(text)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] 旧形式の設定ファイルを読めませんでした: {path}: {e}")
+        return None
+    if not isinstance(config, dict) or not isinstance(config.get("server_pairs"), list):
+        return None
+    write_snapshot(path, text)
+    print(f"[INFO] 旧形式の設定ファイルにチェックサムを付けて移行しました: {path}")
+    return config
+
+
+class ConfigPersister:
+    """config の保存を遅延・集約して行う（write-behind）
+
+    変更は record(op) でジャーナル用の小さな操作として積まれ、delay 秒以内の変更は
+    1回の書き込みにまとめられる。普段はジャーナルへの追記だけを行い、
+    サイズ・経過時間がしきい値を超えたとき（または停止時）にスナップショットへ
+    まとめ直して Google Drive へアップロードする。
+    ファイル操作とアップロードはスレッドで実行するので、保存中もイベントループは止まらない。
+    config_manager.drive_ready が立つまでは Drive へはアップロードしない。
+
+    ファイルは2つに分ける。
+      journal  : 前回のスナップショット以降の操作。スナップショットを書くたびに空にする
+      unsynced : まだ Drive に反映されていない操作。アップロードに成功したときだけ空にする
+    Drive に届かない間もローカルのまとめ直しは進むので、ジャーナルは際限なく伸びない。
+    unsynced は起動時に再生せず、Drive の設定とマージするときにだけ読む。
+    アップロード自体は config_manager.sync（ConfigSync）が競合確認付きで行う。
+    """
+
+    def __init__(self, config_manager, local_path: str, journal, unsynced=None, delay: float = 3.0):
+        self.config_manager = config_manager
+        self.local_path = local_path
+        self.journal = journal
+        self.unsynced = unsynced if unsynced is not None else ConfigJournal(UNSYNCED_LOCAL_PATH)
+        if journal.size and not os.path.exists(self.unsynced.path):
+            # 分ける前のジャーナルはそのまま「Drive に未反映の操作」でもある
+            self.unsynced.append(journal.read_ops())
+        self.delay = delay
+        self.dirty = False
+        self._pending_ops = []
+        self._snapshot_needed = False
+        self._needs_upload = bool(self.unsynced.size)
+        self._pending_marks = 0
+        self._flush_task = None
+        self._retry_task = None
+        self._lock = asyncio.Lock()
+
+        # 統計
+        self.mark_count = 0       # 保存要求の回数
+        self.flush_count = 0      # 実際に書き込んだ回数
+        self.coalesced_count = 0  # 書き込みにまとめられて省略された保存回数
+        self.upload_count = 0
+        self.upload_failures = 0
+
+    def record(self, op: dict):
+        """config への変更1件をジャーナルに積む（config 自体は呼び出し側で変更済み）"""
+        self._pending_ops.append(op)
+        self._needs_upload = True
+        self._mark()
+
+    def mark_dirty(self, upload: bool = True):
+        """config 全体を書き直す。upload=False はローカルだけ更新する（Drive から取得した直後など）"""
+        self._snapshot_needed = True
+        self._needs_upload = self._needs_upload or upload
+        self._mark()
+
+    def _mark(self):
+        self.dirty = True
+        self.mark_count += 1
+        self._pending_marks += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        # flush 中に追加された変更も拾えるよう、dirty が残っている間は繰り返す
+        while self.dirty:
+            await asyncio.sleep(self.delay)
+            await self.flush()
+
+    async def flush(self, compact: bool = False):
+        """溜まっている変更を即座に書き出す。compact=True ならスナップショットにまとめ直す"""
+        async with self._lock:
+            compact = compact or self._snapshot_needed or self.journal.should_compact()
+            if not self.dirty and not (compact and self._needs_upload):
+                return
+            ops = self._pending_ops
+            self._pending_ops = []
+            # シリアライズはループ上で行い、その時点のスナップショットを確定させる
+            text = json.dumps(self.config_manager.config, indent=2, ensure_ascii=False) if compact else None
+            upload = compact and self._needs_upload and self.config_manager.drive_ready
+            self.dirty = False
+            self._snapshot_needed = False
+            if upload:
+                self._needs_upload = False
+            self.coalesced_count += max(self._pending_marks - 1, 0)
+            self._pending_marks = 0
+            self.flush_count += 1
+            ok, merged = await asyncio.shield(asyncio.to_thread(self._write, ops, text, upload))
+            if merged is not None:
+                # 他インスタンスの変更とマージした結果を採用（待っている間に積まれた操作は再適用）
+                self.config_manager.adopt_config(merged, self._pending_ops)
+            if not ok:
+                self._needs_upload = True
+                self._schedule_retry()
+
+    def _schedule_retry(self):
+        if self._retry_task is None or self._retry_task.done():
+            self._retry_task = asyncio.create_task(self._retry_upload())
+
+    async def _retry_upload(self):
+        await asyncio.sleep(UPLOAD_RETRY_SECONDS)
+        await self.flush(compact=True)
+
+    async def close(self):
+        """シャットダウン時: 残りをスナップショットにまとめて Drive へ送ってから遅延タスクを止める"""
+        await self.flush(compact=True)
+        for task in (self._flush_task, self._retry_task):
+            if task and not task.done():
+                task.cancel()
+
+    async def read_unsynced_ops(self) -> list:
+        """Drive にまだ反映されていない操作（ジャーナル＋未書き込み分）を順に返す"""
+        async with self._lock:
+            ops = await asyncio.to_thread(self.unsynced.read_ops)
+            return ops + list(self._pending_ops)
+
+    def stats(self) -> dict:
+        return {
+            "dirty": self.dirty,
+            "marks": self.mark_count,
+            "flushes": self.flush_count,
+            "coalesced": self.coalesced_count,
+            "journal_appends": self.journal.append_count,
+            "journal_bytes": self.journal.size,
+            "compactions": self.journal.compact_count,
+            "unsynced_bytes": self.unsynced.size,
+            "uploads": self.upload_count,
+            "upload_failures": self.upload_failures,
+        }
+
+    # ------------------------ スレッド側 ------------------------
+    def _write(self, ops: list, text: str, upload: bool):
+        """戻り値: (失敗が無かったか, Drive 側とマージした config または None)"""
+        # 先に未反映として残す（以降のどこで落ちても、次の起動でアップロードされる）
+        self.unsynced.append(ops)
+        if text is None:
+            self.journal.append(ops)
+            return True, None
+        # ops はすでに text に含まれているので、ローカルはスナップショットだけでよい
+        write_snapshot(self.local_path, text)
+        self.journal.reset()
+        if not upload:
+            return True, None
+        try:
+            merged = self.config_manager.sync.push(text, self.unsynced.read_ops)
+        except Exception as e:
+            self.upload_failures += 1
+            print(f"[WARN] Google Drive アップロード失敗: {e}")
+            return False, None
+        if merged is not None:
+            write_snapshot(self.local_path, json.dumps(merged, indent=2, ensure_ascii=False))
+        self.upload_count += 1
+        self.unsynced.reset()
+        print(f"[INFO] config をまとめて Drive に保存しました（{self.stats()}）")
+        return True, merged
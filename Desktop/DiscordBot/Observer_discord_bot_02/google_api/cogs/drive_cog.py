@@ -1,9 +1,8 @@
 from discord.ext import commands
+import asyncio
 import json
 from config_manager import ConfigManager
 
-CONFIG_LOCAL_PATH = "data/config_store.json"
-
 class DriveCog(commands.Cog):
     """Google Drive 関連コマンド"""
 
@@ -21,9 +20,8 @@ class DriveCog(commands.Cog):
             return
 
         try:
-            self.config_manager.drive_handler.download_config(CONFIG_LOCAL_PATH)
-            with open(CONFIG_LOCAL_PATH, "r", encoding="utf-8") as f:
-                config = json.load(f)
+            handler = await self.config_manager.get_drive_handler()
+            config = await asyncio.to_thread(handler.get_config_cached)
 
             json_text = json.dumps(config, indent=2, ensure_ascii=False)
             if len(json_text) < 1900:
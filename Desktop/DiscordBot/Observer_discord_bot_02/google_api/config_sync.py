@@ -0,0 +1,183 @@
+# google_api/config_sync.py
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from config_journal import apply_op
+from google_api.drive_handler import ConfigConflictError
+
+# Drive 上の変更を確認する間隔（複数インスタンスが同時に叩かないよう揺らぎを足す）
+POLL_INTERVAL_SECONDS = 60
+POLL_JITTER_SECONDS = 15
+
+# 書き込みリース
+LEASE_TTL_SECONDS = 30
+LEASE_SETTLE_SECONDS = 1.0   # 書いた後、他インスタンスに上書きされていないか確認するまでの待ち
+LEASE_WAIT_SECONDS = 20
+
+MAX_PUSH_ATTEMPTS = 5
+
+
+class ConfigSync:
+    """同じ DRIVE_FILE_ID を使う複数インスタンス間で config を整合させる
+
+    - アップロードは「最後に読んだ md5」と一致するときだけ行い、食い違えば
+      Drive の内容を取り直して自分の未反映操作（ジャーナル）を再生してから再送する
+    - アップロード中はファイルの properties に置いたリースで他インスタンスを待たせる
+    - watch() で Drive のメタデータを定期的に確認し、他インスタンスの変更を取り込む
+
+    backend は DriveHandler か InMemoryDriveBackend（同じメソッドを持つもの）。
+    """
+
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
+        self.instance_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        # 現在のメモリ上の config の元になった Drive 上の md5
+        self.base_md5 = None
+        # 自分のアップロードが成功するたびに増える（取り込み中に追い越されていないかの確認用）
+        self.generation = 0
+        self._watch_task = None
+
+        # 統計
+        self.conflicts = 0
+        self.remote_updates = 0
+
+    # ------------------------ アップロード（スレッド側） ------------------------
+    def push(self, text: str, unsynced_ops):
+        """text を Drive へ送る。競合した場合はマージした config を返す（競合なしなら None）
+
+        unsynced_ops はまだ Drive に反映されていない操作のリストを返す関数。
+        """
+        backend = self.config_manager.drive_handler
+        if not self._acquire_lease(backend):
+            raise ConfigConflictError("書き込みリースを取得できませんでした")
+        try:
+            merged = None
+            for _ in range(MAX_PUSH_ATTEMPTS):
+                try:
+                    meta = backend.upload_text(text, expected_md5=self.base_md5)
+                    self.base_md5 = meta["md5"]
+                    self.generation += 1
+                    return merged
+                except ConfigConflictError:
+                    self.conflicts += 1
+                    remote_md5 = backend.fetch_metadata()["md5"]
+                    remote_text = backend.download_text()
+                    merged = json.loads(remote_text) if remote_text.strip() else {"server_pairs": []}
+                    for op in unsynced_ops():
+                        apply_op(merged, op)
+                    text = json.dumps(merged, indent=2, ensure_ascii=False)
+                    self.base_md5 = remote_md5
+                    print(f"[WARN] Drive 上の設定と競合したためマージして再送します（{self.conflicts} 回目）")
+            raise ConfigConflictError("競合が解消しないためアップロードを中止しました")
+        finally:
+            try:
+                lease = backend.read_lease()
+                if lease and lease["owner"] == self.instance_id:
+                    backend.write_lease(None)
+            except Exception as e:
+                print(f"[WARN] 書き込みリースの解放に失敗: {e}")
+
+    def _acquire_lease(self, backend) -> bool:
+        deadline = time.monotonic() + LEASE_WAIT_SECONDS
+        while True:
+            lease = backend.read_lease()
+            now = time.time()
+            if lease is None or lease["owner"] == self.instance_id or lease["until"] < now:
+                backend.write_lease({"owner": self.instance_id, "until": now + LEASE_TTL_SECONDS})
+                time.sleep(LEASE_SETTLE_SECONDS)
+                lease = backend.read_lease()
+                if lease and lease["owner"] == self.instance_id:
+                    return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(random.uniform(0.5, 2.0))
+
+    # ------------------------ 変更の取り込み ------------------------
+    def start_watching(self):
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self.watch())
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS + random.uniform(0, POLL_JITTER_SECONDS))
+            backend = self.config_manager.drive_handler
+            generation = self.generation
+            try:
+                meta = await asyncio.to_thread(backend.fetch_metadata)
+                if not meta["md5"] or meta["md5"] == self.base_md5:
+                    continue
+                text = await asyncio.to_thread(backend.download_text)
+                if not text.strip():
+                    continue
+                if not await self.config_manager.apply_remote_config(json.loads(text), meta["md5"], generation):
+                    continue
+                self.remote_updates += 1
+                print(f"[INFO] 他インスタンスの設定変更を取り込みました（md5={meta['md5']}）")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARN] Drive の変更確認に失敗: {e}")
+
+    def stop_watching(self):
+        if self._watch_task and not self._watch_task.done():
+            self._watch_task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "instance_id": self.instance_id,
+            "base_md5": self.base_md5,
+            "conflicts": self.conflicts,
+            "remote_updates": self.remote_updates,
+        }
+
+
+class InMemoryDriveBackend:
+    """Drive の代わりに使うメモリ上のファイル（テスト・ローカル検証用）
+
+    同じインスタンスを複数の ConfigManager に渡すと、同一ファイルを共有する
+    複数 Bot プロセスを再現できる。
+    """
+
+    def __init__(self, text: str = ""):
+        self._lock = threading.Lock()
+        self._text = text
+        self._version = 1
+        self._lease = None
+
+    def fetch_metadata(self) -> dict:
+        with self._lock:
+            return {"md5": hashlib.md5(self._text.encode("utf-8")).hexdigest(), "version": self._version}
+
+    def download_text(self) -> str:
+        with self._lock:
+            return self._text
+
+    def upload_text(self, text: str, expected_md5: str = None) -> dict:
+        with self._lock:
+            current = hashlib.md5(self._text.encode("utf-8")).hexdigest()
+            if expected_md5 is not None and current != expected_md5:
+                raise ConfigConflictError(f"{current} != {expected_md5}")
+            self._text = text
+            self._version += 1
+            return {"md5": hashlib.md5(text.encode("utf-8")).hexdigest(), "version": self._version}
+
+    def read_lease(self):
+        with self._lock:
+            return dict(self._lease) if self._lease else None
+
+    def write_lease(self, lease):
+        with self._lock:
+            self._lease = dict(lease) if lease else None
+
+    def get_config_cached(self, ttl: float = 0) -> dict:
+        text = self.download_text()
+        return json.loads(text) if text.strip() else {}
+
+    def cache_stats(self) -> dict:
+        return {"hits": 0, "revalidated": 0, "misses": 0}
@@ -1,8 +1,19 @@
 # google/drive_handler.py
+import json
+import threading
+import time
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 from oauth2client.service_account import ServiceAccountCredentials
 
+# 表示系コマンドが連続で呼ばれたとき、メタデータ確認も省略する時間（秒）
+CACHE_TTL_SECONDS = 30
+
+
+class ConfigConflictError(Exception):
+    """アップロード時に Drive 上のファイルが想定と異なるリビジョンだった"""
+
+
 class DriveHandler:
     def __init__(self, service_json: dict, file_id: str):
         self.file_id = file_id
@@ -11,11 +22,116 @@ class DriveHandler:
         self.gauth.credentials = ServiceAccountCredentials.from_json_keyfile_dict(service_json, scopes=scope)
         self.drive = GoogleDrive(self.gauth)
 
+        # --- 取得結果のキャッシュ（スレッドから呼ばれるのでロックで保護） ---
+        self._cache_lock = threading.Lock()
+        self._cached_config = None
+        self._cached_md5 = None
+        self._cached_at = 0.0
+        self.cache_hits = 0         # TTL 内: 通信なし
+        self.cache_revalidated = 0  # メタデータのみ取得、本体は省略
+        self.cache_misses = 0       # 本体をダウンロード
+
     def download_config(self, local_path: str):
         file = self.drive.CreateFile({"id": self.file_id})
         file.GetContentFile(local_path)
 
+    def download_text(self) -> str:
+        """ファイルを保存せずに中身を文字列で返す"""
+        file = self.drive.CreateFile({"id": self.file_id})
+        return file.GetContentString(encoding="utf-8")
+
+    def fetch_metadata(self) -> dict:
+        """本体を取得せずにリビジョン情報だけ取得する"""
+        file = self.drive.CreateFile({"id": self.file_id})
+        file.FetchMetadata(fields="md5Checksum,version,headRevisionId,modifiedDate")
+        return {
+            "md5": file.get("md5Checksum"),
+            "version": file.get("version"),
+            "revision": file.get("headRevisionId"),
+            "modified": file.get("modifiedDate"),
+        }
+
+    def get_config_cached(self, ttl: float = CACHE_TTL_SECONDS) -> dict:
+        """Drive 上の設定を dict で返す（読み取り専用として扱うこと）
+
+        TTL 内ならメモリ上のものをそのまま返し、TTL を過ぎていれば md5 を確認して
+        変わっていなければ本体のダウンロードを省略する。
+        """
+        with self._cache_lock:
+            now = time.monotonic()
+            if self._cached_config is not None and now - self._cached_at < ttl:
+                self.cache_hits += 1
+                return self._cached_config
+
+            md5 = self.fetch_metadata()["md5"]
+            if self._cached_config is not None and md5 and md5 == self._cached_md5:
+                self.cache_revalidated += 1
+                self._cached_at = now
+                return self._cached_config
+
+            text = self.download_text()
+            self.cache_misses += 1
+            self._cached_config = json.loads(text) if text.strip() else {}
+            self._cached_md5 = md5
+            self._cached_at = now
+            return self._cached_config
+
+    def cache_stats(self) -> dict:
+        return {
+            "hits": self.cache_hits,
+            "revalidated": self.cache_revalidated,
+            "misses": self.cache_misses,
+        }
+
+    def upload_text(self, text: str, expected_md5: str = None) -> dict:
+        """Drive 上の md5 が expected_md5 と一致するときだけ上書きする
+
+        Drive API には比較してから書き込む原子的な操作が無いため、確認と書き込みの間の
+        競合はリース（read_lease / write_lease）で防ぐ前提。
+        """
+        if expected_md5 is not None:
+            current = self.fetch_metadata()["md5"]
+            if current != expected_md5:
+                raise ConfigConflictError(f"Drive 上の設定が更新されています ({current} != {expected_md5})")
+        file = self.drive.CreateFile({"id": self.file_id})
+        file.SetContentString(text, encoding="utf-8")
+        file.Upload()
+
+        with self._cache_lock:
+            self._cached_config = json.loads(text)
+            self._cached_md5 = file.get("md5Checksum")
+            self._cached_at = time.monotonic()
+        return {"md5": file.get("md5Checksum"), "version": file.get("version")}
+
+    # ------------------------ 書き込みリース ------------------------
+    # ファイルの properties に保持する（内容の md5 は変わらない）
+    def read_lease(self):
+        file = self.drive.CreateFile({"id": self.file_id})
+        file.FetchMetadata(fields="properties")
+        props = {p.get("key"): p.get("value") for p in file.get("properties", [])}
+        owner = props.get("lease_owner")
+        if not owner or owner == "none":
+            return None
+        return {"owner": owner, "until": float(props.get("lease_until", 0))}
+
+    def write_lease(self, lease):
+        """lease=None で解放"""
+        file = self.drive.CreateFile({"id": self.file_id})
+        file["properties"] = [
+            {"key": "lease_owner", "value": lease["owner"] if lease else "none", "visibility": "PUBLIC"},
+            {"key": "lease_until", "value": str(lease["until"] if lease else 0), "visibility": "PUBLIC"},
+        ]
+        file.Upload()
+
     def upload_config(self, local_path: str):
         file = self.drive.CreateFile({"id": self.file_id})
         file.SetContentFile(local_path)
         file.Upload()
+
+        # 自分でアップロードした内容はそのままキャッシュに載せる
+        with open(local_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        with self._cache_lock:
+            self._cached_config = config
+            self._cached_md5 = file.get("md5Checksum")
+            self._cached_at = time.monotonic()
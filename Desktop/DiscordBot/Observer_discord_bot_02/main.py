@@ -7,7 +7,12 @@ from discord.ext import commands
 import traceback
 import asyncio
 import json
-from config_manager import ConfigManager  # Google Drive対応版
+from config_manager import ConfigManager, load_local_config  # Google Drive対応版
+from utils.debug_sink import DebugSink
+from utils.send_scheduler import SendScheduler
+from utils.message_router import MessageRouter
+from utils.dedup import DedupFilter
+from utils.gateway_profile import GatewayProfile
 
 # ---------- 環境変数からトークン取得 ----------
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -29,17 +34,39 @@ def run_server():
 threading.Thread(target=run_server, daemon=True).start()
 
 # ---------- Discord Bot ----------
-intents = discord.Intents.default()
-intents.messages = True
-intents.guilds = True
-intents.members = True
-intents.message_content = True
-intents.voice_states = True  # VC監視に必須
-
-bot = commands.Bot(command_prefix="!", intents=intents)
+COGS = [
+    "cogs.transfer_cog",
+    "cogs.voice_chat.vc_cog",          # 修正済
+    "cogs.audit_cog",
+    "cogs.owner_cog",
+    "cogs.voice_chat.vc_highlight_cog",
+    "cogs.voice_chat.vc_setting_cog",
+    "cogs.voice_chat.vc_analytics",
+]
+
+def build_bot(profile: GatewayProfile) -> commands.Bot:
+    """インテント・キャッシュ設定は接続時に固定されるので、設定を読んでから Bot を作る"""
+    send_scheduler = SendScheduler()  # 送信先チャンネルごとの送信キュー
+    # 成功したレスポンスのレート制限ヘッダーも送信キューに渡す
+    bot = commands.Bot(command_prefix="!", http_trace=send_scheduler.trace_config(), **profile.bot_options())
+    bot.gateway_profile = profile  # 遅延チャンク・キャッシュ統計
+    bot.debug_sink = DebugSink(bot)  # 全 Cog 共通のデバッグ出力
+    bot.send_scheduler = send_scheduler
+    bot.router = MessageRouter(bot)  # 全メッセージの入口（コマンド処理もここで1回だけ）
+    bot.dedup = DedupFilter()  # 転送・監査ログの二重送信防止
+
+    @bot.event
+    async def on_message(message: discord.Message):
+        await bot.router.on_message(message)
+
+    return bot
 
 # ---------- 非同期でBot起動 ----------
 async def main():
+    # 前回のローカルスナップショットから、読み込む Cog と設定済みのペアに必要な分だけ有効にする
+    profile = GatewayProfile(load_local_config(), COGS)
+    print(f"[ℹ] Intents: {dict(profile.reasons)}")
+    bot = build_bot(profile)
     async with bot:
         # ConfigManager 初期化
         DRIVE_FILE_ID = os.getenv("DRIVE_FILE_ID")
@@ -50,15 +77,7 @@ async def main():
         bot.config_manager = config_manager
 
         # Cog のロード（パス修正）
-        cogs = [
-            "cogs.transfer_cog",
-            "cogs.voice_chat.vc_cog",          # 修正済
-            "cogs.audit_cog",
-            "cogs.owner_cog",
-            "cogs.voice_chat.vc_highlight_cog",
-            "cogs.voice_chat.vc_setting_cog",
-        ]
-        for cog_path in cogs:
+        for cog_path in COGS:
             try:
                 await bot.load_extension(cog_path)
                 print(f"[✅] Loaded {cog_path}")
@@ -82,9 +101,8 @@ async def main():
 
             # Google Drive 上の config
             try:
-                bot.config_manager.drive_handler.download_config("tmp_config.json")
-                with open("tmp_config.json", "r", encoding="utf-8") as f:
-                    drive_config = json.load(f)
+                handler = await bot.config_manager.get_drive_handler()
+                drive_config = await asyncio.to_thread(handler.get_config_cached)
                 drive_text = json.dumps(drive_config, indent=2, ensure_ascii=False)
             except Exception as e:
                 drive_text = f"⚠️ Google Drive 読み込み失敗: {e}"
@@ -109,9 +127,19 @@ async def main():
             print("[ℹ] Registered Commands:")
             for cmd in bot.commands:
                 print(f" - {cmd.name}")
-
-        # Bot 起動
-        await bot.start(TOKEN)
+            missing = profile.missing(bot.config_manager.config)
+            if missing:
+                print(f"[WARN] 現在の設定に必要なインテントが無効です（再起動で有効になります）: {missing}")
+
+        # Bot 起動（終了時は未保存の config を書き出す）
+        try:
+            await bot.start(TOKEN)
+        finally:
+            # 先に Cog を外して、Cog が config に渡す分（転送の到達点など）も書き出しに含める
+            await bot.close()
+            await config_manager.flush_config()
+            bot.dedup.close()
+            bot.debug_sink.close()
 
 # ---------- 実行 ----------
 if __name__ == "__main__":
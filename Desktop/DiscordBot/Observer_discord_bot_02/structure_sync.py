@@ -0,0 +1,234 @@
+# structure_sync.py
+import asyncio
+import discord
+
+SYNC_CONCURRENCY = 4   # 同時に実行するチャンネル操作の数（429 の待ちは discord.py が行う）
+SYNCED_TYPES = (discord.CategoryChannel, discord.TextChannel, discord.VoiceChannel)
+
+ACTION_LABELS = {
+    "fixed": "＋ 固定チャンネル作成",
+    "create": "＋ 作成",
+    "update": "～ 変更",
+    "delete": "－ 削除",
+    "unmap": "× マッピング解除",
+}
+
+
+def _kind(channel) -> str:
+    if isinstance(channel, discord.CategoryChannel):
+        return "カテゴリ"
+    if isinstance(channel, discord.VoiceChannel):
+        return "VC"
+    return "テキスト"
+
+
+class SyncStep:
+    """構造同期の1手順。deps の手順がすべて成功してから実行する"""
+
+    __slots__ = ("action", "src", "dest", "key", "changes", "deps", "done", "ok", "error")
+
+    def __init__(self, action: str, src=None, dest=None, key: str = None, changes: dict = None):
+        self.action = action
+        self.src = src          # A の チャンネル（unmap / delete では A のチャンネルID(int) の場合あり）
+        self.dest = dest        # B のチャンネル
+        self.key = key          # 固定チャンネルのキー
+        self.changes = changes or {}
+        self.deps = []
+        self.done = asyncio.Event()
+        self.ok = False
+        self.error = None
+
+    def describe(self) -> str:
+        label = ACTION_LABELS[self.action]
+        if self.action == "fixed":
+            return f"{label} {self.key}"
+        if self.action == "create":
+            return f"{label} {_kind(self.src)} {self.src.name}"
+        if self.action == "update":
+            parts = []
+            if "name" in self.changes:
+                parts.append(f"名前 {self.dest.name} → {self.changes['name']}")
+            if "category" in self.changes:
+                parts.append("カテゴリ移動")
+            return f"{label} {_kind(self.dest)} {self.dest.name}（{', '.join(parts)}）"
+        if self.action == "delete":
+            return f"{label} {_kind(self.dest)} {self.dest.name}"
+        return f"{label} {self.src}"
+
+
+class StructureSync:
+    """A サーバーのチャンネル構造と CHANNEL_MAPPING の差分を B サーバーに反映する
+
+    plan_*() は変更手順の一覧（依存関係付き）を作るだけで何も変更しない（dry-run に使う）。
+    既定では足りないチャンネルの作成と、A から消えた転送元のマッピング解除だけを行う。
+    B 側のチャンネルの削除（prune）と、名前・カテゴリの上書き（rename）は指定したときだけ。
+    B の管理者が意図して変えた名前や、転送済みの履歴を持つチャンネルを勝手に消さないため。
+    apply() はカテゴリ → その子、子の削除・移動 → カテゴリの削除 の順序を守りつつ
+    独立した手順を並列に実行し、1手順ごとに設定のジャーナルへ書き出す。
+    途中で止まっても、再実行すれば残りの差分だけが手順になる。
+    """
+
+    def __init__(self, config_manager, pair: dict, guild_b: discord.Guild, fixed_keys: tuple):
+        self.config_manager = config_manager
+        self.pair = pair
+        self.guild_b = guild_b
+        self.fixed_keys = fixed_keys
+
+    def _mapping(self) -> dict:
+        return self.pair.get("CHANNEL_MAPPING", {})
+
+    def _dest_of(self, src_id):
+        dest_id = self._mapping().get(str(src_id)) if src_id else None
+        return self.guild_b.get_channel(dest_id) if dest_id else None
+
+    def _protected_ids(self) -> set:
+        return {self.pair.get(key) for key in self.fixed_keys} - {None}
+
+    # ---------- 差分 → 手順 ----------
+    def plan_sync(self, guild_a: discord.Guild, prune: bool = False, rename: bool = False) -> list:
+        steps = []
+        for key in self.fixed_keys:
+            if self.pair.get(key) is None:
+                steps.append(SyncStep("fixed", key=key))
+
+        created_categories = {}  # A のカテゴリID → 作成手順
+        source_ids = set()
+        # カテゴリを先に並べ、子の手順から作成手順を参照できるようにする
+        channels = sorted(
+            (c for c in guild_a.channels if isinstance(c, SYNCED_TYPES)),
+            key=lambda c: (not isinstance(c, discord.CategoryChannel), c.position),
+        )
+        for channel in channels:
+            source_ids.add(channel.id)
+            is_category = isinstance(channel, discord.CategoryChannel)
+            parent_step = None if is_category else created_categories.get(channel.category_id)
+            dest = self._dest_of(channel.id)
+
+            if dest is None:
+                step = SyncStep("create", src=channel)
+                if is_category:
+                    created_categories[channel.id] = step
+            else:
+                if not rename:
+                    continue
+                changes = {}
+                if dest.name != channel.name:
+                    changes["name"] = channel.name
+                if not is_category:
+                    want = self._dest_of(channel.category_id)
+                    if parent_step or (want.id if want else None) != dest.category_id:
+                        changes["category"] = True  # 移動先は実行時に CHANNEL_MAPPING から引く
+                if not changes:
+                    continue
+                step = SyncStep("update", src=channel, dest=dest, changes=changes)
+            if parent_step:
+                step.deps.append(parent_step)
+            steps.append(step)
+
+        # A から消えたチャンネル → マッピングを外す（prune のときだけ B 側も削除する）
+        protected = self._protected_ids()
+        removals = []
+        for src_id, dest_id in list(self._mapping().items()):
+            if int(src_id) in source_ids:
+                continue
+            dest = self.guild_b.get_channel(dest_id)
+            if prune and dest and dest.id not in protected:
+                removals.append(SyncStep("delete", src=int(src_id), dest=dest))
+            else:
+                removals.append(SyncStep("unmap", src=int(src_id)))
+        self._order_category_deletes(removals, steps)
+        return steps + removals
+
+    def plan_cleanup(self) -> list:
+        """B サーバーのうち、マッピング・固定チャンネルのどちらでもないものを削除する手順"""
+        keep = set(self._mapping().values()) | self._protected_ids()
+        removals = [SyncStep("delete", dest=c) for c in self.guild_b.channels if c.id not in keep]
+        self._order_category_deletes(removals, [])
+        return removals
+
+    @staticmethod
+    def _order_category_deletes(removals: list, others: list):
+        # カテゴリの削除は、子の削除・移動がすべて終わってから
+        children = [
+            s for s in removals + others
+            if s.action in ("delete", "update") and not isinstance(s.dest, discord.CategoryChannel)
+        ]
+        for step in removals:
+            if step.action == "delete" and isinstance(step.dest, discord.CategoryChannel):
+                step.deps.extend(children)
+
+    # ---------- 実行 ----------
+    async def apply(self, steps: list) -> tuple:
+        """(成功数, 失敗した手順のリスト) を返す"""
+        semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+        async def run(step: SyncStep):
+            for dep in step.deps:
+                await dep.done.wait()
+            failed = [d for d in step.deps if not d.ok and d.action != "delete"]
+            if failed:
+                step.error = f"前の手順が失敗: {failed[0].describe()}"
+            else:
+                async with semaphore:
+                    try:
+                        await self._apply_step(step)
+                        step.ok = True
+                    except Exception as e:
+                        step.error = str(e)
+                if step.ok:
+                    # 1手順ごとにジャーナルへ書き出す（途中で落ちても作成済みチャンネルを見失わない）
+                    await self.config_manager.checkpoint()
+            step.done.set()
+
+        await asyncio.gather(*(run(step) for step in steps))
+        failures = [s for s in steps if not s.ok]
+        return len(steps) - len(failures), failures
+
+    async def _apply_step(self, step: SyncStep):
+        cm = self.config_manager
+        if step.action == "fixed":
+            channel = await self.guild_b.create_text_channel(name=step.key)
+            cm.set_pair_value(self.pair, step.key, channel.id)
+        elif step.action == "create":
+            src = step.src
+            if isinstance(src, discord.CategoryChannel):
+                channel = await self.guild_b.create_category(name=src.name)
+            elif isinstance(src, discord.VoiceChannel):
+                channel = await self.guild_b.create_voice_channel(name=src.name, category=self._dest_of(src.category_id))
+            else:
+                channel = await self.guild_b.create_text_channel(name=src.name, category=self._dest_of(src.category_id))
+            cm.set_channel_mapping(self.pair, src.id, channel.id)
+        elif step.action == "update":
+            kwargs = {}
+            if "name" in step.changes:
+                kwargs["name"] = step.changes["name"]
+            if "category" in step.changes:
+                kwargs["category"] = self._dest_of(step.src.category_id)
+            await step.dest.edit(**kwargs)
+        elif step.action == "delete":
+            await step.dest.delete(reason="チャンネル構造の同期")
+            if step.src:
+                cm.remove_channel_mapping(self.pair, step.src)
+        elif step.action == "unmap":
+            cm.remove_channel_mapping(self.pair, step.src)
+
+
+def format_plan(steps: list) -> list:
+    """手順一覧を 2000 文字以内のメッセージに分けて返す"""
+    if not steps:
+        return ["✅ 差分はありません。"]
+    counts = {}
+    for step in steps:
+        counts[step.action] = counts.get(step.action, 0) + 1
+    header = "📝 実行予定: " + " / ".join(f"{ACTION_LABELS[a]} {n}" for a, n in counts.items())
+    messages = []
+    current = header
+    for step in steps:
+        line = step.describe()
+        if len(current) + len(line) + 1 > 1900:
+            messages.append(current)
+            current = line
+        else:
+            current += "\n" + line
+    messages.append(current)
+    return messages
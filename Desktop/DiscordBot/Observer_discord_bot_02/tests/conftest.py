@@ -0,0 +1,16 @@
+# tests/conftest.py
+import os
+import sys
+import pytest
+
+# Bot は作業ディレクトリ直下の data/ を使い、モジュールもここからの相対で import する
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """テストごとに空の作業ディレクトリ（data/ 付き）で実行する"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    return tmp_path
@@ -0,0 +1,179 @@
+# tests/test_config_journal.py
+import asyncio
+import copy
+import json
+import os
+import discord
+from discord.ext import commands
+import config_journal
+import config_manager
+import config_persister
+from config_journal import ConfigJournal, apply_op
+from config_persister import read_snapshot, write_snapshot
+from google_api.config_sync import InMemoryDriveBackend
+
+OPS = [
+    {"op": "add_pair", "pair": {"A_ID": None, "B_ID": 1, "CHANNEL_MAPPING": {}, "ADMIN_IDS": [5]}},
+    {"op": "add_admin", "b_id": 1, "user_id": 6},
+    {"op": "set", "b_id": 1, "key": "A_ID", "value": 2},
+    {"op": "map", "b_id": 1, "src": "10", "dest": 20},
+    {"op": "map", "b_id": 1, "src": "11", "dest": 21},
+    {"op": "unmap", "b_id": 1, "src": "10"},
+    {"op": "checkpoint", "src": "11", "message_id": 300},
+    {"op": "checkpoint", "src": "11", "message_id": 200},
+    {"op": "backfill", "src": "11", "state": {"after": 1, "before": 2, "relayed": 0}},
+]
+EXPECTED = {
+    "server_pairs": [{"A_ID": 2, "B_ID": 1, "CHANNEL_MAPPING": {"11": 21}, "ADMIN_IDS": [5, 6]}],
+    "relay_checkpoints": {"11": 300},
+    "backfill_state": {"11": {"after": 1, "before": 2, "relayed": 0}},
+}
+
+
+def _replay(ops, config=None) -> dict:
+    config = config if config is not None else {"server_pairs": []}
+    for op in ops:
+        apply_op(config, op)
+    return config
+
+
+# ---------- 操作の適用 ----------
+def test_replay_builds_the_config():
+    assert _replay(OPS) == EXPECTED
+
+
+def test_replay_is_idempotent():
+    # 書き出し直前に落ちて同じ操作が2回再生されても結果は変わらない
+    assert _replay(OPS + OPS) == EXPECTED
+    assert _replay(OPS, copy.deepcopy(EXPECTED)) == EXPECTED
+
+
+def test_add_pair_does_not_share_the_op_dict():
+    op = {"op": "add_pair", "pair": {"B_ID": 1, "ADMIN_IDS": []}}
+    config = _replay([op])
+    apply_op(config, {"op": "add_admin", "b_id": 1, "user_id": 9})
+    assert op["pair"]["ADMIN_IDS"] == []
+
+
+def test_ops_for_unknown_pairs_are_skipped():
+    assert _replay([{"op": "set", "b_id": 99, "key": "A_ID", "value": 1}, {"op": "nope", "b_id": 99}]) == {"server_pairs": []}
+
+
+# ---------- ジャーナル ----------
+def test_journal_round_trip_drops_a_torn_tail(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ConfigJournal(path)
+    journal.append(OPS[:3])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "map", "b_id"')   # 書き込み途中で落ちた行
+    assert ConfigJournal(path).read_ops() == OPS[:3]
+
+
+def test_journal_compacts_by_size_and_resets(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_journal, "COMPACT_MAX_BYTES", 200)
+    journal = ConfigJournal(str(tmp_path / "journal.jsonl"))
+    assert not journal.should_compact()
+    journal.append(OPS)
+    assert journal.should_compact()
+    journal.reset()
+    assert journal.size == 0
+    assert journal.read_ops() == []
+    assert not journal.should_compact()
+
+
+def test_load_local_config_replays_the_journal_over_the_snapshot():
+    write_snapshot(config_manager.CONFIG_LOCAL_PATH, json.dumps(_replay(OPS[:2])))
+    journal = ConfigJournal()
+    journal.append(OPS)
+    assert config_manager.load_local_config(journal) == EXPECTED
+
+
+def test_snapshot_with_a_bad_checksum_is_rejected():
+    write_snapshot(config_manager.CONFIG_LOCAL_PATH, json.dumps(EXPECTED))
+    with open(config_manager.CONFIG_LOCAL_PATH, "a", encoding="utf-8") as f:
+        f.write(" ")
+    assert read_snapshot(config_manager.CONFIG_LOCAL_PATH) is None
+
+
+def test_unchecksummed_snapshot_is_migrated():
+    with open(config_manager.CONFIG_LOCAL_PATH, "w", encoding="utf-8") as f:
+        json.dump(EXPECTED, f)
+    assert read_snapshot(config_manager.CONFIG_LOCAL_PATH) == EXPECTED
+    assert os.path.exists(config_manager.CONFIG_LOCAL_PATH + ".sha256")
+
+
+# ---------- ConfigPersister 経由 ----------
+def _bot() -> commands.Bot:
+    return commands.Bot(command_prefix="!", intents=discord.Intents.none())
+
+
+class Offline(InMemoryDriveBackend):
+    def fetch_metadata(self):
+        raise OSError("offline")
+
+
+def test_offline_compaction_keeps_unsynced_ops_apart():
+    async def scenario():
+        manager = config_manager.ConfigManager(_bot(), "test", drive_backend=Offline())
+        manager.add_pair({"A_ID": None, "B_ID": 1, "CHANNEL_MAPPING": {}, "ADMIN_IDS": []})
+        manager.set_channel_mapping(manager.get_pair_by_guild(1), 10, 20)
+        await manager.persister.flush(compact=True)
+        compacted = (manager.persister.journal.size, manager.persister.journal.should_compact())
+        await manager.flush_config()
+        return compacted, manager.persister.unsynced.read_ops()
+
+    compacted, unsynced = asyncio.run(scenario())
+    # Drive に届かなくてもローカルはまとめ直され、まとめ直しが毎回続くことはない
+    assert compacted == (0, False)
+    assert [op["op"] for op in unsynced] == ["add_pair", "map"]
+    config = config_manager.load_local_config()
+    assert config["server_pairs"][0]["CHANNEL_MAPPING"] == {"10": 20}
+
+
+def test_unsynced_ops_are_uploaded_after_a_restart():
+    async def offline():
+        manager = config_manager.ConfigManager(_bot(), "test", drive_backend=Offline())
+        manager.add_pair({"A_ID": None, "B_ID": 1, "CHANNEL_MAPPING": {}, "ADMIN_IDS": []})
+        await manager.flush_config()
+
+    # 停止中に Drive 側では別のペアが追加されていた
+    backend = InMemoryDriveBackend(json.dumps({"server_pairs": [{"B_ID": 2, "CHANNEL_MAPPING": {}}]}))
+
+    async def online():
+        manager = config_manager.ConfigManager(_bot(), "test", drive_backend=backend)
+        await manager._refresh_task
+        await manager.flush_config()
+        return manager.persister.unsynced.size
+
+    asyncio.run(offline())
+    assert asyncio.run(online()) == 0
+    assert sorted(p["B_ID"] for p in json.loads(backend.download_text())["server_pairs"]) == [1, 2]
+
+
+def test_journal_from_before_the_split_counts_as_unsynced():
+    ConfigJournal().append(OPS[:1])
+    persister = config_persister.ConfigPersister(None, config_manager.CONFIG_LOCAL_PATH, ConfigJournal())
+    assert persister.unsynced.read_ops() == OPS[:1]
+    assert persister.stats()["unsynced_bytes"] > 0
+
+
+def test_compaction_uploads_and_empties_both_logs():
+    backend = InMemoryDriveBackend(json.dumps({"server_pairs": []}))
+
+    async def scenario():
+        manager = config_manager.ConfigManager(_bot(), "test", drive_backend=backend)
+        await manager._refresh_task
+        await manager.persister.flush(compact=True)   # 取得直後のスナップショットを先に書く
+        manager.add_pair({"A_ID": None, "B_ID": 1, "CHANNEL_MAPPING": {}, "ADMIN_IDS": []})
+        await manager.persister.flush()
+        appended = (manager.persister.journal.size, manager.persister.unsynced.size)
+        await manager.persister.flush(compact=True)
+        after = (manager.persister.journal.size, manager.persister.unsynced.size)
+        await manager.flush_config()
+        return appended, after
+
+    appended, after = asyncio.run(scenario())
+    assert all(appended)
+    assert after == (0, 0)
+    assert json.loads(backend.download_text())["server_pairs"][0]["B_ID"] == 1
+    assert read_snapshot(config_manager.CONFIG_LOCAL_PATH)["server_pairs"][0]["B_ID"] == 1
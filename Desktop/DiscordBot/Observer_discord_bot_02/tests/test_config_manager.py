@@ -0,0 +1,69 @@
+# tests/test_config_manager.py
+import asyncio
+import discord
+import pytest
+from discord.ext import commands
+import config_manager
+from google_api.config_sync import InMemoryDriveBackend
+
+
+def _run(scenario):
+    """ConfigManager は起動時にタスクを作るため、イベントループ上で組み立てて確かめる"""
+    async def main():
+        bot = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+        manager = config_manager.ConfigManager(bot, "test", drive_backend=InMemoryDriveBackend())
+        await manager._refresh_task
+        scenario(manager)
+        await manager.flush_config()
+
+    asyncio.run(main())
+
+
+def _pair(a_id, b_id) -> dict:
+    return {"A_ID": a_id, "B_ID": b_id, "CHANNEL_MAPPING": {}, "ADMIN_IDS": [5]}
+
+
+# ---------- サーバー設定のビュー ----------
+def test_server_config_is_a_read_only_live_view():
+    def scenario(manager):
+        manager.add_pair(_pair(1, 2))
+        view = manager.get_server_config(1)
+        assert view is manager.get_server_config(2)
+        with pytest.raises(TypeError):
+            view["A_ID"] = 9
+        manager.set_pair_value(manager.get_pair_by_guild(2), "DEBUG_CHANNEL", 30)
+        assert view["DEBUG_CHANNEL"] == 30
+        assert manager.get_server_config(3) is None
+
+    _run(scenario)
+
+
+def test_server_config_follows_an_a_id_change():
+    def scenario(manager):
+        manager.add_pair(_pair(1, 2))
+        manager.set_pair_value(manager.get_pair_by_guild(2), "A_ID", 3)
+        assert manager.get_server_config(1) is None
+        assert manager.get_server_config(3)["A_ID"] == 3
+
+    _run(scenario)
+
+
+# ---------- チャンネルマッピングの索引 ----------
+def test_unmapping_a_shared_source_keeps_the_other_pair():
+    def scenario(manager):
+        first, second = _pair(1, 2), _pair(1, 4)
+        manager.add_pair(first)
+        manager.add_pair(second)
+        manager.set_channel_mapping(first, 10, 20)
+        manager.set_channel_mapping(second, 10, 40)
+        # 索引を持っていないペアから外しても、転送先は変わらない
+        manager.remove_channel_mapping(first, 10)
+        assert manager.get_dest_channel_id(10) == 40
+        # 索引を持っていたペアから外すと、まだマッピングしているペアが引き継ぐ
+        manager.set_channel_mapping(first, 10, 20)
+        manager.remove_channel_mapping(first, 10)
+        assert manager.get_dest_channel_id(10) == 40
+        manager.remove_channel_mapping(second, 10)
+        assert manager.get_dest_channel_id(10) is None
+
+    _run(scenario)
@@ -0,0 +1,179 @@
+# tests/test_config_sync.py
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+import discord
+import pytest
+from discord.ext import commands
+import config_manager
+from google_api import config_sync
+from google_api.config_sync import ConfigSync, InMemoryDriveBackend
+from google_api.drive_handler import ConfigConflictError
+
+
+@pytest.fixture(autouse=True)
+def fast_lease(monkeypatch):
+    monkeypatch.setattr(config_sync, "LEASE_SETTLE_SECONDS", 0)
+    monkeypatch.setattr(config_sync, "LEASE_WAIT_SECONDS", 0.2)
+
+
+def _pair(b_id: int, **values) -> dict:
+    pair = {"A_ID": None, "B_ID": b_id, "CHANNEL_MAPPING": {}, "ADMIN_IDS": []}
+    pair.update(values)
+    return pair
+
+
+def _text(config: dict) -> str:
+    return json.dumps(config, indent=2, ensure_ascii=False)
+
+
+def _writer(backend) -> ConfigSync:
+    """Drive を読み込み済みのインスタンス1つ分"""
+    sync = ConfigSync(SimpleNamespace(drive_handler=backend))
+    sync.base_md5 = backend.fetch_metadata()["md5"]
+    return sync
+
+
+# ---------- ConfigSync.push ----------
+def test_push_without_conflict_uploads_text():
+    backend = InMemoryDriveBackend(_text({"server_pairs": []}))
+    sync = _writer(backend)
+
+    text = _text({"server_pairs": [_pair(1)]})
+    assert sync.push(text, lambda: []) is None
+
+    assert backend.download_text() == text
+    assert sync.base_md5 == backend.fetch_metadata()["md5"]
+    assert sync.generation == 1
+    assert backend.read_lease() is None
+
+
+def test_two_writers_conflict_is_merged_by_replaying_ops():
+    backend = InMemoryDriveBackend(_text({"server_pairs": [_pair(1)]}))
+    first = _writer(backend)
+    second = _writer(backend)
+
+    # 1台目が先に書く
+    first.push(_text({"server_pairs": [_pair(1, A_ID=10)]}), lambda: [])
+
+    # 2台目は古い md5 のまま自分の変更を送る → 取り直して自分の操作を再生する
+    ops = [
+        {"op": "map", "b_id": 1, "src": "100", "dest": 200},
+        {"op": "add_pair", "pair": _pair(2)},
+    ]
+    merged = second.push(_text({"server_pairs": [_pair(1, CHANNEL_MAPPING={"100": 200}), _pair(2)]}), lambda: ops)
+
+    assert second.conflicts == 1
+    assert merged["server_pairs"][0]["A_ID"] == 10                       # 1台目の変更が残る
+    assert merged["server_pairs"][0]["CHANNEL_MAPPING"] == {"100": 200}  # 2台目の変更も載る
+    assert [p["B_ID"] for p in merged["server_pairs"]] == [1, 2]
+    assert json.loads(backend.download_text()) == merged
+    assert second.base_md5 == backend.fetch_metadata()["md5"]
+
+
+def test_replay_is_idempotent_when_remote_already_has_the_ops():
+    ops = [{"op": "add_pair", "pair": _pair(1)}, {"op": "add_admin", "b_id": 1, "user_id": 5}]
+    backend = InMemoryDriveBackend(_text({"server_pairs": [_pair(1, ADMIN_IDS=[5])]}))
+    sync = _writer(backend)
+    backend.upload_text(_text({"server_pairs": [_pair(1, ADMIN_IDS=[5], A_ID=3)]}))
+
+    merged = sync.push(_text({"server_pairs": [_pair(1, ADMIN_IDS=[5])]}), lambda: ops)
+
+    assert merged == {"server_pairs": [_pair(1, ADMIN_IDS=[5], A_ID=3)]}
+
+
+def test_push_gives_up_after_max_attempts(monkeypatch):
+    class AlwaysConflicting(InMemoryDriveBackend):
+        def upload_text(self, text, expected_md5=None):
+            raise ConfigConflictError("changed again")
+
+    backend = AlwaysConflicting(_text({"server_pairs": []}))
+    sync = _writer(backend)
+
+    with pytest.raises(ConfigConflictError):
+        sync.push(_text({"server_pairs": []}), lambda: [])
+    assert sync.conflicts == config_sync.MAX_PUSH_ATTEMPTS
+    assert backend.read_lease() is None
+
+
+# ---------- 書き込みリース ----------
+def test_push_waits_for_a_live_lease_and_fails():
+    backend = InMemoryDriveBackend(_text({"server_pairs": []}))
+    backend.write_lease({"owner": "other", "until": time.time() + 60})
+    sync = _writer(backend)
+
+    with pytest.raises(ConfigConflictError):
+        sync.push(_text({"server_pairs": [_pair(1)]}), lambda: [])
+    assert json.loads(backend.download_text()) == {"server_pairs": []}
+    assert backend.read_lease()["owner"] == "other"
+
+
+def test_push_takes_over_an_expired_lease():
+    backend = InMemoryDriveBackend(_text({"server_pairs": []}))
+    backend.write_lease({"owner": "crashed", "until": time.time() - 1})
+    sync = _writer(backend)
+
+    sync.push(_text({"server_pairs": [_pair(1)]}), lambda: [])
+
+    assert json.loads(backend.download_text()) == {"server_pairs": [_pair(1)]}
+    assert backend.read_lease() is None
+
+
+# ---------- ConfigManager との組み合わせ ----------
+async def _manager(backend) -> config_manager.ConfigManager:
+    bot = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+    manager = config_manager.ConfigManager(bot, "test", drive_backend=backend)
+    await manager._refresh_task
+    assert manager.drive_ready
+    return manager
+
+
+def test_merged_upload_keeps_held_pair_objects():
+    async def scenario():
+        backend = InMemoryDriveBackend(_text({"server_pairs": [_pair(1)]}))
+        manager = await _manager(backend)
+        pair = manager.get_pair_by_guild(1)
+
+        # 別インスタンスがペアを追加した後に、こちらが同じペアを変更して送る
+        other = json.loads(backend.download_text())
+        other["server_pairs"].append(_pair(2))
+        backend.upload_text(_text(other))
+        manager.set_channel_mapping(pair, 10, 20)
+        await manager.persister.flush(compact=True)
+        assert manager.sync.conflicts == 1
+
+        # StructureSync のように保持していた参照への変更がそのまま config に載る
+        manager.set_channel_mapping(pair, 11, 21)
+        assert manager.get_pair_by_guild(1) is pair
+        assert manager.get_pair_by_guild(2)["B_ID"] == 2
+        assert manager.get_dest_channel_id(11) == 21
+        await manager.flush_config()
+        return json.loads(backend.download_text())
+
+    drive = asyncio.run(scenario())
+    assert drive["server_pairs"][0]["CHANNEL_MAPPING"] == {"10": 20, "11": 21}
+    assert [p["B_ID"] for p in drive["server_pairs"]] == [1, 2]
+
+
+def test_first_fetch_is_retried_until_drive_answers(monkeypatch):
+    monkeypatch.setattr(config_manager, "DRIVE_RETRY_INITIAL_SECONDS", 0.01)
+
+    class Flaky(InMemoryDriveBackend):
+        failures = 2
+
+        def fetch_metadata(self):
+            if self.failures:
+                self.failures -= 1
+                raise OSError("temporary")
+            return super().fetch_metadata()
+
+    async def scenario():
+        manager = await _manager(Flaky(_text({"server_pairs": [_pair(7)]})))
+        watching = manager.sync._watch_task is not None
+        await manager.flush_config()
+        return manager.config, watching
+
+    config, watching = asyncio.run(scenario())
+    assert config == {"server_pairs": [_pair(7)]}
+    assert watching
@@ -0,0 +1,87 @@
+# tests/test_dedup.py
+import asyncio
+import time
+from utils.dedup import DedupFilter
+
+
+def _filter(tmp_path, **kwargs) -> DedupFilter:
+    return DedupFilter(str(tmp_path / "dedup.json"), **kwargs)
+
+
+def test_second_sighting_is_suppressed(tmp_path):
+    async def scenario():
+        dedup = _filter(tmp_path)
+        first = dedup.seen("relay:1")
+        second = dedup.seen("relay:1")
+        other = dedup.seen("audit:1")   # 接頭辞が違えば別のキー
+        dedup.close()
+        return first, second, other, dedup.stats()
+
+    first, second, other, stats = asyncio.run(scenario())
+    assert (first, second, other) == (False, True, False)
+    assert stats["suppressed"] == {"relay": 1}
+
+
+def test_ring_is_bounded_by_capacity(tmp_path):
+    async def scenario():
+        dedup = _filter(tmp_path, capacity=3)
+        for i in range(5):
+            dedup.seen(f"relay:{i}")
+        dedup.close()
+        return dedup
+
+    dedup = asyncio.run(scenario())
+    assert dedup.stats()["keys"] == 3
+    assert dedup.stats()["expired"] == 2
+    assert "relay:0" not in dedup._keys
+
+
+def test_old_keys_expire_with_the_window(tmp_path, monkeypatch):
+    async def scenario():
+        dedup = _filter(tmp_path, window=60)
+        dedup.seen("relay:1")
+        later = time.time() + 120
+        monkeypatch.setattr(time, "time", lambda: later)
+        again = dedup.seen("relay:1")
+        dedup.close()
+        return again
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_forget_lets_a_key_through_again(tmp_path):
+    async def scenario():
+        dedup = _filter(tmp_path)
+        dedup.seen("ban:1")
+        dedup.forget("ban:1")
+        again = dedup.seen("ban:1")
+        dedup.close()
+        return again
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_tail_survives_a_restart(tmp_path):
+    async def scenario():
+        dedup = _filter(tmp_path)
+        dedup.seen("relay:1")
+        dedup.close()
+
+    asyncio.run(scenario())
+    restarted = _filter(tmp_path)
+    assert "relay:1" in restarted._keys
+
+
+def test_contains_does_not_record(tmp_path):
+    async def scenario():
+        dedup = _filter(tmp_path)
+        before = dedup.contains("relay:1")
+        dedup.add("relay:1")
+        after = dedup.contains("relay:1")
+        dedup.close()
+        return before, after, dedup.stats()
+
+    before, after, stats = asyncio.run(scenario())
+    assert (before, after) == (False, True)
+    assert stats["keys"] == 1
+    assert stats["suppressed"] == {"relay": 1}
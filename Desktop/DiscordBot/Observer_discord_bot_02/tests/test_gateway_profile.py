@@ -0,0 +1,29 @@
+# tests/test_gateway_profile.py
+from utils.gateway_profile import GatewayProfile, chunk_targets, required_intents
+
+COGS = ["cogs.transfer_cog", "cogs.audit_cog", "cogs.voice_chat.vc_cog"]
+
+
+def test_commands_keep_guild_and_dm_messages():
+    reasons = required_intents({"server_pairs": []}, [])
+    assert {"guilds", "guild_messages", "dm_messages", "message_content"} <= set(reasons)
+
+
+def test_member_intents_follow_configured_pairs():
+    assert "members" not in required_intents({"server_pairs": []}, COGS)
+    config = {"server_pairs": [{"A_ID": 1, "B_ID": 2, "AUDIT_LOG_CHANNEL": 3}]}
+    reasons = required_intents(config, COGS)
+    assert {"members", "moderation", "invites", "voice_states"} <= set(reasons)
+    assert chunk_targets(config, COGS) == {1, 2}
+
+
+def test_missing_snapshot_enables_everything_the_cogs_can_use():
+    profile = GatewayProfile(None, COGS, mode="auto")
+    assert profile.intents.members and profile.intents.dm_messages
+    assert profile.missing(None) == []
+    assert profile.missing({"server_pairs": []}) == []
+
+
+def test_missing_reports_intents_needed_after_startup():
+    profile = GatewayProfile({"server_pairs": []}, COGS, mode="auto")
+    assert profile.missing({"server_pairs": [{"A_ID": 1, "B_ID": 2}]}) == ["members"]
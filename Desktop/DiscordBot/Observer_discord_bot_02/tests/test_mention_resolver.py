@@ -0,0 +1,103 @@
+# tests/test_mention_resolver.py
+import asyncio
+from types import SimpleNamespace
+import discord
+from utils.mention_resolver import MentionResolver, rewrite_mentions
+
+
+class FakeGuild:
+    def __init__(self, members=None, remote=None, roles=()):
+        self.id = 1
+        self.members = members or {}   # ゲートウェイのキャッシュにいるメンバー
+        self.remote = remote or {}     # fetch_member でだけ取れるメンバー
+        self.roles = list(roles)
+        self.fetched = []
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def fetch_member(self, user_id):
+        self.fetched.append(user_id)
+        await asyncio.sleep(0)
+        if user_id not in self.remote:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Member")
+        return self.remote[user_id]
+
+    def get_role(self, role_id):
+        return next((r for r in self.roles if r.id == role_id), None)
+
+
+def _role(role_id, name):
+    return SimpleNamespace(id=role_id, name=name)
+
+
+# ---------- rewrite_mentions ----------
+def test_rewrite_replaces_users_and_roles_in_one_pass():
+    text = "<@1> <@!2> <@&3> <@4> plain"
+    users = {1: "<@11>", 2: "<@12>"}
+    roles = {3: "<@&13>"}
+    assert rewrite_mentions(text, users, roles) == "<@11> <@12> <@&13> <@4> plain"
+
+
+def test_rewrite_keeps_text_without_mentions():
+    assert rewrite_mentions("", {}, {}) == ""
+    assert rewrite_mentions("no mentions", {1: "x"}, {}) == "no mentions"
+
+
+# ---------- MentionResolver ----------
+def test_concurrent_lookups_share_one_fetch():
+    guild = FakeGuild(remote={5: "member-5"})
+
+    async def scenario():
+        resolver = MentionResolver()
+        found = await asyncio.gather(*(resolver.member(guild, 5) for _ in range(3)))
+        again = await resolver.member(guild, 5)
+        return resolver, found, again
+
+    resolver, found, again = asyncio.run(scenario())
+    assert found == ["member-5"] * 3
+    assert again == "member-5"
+    assert guild.fetched == [5]
+    assert resolver.stats()["cache_hits"] == 1
+
+
+def test_missing_members_are_remembered_until_forgotten():
+    guild = FakeGuild()
+
+    async def scenario():
+        resolver = MentionResolver()
+        first = await resolver.member(guild, 7)
+        second = await resolver.member(guild, 7)
+        resolver.forget_member(guild.id, 7)
+        await resolver.member(guild, 7)
+        return resolver, first, second
+
+    resolver, first, second = asyncio.run(scenario())
+    assert (first, second) == (None, None)
+    assert resolver.stats()["negative_hits"] == 1
+    assert guild.fetched == [7, 7]
+
+
+def test_roles_fall_back_to_the_first_role_with_the_same_name():
+    admins = _role(21, "admin")
+    guild = FakeGuild(roles=[admins, _role(22, "admin"), _role(23, "member")])
+    resolver = MentionResolver()
+    assert resolver.role(guild, _role(23, "other")).id == 23   # 同じ ID が優先
+    assert resolver.role(guild, _role(99, "admin")) is admins
+    assert resolver.role(guild, _role(98, "missing")) is None
+    assert resolver.stats()["role_index_builds"] == 1
+
+    guild.roles.insert(0, _role(24, "missing"))
+    resolver.invalidate_roles(guild.id)
+    assert resolver.role(guild, _role(98, "missing")).id == 24
+
+
+def test_resolve_maps_mentions_to_the_destination():
+    guild = FakeGuild(members={1: "member-1"}, roles=[_role(30, "mod")])
+    message = SimpleNamespace(
+        mentions=[SimpleNamespace(id=1), SimpleNamespace(id=1), SimpleNamespace(id=2)],
+        role_mentions=[_role(3, "mod"), _role(4, "gone")],
+    )
+    members, roles = asyncio.run(MentionResolver().resolve(message, guild))
+    assert members == {1: "member-1"}
+    assert {src: role.id for src, role in roles.items()} == {3: 30}
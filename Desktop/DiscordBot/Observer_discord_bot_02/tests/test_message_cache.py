@@ -0,0 +1,113 @@
+# tests/test_message_cache.py
+import asyncio
+import time
+from types import SimpleNamespace
+from utils import message_cache
+from utils.message_cache import MessageCache
+
+
+def _message(message_id: int, content: str = "hello", attachments=()):
+    return SimpleNamespace(
+        id=message_id,
+        channel=SimpleNamespace(id=10),
+        author=SimpleNamespace(id=5, display_name="alice"),
+        content=content,
+        attachments=[SimpleNamespace(url=url, content_type=kind) for url, kind in attachments],
+    )
+
+
+def test_pop_returns_the_record_once():
+    async def scenario():
+        cache = MessageCache(spill_path=None)
+        cache.put(_message(1, attachments=[("https://cdn/a.png", "image/png")]))
+        record = await cache.pop(1)
+        again = await cache.pop(1)
+        return cache, record, again
+
+    cache, record, again = asyncio.run(scenario())
+    assert (record.author_id, record.author, record.content) == (5, "alice", "hello")
+    assert record.attachments == (("https://cdn/a.png", "image/png"),)
+    assert again is None
+    assert cache.bytes == 0
+
+
+def test_over_budget_records_spill_to_disk_in_one_batch(tmp_path):
+    async def scenario():
+        cache = MessageCache(budget=1, spill_path=str(tmp_path / "cache.sqlite3"))
+        cache.put(_message(1, attachments=[("https://cdn/a.png", None)]))
+        cache.put(_message(2, "second"))
+        # 追い出した直後はまだ書いておらず、書くまでの間もメモリから引ける
+        unwritten = cache.stats()
+        await cache.flush()
+        written = cache.stats()
+        found = await cache.pop_many([1, 2, 3])
+        after = cache.stats()
+        await cache.close()
+        return unwritten, written, found, after
+
+    unwritten, written, found, after = asyncio.run(scenario())
+    assert (unwritten["entries"], unwritten["unwritten"], unwritten["disk_rows"]) == (0, 2, 0)
+    assert (written["disk_rows"], written["batches"]) == (2, 1)
+    assert found[1].attachments == (("https://cdn/a.png", ""),)
+    assert (found[2].author_id, found[2].content) == (5, "second")
+    assert (after["disk_hits"], after["misses"], after["disk_rows"]) == (2, 1, 0)
+
+
+def test_unwritten_records_are_popped_from_memory(tmp_path):
+    async def scenario():
+        cache = MessageCache(budget=1, spill_path=str(tmp_path / "cache.sqlite3"))
+        cache.put(_message(1))
+        record = await cache.pop(1)
+        await cache.flush()
+        stats = cache.stats()
+        await cache.close()
+        return record, stats
+
+    record, stats = asyncio.run(scenario())
+    assert record.content == "hello"
+    assert (stats["memory_hits"], stats["disk_rows"]) == (1, 0)
+
+
+def test_full_buffer_is_written_without_waiting(tmp_path, monkeypatch):
+    monkeypatch.setattr(message_cache, "FLUSH_MAX_ROWS", 2)
+    monkeypatch.setattr(message_cache, "FLUSH_INTERVAL_SECONDS", 60)
+
+    async def scenario():
+        cache = MessageCache(budget=1, spill_path=str(tmp_path / "cache.sqlite3"))
+        cache.put(_message(1))
+        cache.put(_message(2))
+        await cache._flush_now
+        stats = cache.stats()
+        await cache.close()
+        return stats
+
+    assert asyncio.run(scenario())["disk_rows"] == 2
+
+
+def test_expired_records_leave_memory(monkeypatch):
+    async def scenario():
+        cache = MessageCache(ttl=60, spill_path=None)
+        cache.put(_message(1))
+        later = time.time() + 120
+        monkeypatch.setattr(time, "time", lambda: later)
+        cache.put(_message(2))
+        return await cache.pop(1), await cache.pop(2)
+
+    first, second = asyncio.run(scenario())
+    assert first is None
+    assert second is not None
+
+
+def test_close_moves_memory_to_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def scenario():
+        cache = MessageCache(spill_path=path)
+        cache.put(_message(1))
+        await cache.close()
+        reopened = MessageCache(spill_path=path)
+        record = await reopened.pop(1)
+        await reopened.close()
+        return record
+
+    assert asyncio.run(scenario()).content == "hello"
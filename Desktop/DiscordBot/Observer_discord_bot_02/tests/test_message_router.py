@@ -0,0 +1,49 @@
+# tests/test_message_router.py
+import asyncio
+from types import SimpleNamespace
+from utils.message_router import ALL_CHANNELS, MessageRouter
+
+
+def _bot():
+    async def get_context(message):
+        return SimpleNamespace(valid=False)
+
+    config_manager = SimpleNamespace(version=1, config={"server_pairs": [{"A_ID": 1, "B_ID": 2}]})
+    return SimpleNamespace(get_context=get_context, config_manager=config_manager)
+
+
+def _message(channel_id: int):
+    return SimpleNamespace(author=SimpleNamespace(bot=False), guild=SimpleNamespace(id=1), channel=SimpleNamespace(id=channel_id))
+
+
+def test_routed_handlers_are_held_until_they_finish():
+    seen = []
+
+    async def scenario():
+        router = MessageRouter(_bot())
+        gate = asyncio.Event()
+
+        async def slow(message):
+            await gate.wait()
+            seen.append(("slow", message.channel.id))
+
+        async def everywhere(message):
+            seen.append(("all", message.channel.id))
+
+        router.register("slow", lambda guild_id: {10}, slow)
+        router.register("all", lambda guild_id: ALL_CHANNELS, everywhere)
+        await router.on_message(_message(10))
+        await router.on_message(_message(11))
+        for _ in range(3):   # 完了したタスクの done コールバックまで回す
+            await asyncio.sleep(0)
+        running = router.stats()["running"]
+        gate.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return running, router.stats()
+
+    running, stats = asyncio.run(scenario())
+    assert running == 1   # 待っている処理はルーター側で参照を持つ
+    assert stats["running"] == 0
+    assert sorted(seen) == [("all", 10), ("all", 11), ("slow", 10)]
+    assert stats["features"]["slow"]["calls"] == 1
@@ -0,0 +1,41 @@
+# tests/test_pcm_ring.py
+import numpy as np
+import pytest
+from cogs.voice_chat.pcm_ring import PcmRingBuffer
+
+
+def _frame(value: int, samples: int = 4) -> bytes:
+    return np.full(samples, value, dtype=np.int16).tobytes()
+
+
+def _joined(ring: PcmRingBuffer, start: int, end: int) -> list:
+    parts = ring.slices(start, end)
+    return np.concatenate(parts).tolist() if parts else []
+
+
+def test_slices_follow_frame_numbers_across_the_wrap():
+    ring = PcmRingBuffer(3, 4)
+    for value in range(1, 6):
+        ring.write(_frame(value))
+
+    assert ring.oldest == 2
+    parts = ring.slices(2, 5)
+    assert len(parts) == 2                            # 折り返しは2つのビュー
+    assert all(part.base is not None for part in parts)   # コピーではない
+    assert _joined(ring, 0, 5) == [3] * 4 + [4] * 4 + [5] * 4   # 上書き済みは含めない
+    assert _joined(ring, 3, 4) == [4] * 4
+    assert ring.slices(5, 9) == []
+
+
+def test_short_frames_are_padded_with_silence():
+    ring = PcmRingBuffer(2, 4)
+    ring.write(_frame(7, samples=4))
+    row = ring.write(_frame(9, samples=2))
+    assert row.tolist() == [9, 9, 0, 0]
+
+
+def test_rms_is_normalised():
+    ring = PcmRingBuffer(1, 4)
+    assert ring.rms(ring.write(_frame(0))) == 0.0
+    assert ring.rms(ring.write(_frame(-32768))) == pytest.approx(1.0)
+    assert ring.rms(ring.write(_frame(16384))) == pytest.approx(0.5)
@@ -0,0 +1,117 @@
+# tests/test_relay_checkpoints.py
+import asyncio
+import json
+from types import SimpleNamespace
+import discord
+from discord.ext import commands
+import config_manager
+from cogs.transfer_cog import TransferCog
+from google_api.config_sync import InMemoryDriveBackend
+from utils.dedup import DedupFilter
+from utils.relay_checkpoints import RelayCheckpoints
+
+
+async def _manager(backend) -> config_manager.ConfigManager:
+    bot = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+    manager = config_manager.ConfigManager(bot, "test", drive_backend=backend)
+    await manager._refresh_task
+    return manager
+
+
+def test_checkpoints_are_saved_to_drive_with_the_config():
+    async def scenario():
+        backend = InMemoryDriveBackend(json.dumps({"server_pairs": []}))
+        manager = await _manager(backend)
+        checkpoints = RelayCheckpoints(manager)
+        checkpoints.release()
+        checkpoints.advance(10, 500)
+        checkpoints.advance(10, 400)   # 戻らない
+        checkpoints.set_backfill(11, {"after": 1, "before": 9, "relayed": 0})
+        checkpoints.close()
+        await manager.flush_config()
+        return json.loads(backend.download_text())
+
+    drive = asyncio.run(scenario())
+    assert drive["relay_checkpoints"] == {"10": 500}
+    assert drive["backfill_state"] == {"11": {"after": 1, "before": 9, "relayed": 0}}
+
+
+def test_checkpoints_survive_a_fresh_disk():
+    backend = InMemoryDriveBackend(json.dumps({"server_pairs": [], "relay_checkpoints": {"10": 500}}))
+
+    async def scenario():
+        manager = await _manager(backend)
+        checkpoints = RelayCheckpoints(manager)
+        value = checkpoints.get(10)
+        await manager.flush_config()
+        return value
+
+    assert asyncio.run(scenario()) == 500
+
+
+def test_live_advances_are_held_until_released():
+    saved = {}
+    manager = SimpleNamespace(
+        get_relay_checkpoint=saved.get,
+        advance_relay_checkpoint=saved.__setitem__,
+        set_backfill_state=lambda channel_id, state: None,
+    )
+
+    async def scenario():
+        checkpoints = RelayCheckpoints(manager)
+        checkpoints.advance(10, 900)
+        checkpoints.save()
+        held = dict(saved)            # 追いつきが開始位置を読む前は渡さない
+        current = checkpoints.get(10)
+        checkpoints.release()
+        checkpoints.close()
+        return held, current
+
+    held, current = asyncio.run(scenario())
+    assert held == {}
+    assert current == 900
+    assert saved == {10: 900}
+
+
+# ---------- 送信完了でだけ進める ----------
+def _advance_after(tmp_path, results) -> tuple:
+    saved = {}
+    cog = SimpleNamespace(
+        checkpoints=SimpleNamespace(advance=saved.__setitem__),
+        bot=SimpleNamespace(dedup=None),
+        _relaying={"relay:42"},
+    )
+    message = SimpleNamespace(id=42, channel=SimpleNamespace(id=10))
+
+    async def scenario():
+        cog.bot.dedup = DedupFilter(str(tmp_path / "dedup.json"))
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in results]
+        TransferCog._checkpoint_when_sent(cog, message, futures)
+        for future, result in zip(futures, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        delivered = cog.bot.dedup.contains("relay:42")
+        cog.bot.dedup.close()
+        return delivered
+
+    delivered = asyncio.run(scenario())
+    return saved, delivered, cog._relaying
+
+
+def test_checkpoint_advances_when_every_send_succeeds(tmp_path):
+    assert _advance_after(tmp_path, ["embed", "file"]) == ({10: 42}, True, set())
+
+
+def test_checkpoint_stays_when_a_send_fails(tmp_path):
+    # 失敗した転送は転送済みにしないので、追いつき・backfill で送り直せる
+    assert _advance_after(tmp_path, ["embed", RuntimeError("403")]) == ({}, False, set())
+
+
+def test_checkpoint_is_left_to_the_embed_fallback(tmp_path):
+    # Webhook が使えず Embed 方式に切り替えた送信は None を返す。切り替え先が終わるまで送信中のまま
+    assert _advance_after(tmp_path, [None]) == ({}, False, {"relay:42"})
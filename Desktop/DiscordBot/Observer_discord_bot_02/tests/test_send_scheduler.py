@@ -0,0 +1,169 @@
+# tests/test_send_scheduler.py
+import asyncio
+from types import SimpleNamespace
+import discord
+import pytest
+from yarl import URL
+from utils import send_scheduler
+from utils.send_scheduler import SendScheduler, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def short_idle(monkeypatch):
+    # 空になったワーカーがすぐ止まるようにする（イベントループの終了を待たせない）
+    monkeypatch.setattr(send_scheduler, "IDLE_WORKER_SECONDS", 0.1)
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int = 1):
+        self.id = channel_id
+        self.sent = []
+
+    async def send(self, *args, **kwargs):
+        self.sent.append((args, kwargs))
+        return len(self.sent)
+
+
+def _headers(limit=5, remaining=4, reset_after=5.0) -> dict:
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset-After": str(reset_after),
+    }
+
+
+# ---------- TokenBucket ----------
+def test_success_headers_shrink_the_bucket_without_blocking():
+    bucket = TokenBucket()
+    bucket.learn(headers=_headers(limit=5, remaining=2, reset_after=3.0))
+    assert bucket.tokens <= 2
+    assert bucket.blocked_until == 0.0
+
+
+def test_exhausted_bucket_blocks_until_reset():
+    bucket = TokenBucket()
+    bucket.learn(headers=_headers(limit=5, remaining=0, reset_after=2.5))
+    assert bucket.tokens == 0
+    assert bucket.blocked_until > 0
+
+
+def test_bad_headers_are_ignored():
+    bucket = TokenBucket()
+    bucket.learn(headers={"X-RateLimit-Limit": "x"})
+    assert bucket.limit == send_scheduler.DEFAULT_BUCKET_LIMIT
+
+
+# ---------- SendScheduler ----------
+def test_response_headers_reach_the_destination_bucket():
+    async def scenario():
+        scheduler = SendScheduler()
+        channel = FakeChannel(42)
+        ticket = scheduler.reserve(channel)
+        params = SimpleNamespace(
+            url=URL("https://discord.com/api/v10/channels/42/messages"),
+            response=SimpleNamespace(headers=_headers(remaining=0, reset_after=1.0)),
+        )
+        await scheduler._on_request_end(None, None, params)
+        bucket = scheduler._queues[42].bucket
+        ticket.close()
+        return bucket
+
+    bucket = asyncio.run(scenario())
+    assert bucket.tokens == 0
+    assert bucket.blocked_until > 0
+
+
+def test_sends_keep_order_per_destination():
+    async def scenario():
+        scheduler = SendScheduler()
+        channel = FakeChannel()
+        first = scheduler.reserve(channel)
+        second = scheduler.reserve(channel)
+        later = second.send(channel, "second")
+        earlier = first.send(channel, "first")
+        first.close()
+        second.close()
+        await asyncio.gather(earlier, later)
+        return channel.sent
+
+    assert [args[0] for args, _ in asyncio.run(scenario())] == ["first", "second"]
+
+
+def test_abandoned_ticket_fails_late_jobs_and_closes_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(send_scheduler, "TICKET_TIMEOUT_SECONDS", 0.05)
+
+    async def scenario():
+        scheduler = SendScheduler()
+        channel = FakeChannel()
+        stuck = scheduler.reserve(channel)   # 閉じられないまま放置されるチケット
+        behind = scheduler.reserve(channel)
+        await behind.send(channel, "after")  # 破棄された後ろのチケットは送られる
+        behind.close()
+
+        # 破棄後に積まれたジョブは送られずに失敗し、添付は閉じられる
+        path = tmp_path / "a.txt"
+        path.write_bytes(b"data")
+        file = discord.File(str(path))
+        late = stuck.send(channel, "late", file=file)
+        with pytest.raises(asyncio.TimeoutError):
+            await late
+        return scheduler, channel, file
+
+    scheduler, channel, file = asyncio.run(scenario())
+    assert [args[0] for args, _ in channel.sent] == ["after"]
+    assert file.fp.closed
+
+
+def test_abandon_drains_jobs_that_raced_the_timeout(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"data")
+
+    async def scenario():
+        ticket = send_scheduler.Ticket()
+        channel = FakeChannel()
+        file = discord.File(str(path))
+        future = ticket.send(channel, "raced", file=file)
+        assert ticket.abandon() == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await future
+        return file
+
+    assert asyncio.run(scenario()).fp.closed
+
+
+def test_rate_limited_retry_reopens_closed_files(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"data")
+
+    class LimitedChannel(FakeChannel):
+        async def send(self, *args, file=None, **kwargs):
+            try:
+                if not self.sent:
+                    self.sent.append(None)
+                    raise discord.RateLimited(0.01)
+                self.sent.append(file.fp.read())
+                return len(self.sent)
+            finally:
+                file.close()   # discord.py は送信の成否にかかわらず添付を閉じる
+
+    async def scenario():
+        channel = LimitedChannel()
+        await SendScheduler().send(channel, file=discord.File(str(path)))
+        return channel.sent
+
+    assert asyncio.run(scenario()) == [None, b"data"]
+
+
+def test_rate_limited_retry_gives_up_on_in_memory_files():
+    import io
+
+    class LimitedChannel(FakeChannel):
+        async def send(self, *args, file=None, **kwargs):
+            io.BytesIO.close(file.fp)   # 送信で読み捨てられたメモリ上の添付（開き直せない）
+            raise discord.RateLimited(0.01)
+
+    async def scenario():
+        with pytest.raises(RuntimeError, match="開き直せない"):
+            await SendScheduler().send(LimitedChannel(), file=discord.File(io.BytesIO(b"data"), filename="a.txt"))
+
+    asyncio.run(scenario())
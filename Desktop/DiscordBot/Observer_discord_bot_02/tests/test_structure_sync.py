@@ -0,0 +1,194 @@
+# tests/test_structure_sync.py
+import asyncio
+import itertools
+import discord
+from structure_sync import StructureSync, format_plan
+
+FIXED_KEYS = ("DEBUG_CHANNEL", "VC_LOG_CHANNEL")
+_ids = itertools.count(1000)
+
+
+# ---------- 偽のチャンネル・ギルド ----------
+class _Fake:
+    def _setup(self, channel_id, name, position, category_id):
+        self.id = channel_id
+        self.name = name
+        self.position = position
+        self.category_id = category_id
+        self.deleted = False
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+        if "name" in kwargs:
+            self.name = kwargs["name"]
+        if "category" in kwargs:
+            self.category_id = kwargs["category"].id if kwargs["category"] else None
+
+    async def delete(self, reason=None):
+        self.deleted = True
+
+
+class Category(_Fake, discord.CategoryChannel):
+    def __init__(self, channel_id, name, position=0):
+        self._setup(channel_id, name, position, None)
+
+
+class Text(_Fake, discord.TextChannel):
+    def __init__(self, channel_id, name, position=0, category_id=None):
+        self._setup(channel_id, name, position, category_id)
+
+
+class Voice(_Fake, discord.VoiceChannel):
+    def __init__(self, channel_id, name, position=0, category_id=None):
+        self._setup(channel_id, name, position, category_id)
+
+
+class Guild:
+    def __init__(self, *channels):
+        self.channels = list(channels)
+
+    def get_channel(self, channel_id):
+        return next((c for c in self.channels if c.id == channel_id), None)
+
+    def _add(self, channel):
+        self.channels.append(channel)
+        return channel
+
+    async def create_category(self, name):
+        return self._add(Category(next(_ids), name))
+
+    async def create_text_channel(self, name, category=None):
+        return self._add(Text(next(_ids), name, category_id=category.id if category else None))
+
+    async def create_voice_channel(self, name, category=None):
+        return self._add(Voice(next(_ids), name, category_id=category.id if category else None))
+
+
+class FakeConfigManager:
+    """StructureSync が呼ぶ変更メソッドだけを持つ"""
+
+    def __init__(self):
+        self.checkpoints = 0
+
+    def set_pair_value(self, pair, key, value):
+        pair[key] = value
+
+    def set_channel_mapping(self, pair, src_id, dest_id):
+        pair.setdefault("CHANNEL_MAPPING", {})[str(src_id)] = dest_id
+
+    def remove_channel_mapping(self, pair, src_id):
+        pair.get("CHANNEL_MAPPING", {}).pop(str(src_id), None)
+
+    async def checkpoint(self):
+        self.checkpoints += 1
+
+
+def _pair(mapping=None, **fixed) -> dict:
+    pair = {key: fixed.get(key, 1) for key in FIXED_KEYS}
+    pair["CHANNEL_MAPPING"] = {str(k): v for k, v in (mapping or {}).items()}
+    return pair
+
+
+def _actions(steps) -> list:
+    return [(s.action, s.src.id if hasattr(s.src, "id") else s.src, s.dest.id if s.dest else None) for s in steps]
+
+
+# ---------- plan_sync ----------
+def test_missing_fixed_channels_and_unmapped_sources_become_create_steps():
+    guild_a = Guild(Text(2, "chat", 1, category_id=1), Category(1, "general"))
+    pair = _pair(DEBUG_CHANNEL=None)
+    steps = StructureSync(None, pair, Guild(), FIXED_KEYS).plan_sync(guild_a)
+
+    assert [s.key for s in steps if s.action == "fixed"] == ["DEBUG_CHANNEL"]
+    creates = [s for s in steps if s.action == "create"]
+    # カテゴリが先に並び、子の作成はカテゴリの作成を待つ
+    assert [s.src.id for s in creates] == [1, 2]
+    assert creates[1].deps == [creates[0]]
+
+
+def test_unchanged_mapping_has_no_steps():
+    guild_a = Guild(Category(1, "general"), Text(2, "chat", 1, category_id=1))
+    guild_b = Guild(Category(11, "general"), Text(12, "chat", 1, category_id=11))
+    steps = StructureSync(None, _pair({1: 11, 2: 12}), guild_b, FIXED_KEYS).plan_sync(guild_a)
+    assert steps == []
+    assert format_plan(steps) == ["✅ 差分はありません。"]
+
+
+def test_renamed_and_moved_channels_become_update_steps():
+    guild_a = Guild(Category(1, "general"), Category(3, "games"), Text(2, "chat-renamed", 1, category_id=3))
+    guild_b = Guild(Category(11, "general"), Category(13, "games"), Text(12, "chat", 1, category_id=11))
+    sync = StructureSync(None, _pair({1: 11, 2: 12, 3: 13}), guild_b, FIXED_KEYS)
+    # B 側で付けた名前・配置は既定では上書きしない
+    assert sync.plan_sync(guild_a) == []
+
+    steps = sync.plan_sync(guild_a, rename=True)
+    assert len(steps) == 1
+    assert steps[0].action == "update"
+    assert steps[0].changes == {"name": "chat-renamed", "category": True}
+
+
+def test_removed_sources_are_only_unmapped_by_default():
+    # 別の A を指定し直したときも、既存の転送先チャンネルは消さない
+    guild_a = Guild(Text(5, "other"))
+    guild_b = Guild(Text(12, "general"))
+    steps = StructureSync(None, _pair({2: 12}), guild_b, FIXED_KEYS).plan_sync(guild_a)
+    assert format_plan(steps)[0].splitlines()[1:] == ["＋ 作成 テキスト other", "× マッピング解除 2"]
+
+
+def test_removed_sources_are_deleted_when_pruning():
+    guild_a = Guild()
+    guild_b = Guild(Category(11, "old"), Text(12, "old-chat", category_id=11), Text(13, "debug"))
+    pair = _pair({1: 11, 2: 12, 3: 13, 4: 99}, DEBUG_CHANNEL=13)
+    steps = StructureSync(None, pair, guild_b, FIXED_KEYS).plan_sync(guild_a, prune=True)
+
+    assert sorted(_actions(steps)) == sorted([
+        ("delete", 1, 11),
+        ("delete", 2, 12),
+        ("unmap", 3, None),   # 固定チャンネルは消さない
+        ("unmap", 4, None),   # 転送先がもう無い
+    ])
+    category_delete = next(s for s in steps if s.action == "delete" and s.dest.id == 11)
+    child_delete = next(s for s in steps if s.action == "delete" and s.dest.id == 12)
+    assert child_delete in category_delete.deps
+
+
+def test_cleanup_keeps_mapped_and_fixed_channels():
+    guild_b = Guild(Text(11, "mapped"), Text(12, "debug"), Text(13, "stray"), Category(14, "stray-cat"))
+    steps = StructureSync(None, _pair({1: 11}, DEBUG_CHANNEL=12), guild_b, FIXED_KEYS).plan_cleanup()
+    assert sorted(s.dest.id for s in steps) == [13, 14]
+
+
+# ---------- apply ----------
+def test_apply_creates_categories_before_children_and_records_mappings():
+    guild_a = Guild(Category(1, "general"), Text(2, "chat", 1, category_id=1), Voice(3, "talk", 2, category_id=1))
+    guild_b = Guild()
+    pair = _pair()
+    manager = FakeConfigManager()
+    sync = StructureSync(manager, pair, guild_b, FIXED_KEYS)
+
+    applied, failures = asyncio.run(sync.apply(sync.plan_sync(guild_a)))
+
+    assert (applied, failures) == (3, [])
+    assert manager.checkpoints == 3
+    category = guild_b.get_channel(pair["CHANNEL_MAPPING"]["1"])
+    for src in ("2", "3"):
+        assert guild_b.get_channel(pair["CHANNEL_MAPPING"][src]).category_id == category.id
+    # 再計画すると差分は無い
+    assert sync.plan_sync(guild_a) == []
+
+
+def test_failed_category_skips_its_children():
+    class BrokenGuild(Guild):
+        async def create_category(self, name):
+            raise discord.DiscordException("no permission")
+
+    guild_a = Guild(Category(1, "general"), Text(2, "chat", 1, category_id=1))
+    pair = _pair()
+    sync = StructureSync(FakeConfigManager(), pair, BrokenGuild(), FIXED_KEYS)
+
+    applied, failures = asyncio.run(sync.apply(sync.plan_sync(guild_a)))
+
+    assert applied == 0
+    assert [f.error for f in failures] == ["no permission", "前の手順が失敗: ＋ 作成 カテゴリ general"]
+    assert pair["CHANNEL_MAPPING"] == {}
@@ -0,0 +1,108 @@
+# tests/test_vc_analytics.py
+import os
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from cogs.voice_chat import vc_analytics
+from cogs.voice_chat.vc_analytics import TZ, VcAnalyticsCog, VoiceOccupancyStore
+
+GUILD = 1
+MONDAY_NOON = datetime(2026, 10, 5, 12, 0, tzinfo=TZ).timestamp()
+DAY = 86400
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VoiceOccupancyStore(root=str(tmp_path / "analytics"), retention_days=30)
+
+
+def _occ(store, day_at) -> np.ndarray:
+    return dict(store._days(GUILD, "occ", 1, day_at))[vc_analytics._day_key(day_at)]
+
+
+# ---------- 書き込み ----------
+def test_rows_grow_and_keep_earlier_values(store):
+    store.record_occupancy(GUILD, {100: 3}, MONDAY_NOON)
+    assert store._open[(GUILD, "occ", "20261005")].shape == (32, vc_analytics.SLOTS_PER_DAY)
+
+    store.record_occupancy(GUILD, {100 + i: 1 for i in range(40)}, MONDAY_NOON)
+    array = store._open[(GUILD, "occ", "20261005")]
+    assert array.shape[0] == 64
+    slot = vc_analytics._slot(MONDAY_NOON)
+    assert array[0, slot] == 3          # 最大値を残す
+    assert array[39, slot] == 1
+    assert store.stats()["grown"] == 2
+    assert not any(name.endswith(".tmp") for name in os.listdir(os.path.dirname(array.filename)))
+
+
+def test_existing_day_file_is_reopened_after_a_restart(store):
+    store.record_occupancy(GUILD, {100: 2}, MONDAY_NOON)
+    store.add_seconds(GUILD, {7: 60.4}, MONDAY_NOON)
+    store.flush(MONDAY_NOON)
+
+    restarted = VoiceOccupancyStore(root=store.root, retention_days=30)
+    restarted.record_occupancy(GUILD, {100: 1, 200: 4}, MONDAY_NOON + 300)
+    restarted.add_seconds(GUILD, {7: 60}, MONDAY_NOON)
+    slot = vc_analytics._slot(MONDAY_NOON)
+    occ = _occ(restarted, MONDAY_NOON)
+    assert (occ[0, slot], occ[0, slot + 1], occ[1, slot + 1]) == (2, 1, 4)
+    assert restarted.member_totals(GUILD, days=1, at=MONDAY_NOON) == [(7, 120)]
+
+
+def test_a_new_day_gets_rows_for_every_known_channel(store):
+    store.record_occupancy(GUILD, {100 + i: 1 for i in range(40)}, MONDAY_NOON)
+    store.flush(MONDAY_NOON + DAY)   # 日付が変わったので昨日の配列は閉じる
+    assert (GUILD, "occ", "20261005") not in store._open
+
+    store.record_occupancy(GUILD, {100: 5}, MONDAY_NOON + DAY)
+    assert _occ(store, MONDAY_NOON + DAY).shape[0] >= 40
+
+
+# ---------- 集計 ----------
+def test_reports_span_days_with_different_row_counts(store):
+    store.record_occupancy(GUILD, {100: 3}, MONDAY_NOON)
+    store.add_seconds(GUILD, {7: 600}, MONDAY_NOON)
+    tuesday = MONDAY_NOON + DAY
+    store.record_occupancy(GUILD, {100 + i: 1 for i in range(40)} | {139: 6}, tuesday)
+    store.add_seconds(GUILD, {7: 60} | {1000 + i: 1 for i in range(40)} | {1039: 900}, tuesday)
+    store.flush(tuesday)
+
+    grid = store.heatmap(GUILD, days=2, at=tuesday)
+    assert grid[0, 12] == pytest.approx(3 / 12)             # 月曜 12時台の平均
+    assert grid[1, 12] == pytest.approx((39 + 6) / 12)
+    # 後から増えた行のチャンネルは、その行が無い日を飛ばす
+    assert store.heatmap(GUILD, days=2, channel_id=139, at=tuesday)[0].sum() == 0
+
+    peaks = store.peaks(GUILD, days=2, top=1, at=tuesday)
+    assert peaks["server"] == (45, ("20261006", vc_analytics._slot(tuesday)))
+    assert peaks["channels"] == [(139, 6, ("20261006", vc_analytics._slot(tuesday)))]
+
+    assert store.member_totals(GUILD, days=2, top=2, at=tuesday) == [(1039, 900), (7, 660)]
+
+
+def test_prune_removes_days_past_retention(store):
+    store.record_occupancy(GUILD, {100: 1}, MONDAY_NOON - 40 * DAY)
+    store.record_occupancy(GUILD, {100: 1}, MONDAY_NOON)
+    store.flush(MONDAY_NOON)
+    store.prune(MONDAY_NOON)
+    files = sorted(n for n in os.listdir(os.path.join(store.root, str(GUILD))) if n.endswith(".npy"))
+    assert files == ["occ_20261005.npy"]
+    assert store.stats()["pruned_files"] == 1
+
+
+# ---------- 対象サーバー ----------
+def test_sample_only_records_paired_a_guilds(store):
+    def guild(guild_id):
+        humans = [SimpleNamespace(id=guild_id * 10, bot=False)]
+        return SimpleNamespace(id=guild_id, voice_channels=[SimpleNamespace(id=guild_id * 100, members=humans)])
+
+    cog = SimpleNamespace(
+        bot=SimpleNamespace(guilds=[guild(GUILD), guild(2)]),
+        config_manager=SimpleNamespace(get_pair_by_a={GUILD: {"A_ID": GUILD}}.get),
+        store=store,
+        _credited={},
+    )
+    VcAnalyticsCog.sample(cog, MONDAY_NOON)
+    assert store.stats()["guilds"] == 1
+    assert set(cog._credited) == {(GUILD, 10)}
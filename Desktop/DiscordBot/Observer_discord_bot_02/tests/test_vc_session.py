@@ -0,0 +1,80 @@
+# tests/test_vc_session.py
+from types import SimpleNamespace
+from cogs.voice_chat.vc_session import VoiceSessionTracker, format_duration
+
+
+def _channel(channel_id=1, name="talk", members=()):
+    return SimpleNamespace(id=channel_id, name=name, members=list(members))
+
+
+def _member(member_id, name=None, bot=False):
+    return SimpleNamespace(id=member_id, display_name=name or f"user{member_id}", bot=bot)
+
+
+def test_format_duration():
+    assert format_duration(5) == "5秒"
+    assert format_duration(65) == "1分05秒"
+    assert format_duration(3 * 3600 + 120) == "3時間02分"
+
+
+def test_only_the_first_join_and_last_leave_are_reported():
+    tracker = VoiceSessionTracker()
+    channel = _channel()
+    started = tracker.join(9, channel, 1, "alice", at=0)
+    assert tracker.join(9, channel, 2, "bob", at=10) is None
+    assert tracker.leave(1, 1, at=40) is None
+    ended = tracker.leave(1, 2, at=100)
+
+    assert ended is started
+    assert ended.duration() == 100
+    assert ended.peak == 2
+    assert ended.top_members() == [("bob", 90), ("alice", 40)]
+    assert tracker.session(1) is None
+    assert tracker.stats()["started"] == tracker.stats()["ended"] == 1
+
+
+def test_rejoining_adds_up_time():
+    tracker = VoiceSessionTracker()
+    channel = _channel()
+    tracker.join(9, channel, 1, "alice", at=0)
+    tracker.join(9, channel, 2, "bob", at=0)
+    tracker.leave(1, 2, at=10)
+    tracker.join(9, channel, 2, "bob", at=20)
+    assert tracker.session(1).member_seconds(at=30) == {1: 30, 2: 20}
+
+
+def test_leave_for_unknown_members_is_ignored():
+    tracker = VoiceSessionTracker()
+    assert tracker.leave(1, 1, at=0) is None
+    tracker.join(9, _channel(), 1, "alice", at=0)
+    assert tracker.leave(1, 2, at=5) is None
+    assert tracker.session(1) is not None
+
+
+def test_reconcile_fills_in_missed_events():
+    tracker = VoiceSessionTracker()
+    talk, empty = _channel(1, "talk"), _channel(2, "empty")
+    tracker.join(9, talk, 1, "alice", at=0)
+    tracker.join(9, empty, 3, "carol", at=0)
+
+    # 切断中に alice が抜けて bob が入り、empty からは全員出た。ボットは数えない
+    talk.members = [_member(2, "bob"), _member(99, bot=True)]
+    guild = SimpleNamespace(id=9, voice_channels=[talk, empty])
+    started, ended = tracker.reconcile(guild, at=50)
+
+    assert started == []
+    assert [s.channel_id for s in ended] == [2]
+    session = tracker.session(1)
+    assert set(session.present) == {2}
+    assert session.member_seconds(at=60) == {1: 50, 2: 10}
+
+
+def test_reconcile_starts_calls_already_in_progress():
+    tracker = VoiceSessionTracker()
+    guild = SimpleNamespace(id=9, voice_channels=[_channel(1, "talk", [_member(1), _member(2)])])
+    started, ended = tracker.reconcile(guild, at=100)
+    assert len(started) == 1 and ended == []
+    assert started[0].reconciled
+    assert started[0].peak == 2
+    # もう一度突き合わせても変わらない
+    assert tracker.reconcile(guild, at=110) == ([], [])
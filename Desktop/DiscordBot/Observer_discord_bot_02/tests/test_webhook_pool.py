@@ -0,0 +1,65 @@
+# tests/test_webhook_pool.py
+import asyncio
+from types import SimpleNamespace
+import discord
+from utils.webhook_pool import WebhookPool
+
+
+def _not_found():
+    return discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Webhook")
+
+
+class FakeWebhook:
+    def __init__(self, fail_first: bool):
+        self.fail_first = fail_first
+        self.sent = []
+
+    async def send(self, wait=False, files=None, **kwargs):
+        try:
+            if self.fail_first:
+                self.fail_first = False
+                raise _not_found()
+            self.sent.append([f.fp.read() for f in files or ()])
+            return "message"
+        finally:
+            # discord.py と同じく、成否にかかわらず添付を閉じる
+            for file in files or ():
+                file.close()
+
+
+class FakeChannel:
+    def __init__(self, *webhooks):
+        self.id = 1
+        self.guild = SimpleNamespace(me=None)
+        self._created = list(webhooks)
+
+    def permissions_for(self, member):
+        return SimpleNamespace(manage_webhooks=True)
+
+    async def webhooks(self):
+        return []
+
+    async def create_webhook(self, name, reason=None):
+        return self._created.pop(0)
+
+
+def test_deleted_webhook_is_recreated_with_fresh_files(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"data")
+    deleted, replacement = FakeWebhook(fail_first=True), FakeWebhook(fail_first=False)
+    built = []
+
+    async def make_files():
+        built.append(discord.File(str(path)))
+        return [built[-1]]
+
+    async def scenario():
+        pool = WebhookPool(SimpleNamespace(user=SimpleNamespace(id=9)))
+        sent = await pool.send(FakeChannel(deleted, replacement), make_files=make_files, content="hi")
+        return pool, sent
+
+    pool, sent = asyncio.run(scenario())
+    assert sent == "message"
+    assert replacement.sent == [[b"data"]]
+    assert len(built) == 2
+    assert pool.stats()["recovered"] == 1
@@ -0,0 +1,237 @@
+# utils/attachment_archive.py
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+import aiohttp
+
+# 環境変数で有効化する（既定は無効。ディスクを使うので必要なサーバーだけ）
+ARCHIVE_ENABLED = os.getenv("ATTACHMENT_ARCHIVE", "0") == "1"
+ARCHIVE_DIR = os.path.join("data", "attachment_archive")
+ARCHIVE_INDEX_PATH = os.path.join("data", "attachment_archive.sqlite3")
+DISK_CAP_BYTES = int(os.getenv("ATTACHMENT_ARCHIVE_MB", 1024)) * 1024 * 1024
+DOWNLOAD_CONCURRENCY = 3      # 同時ダウンロード数
+MAX_PENDING = 200             # 待ち行列がこれを超えたら新しい添付は諦める
+CHUNK_SIZE = 64 * 1024
+WAIT_ON_DELETE_SECONDS = 10   # 投稿直後に削除されたとき、取得中の分を待つ時間
+
+# content_type の接頭辞ごとの上限（当てはまらないものは None の値）
+SIZE_LIMITS = {
+    "image/": 10 * 1024 * 1024,
+    "video/": 25 * 1024 * 1024,
+    "audio/": 10 * 1024 * 1024,
+    None: 5 * 1024 * 1024,
+}
+
+
+def size_limit(content_type: str) -> int:
+    for prefix, limit in SIZE_LIMITS.items():
+        if prefix and content_type and content_type.startswith(prefix):
+            return limit
+    return SIZE_LIMITS[None]
+
+
+class _TooLarge(Exception):
+    pass
+
+
+class AttachmentArchive:
+    """監視チャンネルの添付ファイルを内容のハッシュ名で保存する
+
+    Discord の CDN URL はメッセージが消えるとすぐ使えなくなるため、投稿時に取得しておき、
+    削除ログでは保存したファイルを再アップロードする。ファイルは
+    data/attachment_archive/<sha256 の先頭2文字>/<sha256> に置き、同じ内容は1つだけ持つ。
+    合計が DISK_CAP_BYTES を超えたら、最後に使った時刻が古いものから消す。
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, index_path: str = ARCHIVE_INDEX_PATH, cap: int = DISK_CAP_BYTES):
+        self.root = root
+        self.cap = cap
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(index_path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " sha256 TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            " message_id INTEGER NOT NULL,"
+            " url TEXT NOT NULL,"
+            " filename TEXT NOT NULL,"
+            " content_type TEXT,"
+            " sha256 TEXT NOT NULL,"
+            " PRIMARY KEY (message_id, url))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS refs_sha256 ON refs (sha256)")
+        self._db.commit()
+        self.bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        self._session = None
+        self._semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+        self._pending = {}   # message_id → {asyncio.Task}
+
+        # 統計
+        self.archived = 0
+        self.hash_dedup = 0
+        self.skipped_size = 0
+        self.skipped_busy = 0
+        self.failed = 0
+        self.evicted = 0
+        self.restored = 0
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    # ---------- 保存 ----------
+    def submit(self, message):
+        """message の添付の取得を予約する（待たない）"""
+        for att in message.attachments:
+            if att.size > size_limit(att.content_type):
+                self.skipped_size += 1
+                continue
+            if sum(len(tasks) for tasks in self._pending.values()) >= MAX_PENDING:
+                self.skipped_busy += 1
+                continue
+            task = asyncio.create_task(self._archive(message.id, att))
+            tasks = self._pending.setdefault(message.id, set())
+            tasks.add(task)
+            task.add_done_callback(lambda t, mid=message.id: self._done(mid, t))
+
+    def _done(self, message_id: int, task: asyncio.Task):
+        tasks = self._pending.get(message_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._pending[message_id]
+        if not task.cancelled() and task.exception() and not isinstance(task.exception(), _TooLarge):
+            self.failed += 1
+            print(f"[WARN] 添付の保存失敗: {task.exception()}")
+
+    async def _archive(self, message_id: int, att):
+        async with self._semaphore:
+            sha256, size = await self._download(att.url, size_limit(att.content_type))
+        now = time.time()
+        known = self._db.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if known:
+            self._db.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (now, sha256))
+        else:
+            self._db.execute("INSERT INTO blobs VALUES (?, ?, ?)", (sha256, size, now))
+            self.bytes += size
+        self._db.execute(
+            "INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?)",
+            (message_id, att.url, att.filename, att.content_type, sha256),
+        )
+        self._db.commit()
+        self.archived += 1
+        self._evict()
+
+    async def _download(self, url: str, limit: int) -> tuple:
+        """一時ファイルへ書きながらハッシュを取り、ハッシュ名のパスへ移す → (sha256, size)"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async with self._session.get(url) as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > limit:
+                            # 申告サイズより大きかった場合
+                            self.skipped_size += 1
+                            raise _TooLarge(url)
+                        f.write(chunk)
+                        digest.update(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        sha256 = digest.hexdigest()
+        path = self.path_for(sha256)
+        if os.path.exists(path):
+            # 同じ内容がすでにある → 書いた方は捨てる
+            os.remove(tmp)
+            self.hash_dedup += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        return sha256, size
+
+    def _evict(self):
+        while self.bytes > self.cap:
+            victims = self._db.execute("SELECT sha256, size FROM blobs ORDER BY last_used LIMIT 50").fetchall()
+            if not victims:
+                self.bytes = 0
+                return
+            shas = []
+            for sha256, size in victims:
+                if self.bytes <= self.cap:
+                    break
+                try:
+                    os.remove(self.path_for(sha256))
+                except OSError:
+                    pass
+                self.bytes -= size
+                self.evicted += 1
+                shas.append(sha256)
+            placeholders = ",".join("?" * len(shas))
+            self._db.execute(f"DELETE FROM blobs WHERE sha256 IN ({placeholders})", shas)
+            self._db.execute(f"DELETE FROM refs WHERE sha256 IN ({placeholders})", shas)
+            self._db.commit()
+
+    # ---------- 取り出し（削除時） ----------
+    async def restore(self, message_id: int) -> dict:
+        """{url: (path, filename, content_type, size)} を返す。取得中の分は少し待つ"""
+        tasks = self._pending.get(message_id)
+        if tasks:
+            await asyncio.wait(set(tasks), timeout=WAIT_ON_DELETE_SECONDS)
+        rows = self._db.execute(
+            "SELECT r.url, r.filename, r.content_type, r.sha256, b.size FROM refs r"
+            " JOIN blobs b ON b.sha256 = r.sha256 WHERE r.message_id = ?",
+            (message_id,),
+        ).fetchall()
+        found = {}
+        for url, filename, content_type, sha256, size in rows:
+            path = self.path_for(sha256)
+            if os.path.exists(path):
+                found[url] = (path, filename, content_type, size)
+        if rows:
+            # 削除ログに出したら参照は不要（中身は同じ内容の再投稿に備えて LRU に任せる）
+            self._db.executemany("UPDATE blobs SET last_used = ? WHERE sha256 = ?", [(time.time(), r[3]) for r in rows])
+            self._db.execute("DELETE FROM refs WHERE message_id = ?", (message_id,))
+            self._db.commit()
+        self.restored += len(found)
+        return found
+
+    async def close(self):
+        for tasks in list(self._pending.values()):
+            for task in tasks:
+                task.cancel()
+        self._pending.clear()
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._db.close()
+
+    def stats(self) -> dict:
+        blobs = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        return {
+            "blobs": blobs,
+            "bytes": self.bytes,
+            "cap": self.cap,
+            "pending": sum(len(tasks) for tasks in self._pending.values()),
+            "archived": self.archived,
+            "hash_dedup": self.hash_dedup,
+            "skipped_size": self.skipped_size,
+            "skipped_busy": self.skipped_busy,
+            "failed": self.failed,
+            "evicted": self.evicted,
+            "restored": self.restored,
+        }
@@ -0,0 +1,179 @@
+# utils/attachment_relay.py
+import asyncio
+import hashlib
+import os
+import resource
+import tempfile
+import time
+import aiohttp
+import discord
+
+CACHE_DIR = os.path.join("data", "attachment_cache")
+BYTE_BUDGET = 64 * 1024 * 1024   # 全体で同時にダウンロードしてよいバイト数
+PER_RELAY_CONCURRENCY = 2        # 1メッセージの添付を同時に取得する数
+CACHE_TTL_SECONDS = 120          # 同じ添付の再投稿・複数転送先への再利用を待つ時間
+CHUNK_SIZE = 64 * 1024
+
+
+class ByteBudget:
+    """バイト数で数えるセマフォ（上限より大きいものは上限ぶんとして数える）"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, size: int) -> int:
+        size = max(1, min(size, self.limit))
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_use + size <= self.limit)
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+        return size
+
+    async def release(self, size: int):
+        async with self._cond:
+            self.in_use -= size
+            self._cond.notify_all()
+
+
+class CachedAttachment:
+    __slots__ = ("path", "sha256", "size", "expires_at")
+
+    def __init__(self, path: str, sha256: str, size: int):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.expires_at = time.monotonic() + CACHE_TTL_SECONDS
+
+
+class AttachmentRelay:
+    """添付ファイルをメモリに溜めずにディスク経由で転送する
+
+    att.to_file() は添付全体をメモリに読み込むため、動画が続くと RSS が跳ね上がる。
+    ここでは CHUNK_SIZE ずつ一時ファイルへ書き出し、discord.File にはパスを渡す。
+    同じ添付（ID）を複数の転送先に送るときは1回だけ取得し、内容が同じもの（SHA-256）は
+    ディスク上でも1つにまとめる。
+    """
+
+    def __init__(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self._session = None
+        self.budget = ByteBudget(BYTE_BUDGET)
+        self._by_id = {}      # attachment id → CachedAttachment
+        self._by_hash = {}    # sha256 → CachedAttachment
+        self._inflight = {}   # attachment id → asyncio.Task
+
+        # 統計
+        self.downloads = 0
+        self.bytes_downloaded = 0
+        self.cache_hits = 0
+        self.hash_dedup = 0
+        self.too_large = 0
+
+    async def to_files(self, attachments, dest_guild: discord.Guild = None):
+        """(discord.File のリスト, 転送先の上限を超えたため URL で送る添付のリスト) を返す"""
+        limit = dest_guild.filesize_limit if dest_guild else None
+        semaphore = asyncio.Semaphore(PER_RELAY_CONCURRENCY)
+        oversized = [att for att in attachments if limit and att.size > limit]
+        oversized_ids = {att.id for att in oversized}
+        self.too_large += len(oversized)
+
+        async def one(att):
+            async with semaphore:
+                entry = await self.fetch(att)
+            return discord.File(entry.path, filename=att.filename, spoiler=att.is_spoiler())
+
+        files = await asyncio.gather(*(one(att) for att in attachments if att.id not in oversized_ids))
+        return list(files), oversized
+
+    async def fetch(self, att: discord.Attachment) -> CachedAttachment:
+        self._purge()
+        entry = self._by_id.get(att.id)
+        if entry:
+            self.cache_hits += 1
+            entry.expires_at = time.monotonic() + CACHE_TTL_SECONDS
+            return entry
+        task = self._inflight.get(att.id)
+        if task is None:
+            task = asyncio.ensure_future(self._download(att))
+            self._inflight[att.id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(att.id, None))
+        else:
+            self.cache_hits += 1
+        return await asyncio.shield(task)
+
+    async def _download(self, att: discord.Attachment) -> CachedAttachment:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        reserved = await self.budget.acquire(att.size)
+        digest = hashlib.sha256()
+        size = 0
+        fd, path = tempfile.mkstemp(dir=CACHE_DIR)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async with self._session.get(att.url) as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        finally:
+            await self.budget.release(reserved)
+
+        self.downloads += 1
+        self.bytes_downloaded += size
+        sha256 = digest.hexdigest()
+        entry = self._by_hash.get(sha256)
+        if entry:
+            # 同じ内容がすでにある → 新しく書いた方は捨てる
+            os.remove(path)
+            self.hash_dedup += 1
+            entry.expires_at = time.monotonic() + CACHE_TTL_SECONDS
+        else:
+            entry = CachedAttachment(path, sha256, size)
+            self._by_hash[sha256] = entry
+        self._by_id[att.id] = entry
+        return entry
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [h for h, e in self._by_hash.items() if e.expires_at < now]
+        for sha256 in expired:
+            entry = self._by_hash.pop(sha256)
+            try:
+                # 送信中の discord.File は開いたままなので削除しても読める
+                os.remove(entry.path)
+            except OSError:
+                pass
+        if expired:
+            self._by_id = {i: e for i, e in self._by_id.items() if e.sha256 in self._by_hash}
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        for entry in self._by_hash.values():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        self._by_hash.clear()
+        self._by_id.clear()
+
+    def stats(self) -> dict:
+        return {
+            "bytes_in_flight": self.budget.in_use,
+            "peak_bytes_in_flight": self.budget.peak,
+            "downloads": self.downloads,
+            "bytes_downloaded": self.bytes_downloaded,
+            "cache_hits": self.cache_hits,
+            "hash_dedup": self.hash_dedup,
+            "cached_files": len(self._by_hash),
+            "too_large": self.too_large,
+            # Linux では KiB 単位
+            "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
@@ -0,0 +1,133 @@
+# utils/audit_batcher.py
+import asyncio
+import discord
+
+BURST_WINDOW_SECONDS = 3.0
+EMBEDS_PER_MESSAGE = 10        # Discord の上限
+CHARS_PER_MESSAGE = 6000       # 1メッセージ内の Embed 合計文字数の上限
+DESCRIPTION_CHARS = 1400        # 1メッセージに複数の Embed が収まる大きさ
+
+
+class _Window:
+    __slots__ = ("channel", "title", "color", "items", "task")
+
+    def __init__(self, channel, title: str, color: int):
+        self.channel = channel
+        self.title = title
+        self.color = color
+        self.items = []   # [(embed, 要約行), ...]
+        self.task = None
+
+
+def pack_embeds(embeds: list) -> list:
+    """Embed を 10個・合計 6000 文字以内のメッセージ単位に分ける"""
+    messages = []
+    current = []
+    chars = 0
+    for embed in embeds:
+        size = len(embed)
+        if current and (len(current) >= EMBEDS_PER_MESSAGE or chars + size > CHARS_PER_MESSAGE):
+            messages.append(current)
+            current = []
+            chars = 0
+        current.append(embed)
+        chars += size
+    if current:
+        messages.append(current)
+    return messages
+
+
+class AuditBurstBatcher:
+    """(サーバー, イベント種別) ごとに監査ログの連発をまとめる
+
+    窓が開いていないときのイベントはすぐ送り、BURST_WINDOW_SECONDS の窓を開く。
+    窓の間に来た同じ種別のイベントは溜めておき、窓が閉じたときに
+    「タイトル ×件数」の要約 Embed（対象を1行ずつ列挙）にして送る。
+    溜まっていれば窓を開き直すので、襲撃が続く間は窓ごとに要約が1通ずつ出る。
+    """
+
+    def __init__(self, send, window: float = BURST_WINDOW_SECONDS):
+        self._send = send         # send(channel, embeds) → 送信キューへ積む
+        self.window = window
+        self._windows = {}        # (guild_id, 種別) → _Window
+
+        # 統計
+        self.immediate = 0
+        self.coalesced = 0
+        self.summaries = 0
+        self.messages = 0
+
+    def submit(self, channel, guild_id: int, kind: str, embed: discord.Embed, line: str):
+        key = (guild_id, kind)
+        state = self._windows.get(key)
+        if state is not None:
+            state.items.append((embed, line))
+            self.coalesced += 1
+            return
+        self.immediate += 1
+        self._emit(channel, [embed])
+        state = self._windows[key] = _Window(channel, embed.title, embed.color)
+        state.task = asyncio.create_task(self._close_later(key, state))
+
+    async def _close_later(self, key, state: _Window):
+        while True:
+            await asyncio.sleep(self.window)
+            items, state.items = state.items, []
+            if not items:
+                if self._windows.get(key) is state:
+                    del self._windows[key]
+                return
+            if len(items) == 1:
+                self._emit(state.channel, [items[0][0]])
+            else:
+                self.summaries += 1
+                self._emit(state.channel, self._summary(state, [line for _, line in items]))
+
+    def _summary(self, state: _Window, lines: list) -> list:
+        chunks = []
+        current = []
+        length = 0
+        for line in lines:
+            line = line[:200]
+            if current and length + len(line) + 1 > DESCRIPTION_CHARS:
+                chunks.append(current)
+                current = []
+                length = 0
+            current.append(line)
+            length += len(line) + 1
+        if current:
+            chunks.append(current)
+        title = f"{state.title} ×{len(lines)}（{self.window:.0f}秒間）"
+        embeds = []
+        for i, chunk in enumerate(chunks):
+            embed = discord.Embed(
+                title=title if i == 0 else f"{title} 続き {i + 1}/{len(chunks)}",
+                description="\n".join(chunk),
+                color=state.color,
+                timestamp=discord.utils.utcnow(),
+            )
+            embeds.append(embed)
+        return embeds
+
+    def _emit(self, channel, embeds: list):
+        for chunk in pack_embeds(embeds):
+            self.messages += 1
+            self._send(channel, chunk)
+
+    def close(self):
+        """停止時: 溜まっている分はその場で要約して送る"""
+        for state in self._windows.values():
+            if state.task and not state.task.done():
+                state.task.cancel()
+            if state.items:
+                self._emit(state.channel, self._summary(state, [line for _, line in state.items]))
+        self._windows.clear()
+
+    def stats(self) -> dict:
+        return {
+            "open_windows": len(self._windows),
+            "immediate": self.immediate,
+            "coalesced": self.coalesced,
+            "summaries": self.summaries,
+            "messages": self.messages,
+        }
@@ -0,0 +1,156 @@
+# utils/audit_store.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+AUDIT_STORE_PATH = os.path.join("data", "audit_events.sqlite3")
+RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", 90))
+FLUSH_INTERVAL_SECONDS = 2.0
+FLUSH_MAX_ROWS = 200          # これだけ溜まったら待たずに書く
+PRUNE_INTERVAL_SECONDS = 24 * 3600
+PRUNE_BATCH = 5000            # 1回の DELETE で消す行数（長時間ロックしない）
+
+
+class AuditStore:
+    """監査イベントの追記専用ストア（SQLite）
+
+    record() はイベントを溜めるだけで、書き込みは FLUSH_INTERVAL_SECONDS ごとに
+    まとめてスレッドで行う。検索は (guild_id, user_id, at) などの複合インデックスと
+    (at, id) のキーセットページングを使うので、行数が増えてもページ送りの速さは変わらない。
+    """
+
+    def __init__(self, path: str = AUDIT_STORE_PATH, retention_days: int = RETENTION_DAYS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.retention_seconds = retention_days * 24 * 3600
+        # 書き込み・検索ともスレッドから行うので、接続は1つをロックで守る
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id INTEGER PRIMARY KEY,"
+            " guild_id INTEGER NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " user_id INTEGER,"
+            " channel_id INTEGER,"
+            " at REAL NOT NULL,"
+            " summary TEXT NOT NULL,"
+            " detail TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_guild_at ON events (guild_id, at, id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_guild_user_at ON events (guild_id, user_id, at, id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_guild_kind_at ON events (guild_id, kind, at, id)")
+        self._db.commit()
+        self._pending = []
+        self._task = None
+        self._flush_now = None
+        self._last_prune = 0.0
+
+        # 統計
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.pruned = 0
+
+    # ---------- 記録 ----------
+    def record(self, guild_id: int, kind: str, summary: str, user_id: int = None, channel_id: int = None, detail: dict = None):
+        self._pending.append((
+            guild_id, kind, user_id, channel_id, time.time(), summary,
+            json.dumps(detail, ensure_ascii=False, default=str) if detail else None,
+        ))
+        self.recorded += 1
+        if len(self._pending) >= FLUSH_MAX_ROWS:
+            self._flush_now = asyncio.create_task(self.flush())
+        elif self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        await self.flush()
+
+    async def flush(self):
+        rows, self._pending = self._pending, []
+        if rows:
+            await asyncio.to_thread(self._insert, rows)
+        if time.time() - self._last_prune > PRUNE_INTERVAL_SECONDS:
+            self._last_prune = time.time()
+            await asyncio.to_thread(self.prune)
+
+    def _insert(self, rows: list):
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT INTO events (guild_id, kind, user_id, channel_id, at, summary, detail) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+        self.written += len(rows)
+        self.batches += 1
+
+    def prune(self):
+        """保持期間を過ぎた行を少しずつ消す"""
+        cutoff = time.time() - self.retention_seconds
+        while True:
+            with self._db_lock:
+                cur = self._db.execute(
+                    "DELETE FROM events WHERE id IN (SELECT id FROM events WHERE at < ? LIMIT ?)",
+                    (cutoff, PRUNE_BATCH),
+                )
+                self._db.commit()
+            self.pruned += cur.rowcount
+            if cur.rowcount < PRUNE_BATCH:
+                return
+
+    # ---------- 検索 ----------
+    async def query(self, guild_id: int, user_id: int = None, kind: str = None, since: float = None,
+                    until: float = None, cursor: tuple = None, limit: int = 10) -> list:
+        """新しい順に limit 件。cursor には前のページ最後の (at, id) を渡す"""
+        sql = ["SELECT id, kind, user_id, channel_id, at, summary FROM events WHERE guild_id = ?"]
+        args = [guild_id]
+        if user_id is not None:
+            sql.append("AND user_id = ?")
+            args.append(user_id)
+        if kind:
+            sql.append("AND kind = ?")
+            args.append(kind)
+        if since is not None:
+            sql.append("AND at >= ?")
+            args.append(since)
+        if until is not None:
+            sql.append("AND at < ?")
+            args.append(until)
+        if cursor:
+            sql.append("AND (at, id) < (?, ?)")
+            args.extend(cursor)
+        sql.append("ORDER BY at DESC, id DESC LIMIT ?")
+        args.append(limit)
+
+        def run():
+            with self._db_lock:
+                return self._db.execute(" ".join(sql), args).fetchall()
+
+        return await asyncio.to_thread(run)
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        await self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def stats(self) -> dict:
+        with self._db_lock:
+            last_id = self._db.execute("SELECT MAX(id) FROM events").fetchone()[0] or 0
+        return {
+            "last_id": last_id,
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "written": self.written,
+            "batches": self.batches,
+            "pruned": self.pruned,
+            "retention_days": self.retention_seconds // 86400,
+        }
@@ -0,0 +1,141 @@
+# utils/debug_sink.py
+import asyncio
+import time
+from collections import deque
+
+FLUSH_INTERVAL_SECONDS = 5
+MAX_MESSAGE_CHARS = 2000
+MAX_MESSAGES_PER_FLUSH = 2   # 1チャンネルあたり、1回の flush で送る最大メッセージ数
+QUEUE_LIMIT = 400            # 1チャンネルあたりの送信待ち行数
+SAMPLE_START = QUEUE_LIMIT // 2
+SAMPLE_EVERY = 10            # 混雑時、DEBUG 行はこの件数に1件だけ残す
+RING_SIZE = 1000             # 送信の有無に関わらず手元に残す直近の行数
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
+
+class DebugSink:
+    """全 Cog 共通のデバッグ出力先
+
+    log() は行を溜めるだけで即座には送らない。FLUSH_INTERVAL_SECONDS ごとに
+    チャンネル単位で 2000 文字以内のメッセージへ詰めて送り、1回に送る数も制限するので、
+    デバッグ出力が転送本体の API 枠を食うことはない。
+    送信待ちが混雑したときは DEBUG 行を間引き、上限に達したら INFO 以下を捨てる。
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._queues = {}  # channel_id → deque[str]
+        self._task = None
+        self._sample_counter = 0
+        self.ring = deque(maxlen=RING_SIZE)
+
+        # 統計
+        self.logged_lines = 0
+        self.sent_lines = 0
+        self.sent_messages = 0
+        self.sampled_out = 0
+        self.dropped = 0
+
+    def log(self, message: str, level: str = "DEBUG", channel_id: int = None):
+        """channel_id 省略時は設定済みの最初の DEBUG_CHANNEL に送る"""
+        line = f"[{level}] {message}"
+        self.logged_lines += 1
+        self.ring.append(f"{time.strftime('%H:%M:%S')} {line}")
+
+        if channel_id is None:
+            channel_id = self._default_channel_id()
+        if channel_id is None:
+            print(line)
+            return
+
+        queue = self._queues.setdefault(channel_id, deque())
+        rank = LEVELS.get(level, LEVELS["DEBUG"])
+        if len(queue) >= QUEUE_LIMIT:
+            if rank <= LEVELS["INFO"]:
+                self.dropped += 1
+                return
+            queue.popleft()  # WARN 以上は古い行を押し出してでも残す
+            self.dropped += 1
+        elif len(queue) >= SAMPLE_START and rank <= LEVELS["DEBUG"]:
+            self._sample_counter += 1
+            if self._sample_counter % SAMPLE_EVERY:
+                self.sampled_out += 1
+                return
+        queue.append(line)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _default_channel_id(self):
+        config_manager = getattr(self.bot, "config_manager", None)
+        if not config_manager:
+            return None
+        for pair in config_manager.config.get("server_pairs", []):
+            if pair.get("DEBUG_CHANNEL"):
+                return pair["DEBUG_CHANNEL"]
+        return None
+
+    async def _run(self):
+        while any(self._queues.values()):
+            await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    async def flush(self):
+        for channel_id, queue in list(self._queues.items()):
+            if not queue:
+                continue
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                # 送信先が見えない間は標準出力へ
+                while queue:
+                    print(f"{queue.popleft()} (チャンネル未取得: {channel_id})")
+                continue
+            for _ in range(MAX_MESSAGES_PER_FLUSH):
+                text = self._pack(queue)
+                if not text:
+                    break
+                try:
+                    await channel.send(text)
+                    self.sent_messages += 1
+                except Exception as e:
+                    print(f"[DEBUG送信失敗] ({e})\n{text}")
+                    break
+
+    def _pack(self, queue: deque) -> str:
+        """キューの先頭から 2000 文字に収まるだけ行を取り出す"""
+        lines = []
+        length = 0
+        while queue:
+            line = queue[0]
+            if len(line) > MAX_MESSAGE_CHARS:
+                line = line[:MAX_MESSAGE_CHARS - 1] + "…"
+            added = len(line) + (1 if lines else 0)
+            if lines and length + added > MAX_MESSAGE_CHARS:
+                break
+            queue.popleft()
+            lines.append(line)
+            length += added
+        self.sent_lines += len(lines)
+        return "\n".join(lines)
+
+    def tail(self, count: int = 20) -> list:
+        return list(self.ring)[-count:]
+
+    def close(self):
+        """停止時: 送れなかった行は標準出力に残す"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        for queue in self._queues.values():
+            while queue:
+                print(queue.popleft())
+
+    def stats(self) -> dict:
+        return {
+            "logged": self.logged_lines,
+            "sent_lines": self.sent_lines,
+            "sent_messages": self.sent_messages,
+            "queued": sum(len(q) for q in self._queues.values()),
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,116 @@
+# utils/dedup.py
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from config_persister import write_snapshot, read_checked_json
+
+DEDUP_TAIL_PATH = os.path.join("data", "dedup_tail.json")
+WINDOW_SECONDS = 6 * 3600   # この時間より前に処理したキーは忘れる
+CAPACITY = 50_000           # 覚えておくキーの最大数（メモリはこれで頭打ち）
+TAIL_SIZE = 5_000           # 再起動をまたいで残す直近のキー数
+SAVE_DELAY_SECONDS = 10.0
+
+
+class DedupFilter:
+    """処理済みキーの時間窓付きリング（転送・監査ログの二重送信防止）
+
+    キーは "relay:<メッセージID>" のように用途ごとの接頭辞を付けた文字列。
+    再接続・RESUME で同じイベントが再送されたり、追いつき処理とライブ受信が
+    同じメッセージを拾ったりしても、2回目以降は seen() が True を返す。
+    直近 TAIL_SIZE 件は data/ に書き出すので、再起動直後の追いつきでも効く。
+    """
+
+    def __init__(self, path: str = DEDUP_TAIL_PATH, capacity: int = CAPACITY, window: float = WINDOW_SECONDS):
+        self.path = path
+        self.capacity = capacity
+        self.window = window
+        self._ring = deque()   # (キー, 時刻) を古い順に
+        self._keys = set()
+        self._task = None
+
+        # 統計
+        self.checked = 0
+        self.suppressed = {}   # 接頭辞 → 抑止した件数
+        self.expired = 0
+
+        data = read_checked_json(path)
+        if isinstance(data, list):
+            cutoff = time.time() - window
+            for key, at in data:
+                if at >= cutoff and key not in self._keys:
+                    self._ring.append((key, at))
+                    self._keys.add(key)
+
+    def seen(self, key: str) -> bool:
+        """key を処理済みにする。すでに処理済みなら True（呼び出し側は何もしない）"""
+        if self.contains(key):
+            return True
+        self.add(key)
+        return False
+
+    def contains(self, key: str) -> bool:
+        """処理済みかどうかだけを調べる（記録はしない）。送信が終わってから add() する用途向け"""
+        self.checked += 1
+        self._expire(time.time())
+        if key in self._keys:
+            prefix = key.split(":", 1)[0]
+            self.suppressed[prefix] = self.suppressed.get(prefix, 0) + 1
+            return True
+        return False
+
+    def add(self, key: str):
+        """key を処理済みとして記録する"""
+        if key in self._keys:
+            return
+        if len(self._ring) >= self.capacity:
+            old, _ = self._ring.popleft()
+            self._keys.discard(old)
+            self.expired += 1
+        self._ring.append((key, time.time()))
+        self._keys.add(key)
+        self._mark()
+
+    def forget(self, key: str):
+        """同じキーをもう一度通したいとき（BAN → 解除 → 再BAN など）"""
+        if key in self._keys:
+            self._keys.discard(key)
+            self._ring = deque(entry for entry in self._ring if entry[0] != key)
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._ring and self._ring[0][1] < cutoff:
+            old, _ = self._ring.popleft()
+            self._keys.discard(old)
+            self.expired += 1
+
+    def _mark(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(SAVE_DELAY_SECONDS)
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tail = list(self._ring)[-TAIL_SIZE:]
+        try:
+            write_snapshot(self.path, json.dumps(tail))
+        except OSError as e:
+            print(f"[WARN] 重複防止データの保存失敗: {e}")
+
+    def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self.save()
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "capacity": self.capacity,
+            "checked": self.checked,
+            "suppressed": dict(self.suppressed),
+            "expired": self.expired,
+        }
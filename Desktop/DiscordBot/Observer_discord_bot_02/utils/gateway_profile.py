@@ -0,0 +1,167 @@
+# utils/gateway_profile.py
+import asyncio
+import os
+import resource
+import discord
+
+# GATEWAY_PROFILE=full で以前と同じ（全部オン・既定のキャッシュ）に戻せる
+PROFILE_MODE = os.getenv("GATEWAY_PROFILE", "auto")
+MAX_MESSAGES = int(os.getenv("MAX_MESSAGES", 0)) or None   # 0 → discord.py のメッセージキャッシュを使わない
+
+# Cog ごとに必要なインテント（config が無ければ全部、あれば使っている機能の分だけ）
+#   always: Cog を読み込むだけで必要なもの
+#   if_pairs / if_audit: サーバーペア・監査ログチャンネルが設定されている場合だけ必要なもの
+COG_INTENTS = {
+    "cogs.transfer_cog": {
+        "always": {"guild_messages", "message_content"},
+        # メンション解決のための遅延チャンク・メンバー変化での解決キャッシュ破棄
+        "if_pairs": {"members"},
+    },
+    "cogs.audit_cog": {
+        "always": {"guild_messages", "message_content"},
+        "if_audit": {"members", "moderation", "invites"},
+    },
+    "cogs.voice_chat.vc_cog": {"always": {"voice_states"}},
+    "cogs.voice_chat.vc_highlight_cog": {"always": {"voice_states"}},
+    "cogs.voice_chat.vc_setting_cog": {"always": {"voice_states"}},
+    "cogs.voice_chat.vc_analytics": {"always": {"voice_states"}},
+    "cogs.logging_cog": {"always": {"guild_messages", "message_content"}},
+}
+# プレフィックスコマンドの受信に必要（DM でのコマンドも MessageRouter が受けるので dm_messages も）
+BASE_INTENTS = {"guilds", "guild_messages", "dm_messages", "message_content"}
+
+
+def _pairs(config: dict) -> list:
+    return (config or {}).get("server_pairs", [])
+
+
+def required_intents(config: dict, cogs: list) -> dict:
+    """{インテント名: 必要な理由} を返す。config が None（スナップショット無し）なら全部必要とみなす"""
+    reasons = {name: "コマンド" for name in BASE_INTENTS}
+    pairs = _pairs(config)
+    has_pairs = config is None or any(p.get("A_ID") and p.get("B_ID") for p in pairs)
+    has_audit = config is None or any(p.get("AUDIT_LOG_CHANNEL") for p in pairs)
+    for cog in cogs:
+        needs = COG_INTENTS.get(cog, {})
+        names = set(needs.get("always", ()))
+        if has_pairs:
+            names |= needs.get("if_pairs", set())
+        if has_audit:
+            names |= needs.get("if_audit", set())
+        for name in names:
+            reasons.setdefault(name, cog.rsplit(".", 1)[-1])
+    return reasons
+
+
+def chunk_targets(config: dict, cogs: list) -> set:
+    """メンバー一覧を遅延チャンクするギルド（転送先のメンション解決・監査ログのあるペア）"""
+    targets = set()
+    for pair in _pairs(config):
+        if "cogs.transfer_cog" in cogs and pair.get("B_ID"):
+            targets.add(pair["B_ID"])
+        if "cogs.audit_cog" in cogs and pair.get("AUDIT_LOG_CHANNEL"):
+            targets.update(g for g in (pair.get("A_ID"), pair.get("B_ID")) if g)
+    return targets
+
+
+class GatewayProfile:
+    """起動時に決めたインテント・キャッシュ設定と、ギルド単位の遅延チャンク
+
+    discord.py 既定の「全ギルドを起動時にチャンクして全メンバーを保持」をやめ、
+    読み込んだ Cog と config のサーバーペアから必要なインテントとキャッシュだけを有効にする。
+    メンバー一覧はメンション解決・監査ログで必要なギルドだけ、必要になった時点で
+    1ギルドずつチャンクする。インテントは接続時に固定されるので、後から増えた
+    要件は missing() で検出して再起動を促す。
+    """
+
+    def __init__(self, config: dict, cogs: list, mode: str = PROFILE_MODE, max_messages: int = MAX_MESSAGES):
+        self.cogs = list(cogs)
+        self.mode = mode
+        if mode == "full":
+            self.intents = discord.Intents.default()
+            for name in ("messages", "guilds", "members", "message_content", "voice_states"):
+                setattr(self.intents, name, True)
+            self.reasons = {"*": "GATEWAY_PROFILE=full"}
+            self.member_cache_flags = discord.MemberCacheFlags.from_intents(self.intents)
+            self.chunk_at_startup = True
+            self.max_messages = 1000
+        else:
+            self.reasons = required_intents(config, cogs)
+            self.intents = discord.Intents.none()
+            for name in self.reasons:
+                setattr(self.intents, name, True)
+            self.member_cache_flags = discord.MemberCacheFlags.none()
+            # VC の在室者一覧（vc.members）にはボイス状態のキャッシュが要る
+            self.member_cache_flags.voice = self.intents.voice_states
+            # チャンクするギルドがあるなら、その一覧を参加・退出に追従させる
+            self.member_cache_flags.joined = self.intents.members and (config is None or bool(chunk_targets(config, cogs)))
+            self.chunk_at_startup = False
+            # 削除・編集はすべて raw イベントと自前のキャッシュで扱っている
+            self.max_messages = max_messages
+        self._chunking = {}   # guild_id → asyncio.Task
+        self._chunk_lock = asyncio.Lock()
+
+        # 統計
+        self.chunked = 0
+        self.chunk_failures = 0
+
+    def bot_options(self) -> dict:
+        return {
+            "intents": self.intents,
+            "member_cache_flags": self.member_cache_flags,
+            "chunk_guilds_at_startup": self.chunk_at_startup,
+            "max_messages": self.max_messages,
+        }
+
+    def missing(self, config: dict) -> list:
+        """現在の config で必要なのに有効になっていないインテント名"""
+        if self.mode == "full":
+            return []
+        return sorted(name for name in required_intents(config, self.cogs) if not getattr(self.intents, name))
+
+    # ---------- 遅延チャンク ----------
+    def request_chunk(self, guild: discord.Guild):
+        """guild のメンバー一覧をバックグラウンドで取得する（待たない・重複しない）
+
+        メンション解決・監査ログなど、メンバー一覧が要る処理が自分のギルドについて呼ぶ。
+        """
+        if not self.intents.members or guild.chunked:
+            return
+        task = self._chunking.get(guild.id)
+        if task is None or task.done():
+            self._chunking[guild.id] = asyncio.create_task(self._chunk(guild))
+
+    async def _chunk(self, guild: discord.Guild):
+        # ゲートウェイの送信枠を圧迫しないよう1ギルドずつ
+        async with self._chunk_lock:
+            if guild.chunked:
+                return
+            try:
+                await guild.chunk(cache=True)
+                self.chunked += 1
+            except Exception as e:
+                self.chunk_failures += 1
+                print(f"[WARN] メンバー一覧の取得失敗 ({guild.id}): {e}")
+
+    # ---------- 統計 ----------
+    def stats(self, bot) -> dict:
+        guilds = bot.guilds
+        with open("/proc/self/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return {
+            "mode": self.mode,
+            "intents": sorted(name for name, on in self.intents if on),
+            "member_cache": sorted(name for name, on in self.member_cache_flags if on),
+            "max_messages": self.max_messages,
+            "guilds": len(guilds),
+            "chunked_guilds": sum(1 for g in guilds if g.chunked),
+            "cached_members": sum(len(g.members) for g in guilds),
+            "users": len(bot.users),
+            "voice_states": sum(len(vc.voice_states) for g in guilds for vc in g.voice_channels),
+            "cached_messages": len(bot.cached_messages),
+            "chunk_requests": self.chunked,
+            "chunk_failures": self.chunk_failures,
+            "rss_mib": round(rss_pages * resource.getpagesize() / 1024 / 1024, 1),
+            # Linux では KiB 単位
+            "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
@@ -0,0 +1,138 @@
+# utils/mention_resolver.py
+import asyncio
+import re
+import time
+from collections import OrderedDict
+import discord
+
+MEMBER_CACHE_SIZE = 5000
+MEMBER_TTL_SECONDS = 600      # fetch_member で取れたメンバーを使い回す時間
+NEGATIVE_TTL_SECONDS = 300    # 「転送先に居ない」結果を覚えておく時間
+ERROR_TTL_SECONDS = 30        # 取得エラー（404 以外）のときはすぐ再確認する
+
+# <@123> / <@!123>（ユーザー）と <@&123>（ロール）を1つの正規表現で拾う
+MENTION_PATTERN = re.compile(r"<@(!?|&)(\d+)>")
+
+
+def rewrite_mentions(text: str, users: dict, roles: dict) -> str:
+    """本文中のメンションを1回の走査で置き換える（対応表に無いものはそのまま）"""
+    if not text or "<@" not in text:
+        return text
+
+    def repl(match):
+        table = roles if match.group(1) == "&" else users
+        return table.get(int(match.group(2)), match.group(0))
+
+    return MENTION_PATTERN.sub(repl, text)
+
+
+class MentionResolver:
+    """転送元のメンションを転送先サーバーのメンバー・ロールに対応付ける
+
+    メンバーはまずゲートウェイのキャッシュを見て、無ければ fetch_member する。
+    その結果は「居なかった」ことも含めて LRU+TTL で覚えるので、同じ人へのメンションが
+    続いても REST は1回で済む。ロールは名前 → ロールの索引をサーバーごとに持ち、
+    ロールの作成・変更・削除イベントで作り直す。
+    """
+
+    def __init__(self):
+        self._members = OrderedDict()  # (guild_id, user_id) → (Member または None, 期限)
+        self._inflight = {}            # (guild_id, user_id) → asyncio.Task
+        self._roles_by_name = {}       # guild_id → {ロール名: Role}
+
+        # 統計
+        self.gateway_hits = 0
+        self.cache_hits = 0
+        self.negative_hits = 0
+        self.fetches = 0
+        self.role_index_builds = 0
+
+    # ---------- メンバー ----------
+    async def member(self, guild: discord.Guild, user_id: int):
+        member = guild.get_member(user_id)
+        if member:
+            self.gateway_hits += 1
+            return member
+
+        key = (guild.id, user_id)
+        entry = self._members.get(key)
+        if entry and entry[1] > time.monotonic():
+            self._members.move_to_end(key)
+            if entry[0] is None:
+                self.negative_hits += 1
+            else:
+                self.cache_hits += 1
+            return entry[0]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(guild, user_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, guild: discord.Guild, user_id: int):
+        self.fetches += 1
+        try:
+            member = await guild.fetch_member(user_id)
+            ttl = MEMBER_TTL_SECONDS
+        except discord.NotFound:
+            member, ttl = None, NEGATIVE_TTL_SECONDS
+        except Exception:
+            member, ttl = None, ERROR_TTL_SECONDS
+        self._remember(guild.id, user_id, member, ttl)
+        return member
+
+    def _remember(self, guild_id: int, user_id: int, member, ttl: float):
+        key = (guild_id, user_id)
+        self._members[key] = (member, time.monotonic() + ttl)
+        self._members.move_to_end(key)
+        while len(self._members) > MEMBER_CACHE_SIZE:
+            self._members.popitem(last=False)
+
+    def forget_member(self, guild_id: int, user_id: int):
+        """参加・退出時に呼ぶ（「居ない」結果が残り続けないように）"""
+        self._members.pop((guild_id, user_id), None)
+
+    # ---------- ロール ----------
+    def role(self, guild: discord.Guild, role: discord.Role):
+        """同じ ID のロールがあればそれを、無ければ同じ名前のロールを返す"""
+        found = guild.get_role(role.id)
+        if found:
+            return found
+        index = self._roles_by_name.get(guild.id)
+        if index is None:
+            index = {}
+            for r in guild.roles:
+                index.setdefault(r.name, r)  # 同名が複数ある場合は utils.get と同じく先頭を使う
+            self._roles_by_name[guild.id] = index
+            self.role_index_builds += 1
+        return index.get(role.name)
+
+    def invalidate_roles(self, guild_id: int):
+        self._roles_by_name.pop(guild_id, None)
+
+    # ---------- まとめて解決 ----------
+    async def resolve(self, message: discord.Message, dest_guild: discord.Guild):
+        """転送元のメンションに対応する転送先のメンバー・ロールを {転送元ID: 転送先} で返す"""
+        users = list({user.id: user for user in message.mentions}.values())
+        found = await asyncio.gather(*(self.member(dest_guild, user.id) for user in users))
+        members = {user.id: member for user, member in zip(users, found) if member}
+
+        roles = {}
+        for role in message.role_mentions:
+            dest_role = self.role(dest_guild, role)
+            if dest_role:
+                roles[role.id] = dest_role
+        return members, roles
+
+    def stats(self) -> dict:
+        return {
+            "cached_members": len(self._members),
+            "gateway_hits": self.gateway_hits,
+            "cache_hits": self.cache_hits,
+            "negative_hits": self.negative_hits,
+            "fetches": self.fetches,
+            "role_indexes": len(self._roles_by_name),
+            "role_index_builds": self.role_index_builds,
+        }
@@ -0,0 +1,252 @@
+# utils/message_cache.py
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# 環境変数で調整できる（Render の小さいインスタンス向けに既定は控えめ）
+MEMORY_BUDGET_BYTES = int(os.getenv("AUDIT_CACHE_BYTES", 8 * 1024 * 1024))
+MEMORY_TTL_SECONDS = 6 * 3600
+SPILL_ENABLED = os.getenv("AUDIT_CACHE_SPILL", "1") != "0"
+DISK_PATH = os.path.join("data", "audit_cache.sqlite3")
+DISK_TTL_SECONDS = int(os.getenv("AUDIT_CACHE_DAYS", 3)) * 24 * 3600
+PRUNE_EVERY = 1000   # ディスクへこの件数書くごとに期限切れを消す
+SQL_BATCH = 500      # IN (...) に渡す ID の最大数
+FLUSH_INTERVAL_SECONDS = 2.0   # 追い出した記録をまとめてディスクへ書く間隔
+FLUSH_MAX_ROWS = 200           # これだけ溜まったら待たずに書く
+
+
+class CachedMessage:
+    """削除時の復元に必要な分だけを持つメッセージ記録"""
+
+    __slots__ = ("message_id", "channel_id", "author_id", "author", "content", "attachments", "created_at")
+
+    def __init__(self, message_id: int, channel_id: int, author_id: int, author: str, content: str, attachments: tuple, created_at: float):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.author = author
+        self.content = content
+        self.attachments = attachments  # ((url, content_type), ...)
+        self.created_at = created_at
+
+    @classmethod
+    def from_message(cls, message):
+        return cls(
+            message.id,
+            message.channel.id,
+            message.author.id,
+            message.author.display_name,
+            message.content,
+            tuple((a.url, a.content_type) for a in message.attachments),
+            time.time(),
+        )
+
+    def size(self) -> int:
+        """おおよその使用バイト数（予算の計算用）"""
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.content)
+            + sys.getsizeof(self.author)
+            + sum(len(url) + len(kind or "") + 120 for url, kind in self.attachments)
+        )
+
+
+class MessageCache:
+    """監査ログ用のメッセージキャッシュ（メモリ LRU ＋ 任意の SQLite 退避）
+
+    メモリ上の記録は MEMORY_BUDGET_BYTES と MEMORY_TTL_SECONDS を超えたものから追い出し、
+    退避が有効なら SQLite に移す。ディスク上は DISK_TTL_SECONDS まで残るので、
+    数日前のメッセージの削除でも内容を復元できる。停止時はメモリ上の分もディスクへ書く。
+    SQLite への書き込み・検索は AuditStore と同じくスレッドで行い、追い出した記録は
+    FLUSH_INTERVAL_SECONDS ごとにまとめて1回のコミットで書く（書くまでの間もメモリから引ける）。
+    """
+
+    def __init__(self, budget: int = MEMORY_BUDGET_BYTES, ttl: float = MEMORY_TTL_SECONDS, spill_path: str = DISK_PATH if SPILL_ENABLED else None):
+        self.budget = budget
+        self.ttl = ttl
+        self._entries = OrderedDict()  # message_id → CachedMessage（古い順）
+        self._sizes = {}
+        self.bytes = 0
+        self._spilling = {}            # message_id → CachedMessage（追い出し済み・未書き込み）
+        self._task = None
+        self._flush_now = None
+        # 書き込みと検索が前後しないよう、ディスク操作は1つずつ行う
+        self._io_lock = asyncio.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._since_prune = 0
+        if spill_path:
+            os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(spill_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " message_id INTEGER PRIMARY KEY,"
+                " channel_id INTEGER NOT NULL,"
+                " author TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " attachments TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS messages_created ON messages (created_at)")
+            try:
+                # 投稿者IDの列が無い古いファイル向け
+                self._db.execute("ALTER TABLE messages ADD COLUMN author_id INTEGER")
+            except sqlite3.OperationalError:
+                pass
+            self._db.commit()
+
+        # 統計
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.spilled = 0
+        self.batches = 0
+
+    # ---------- 追加 ----------
+    def put(self, message):
+        record = CachedMessage.from_message(message)
+        self._discard(record.message_id)
+        self._spilling.pop(record.message_id, None)
+        size = record.size()
+        self._entries[record.message_id] = record
+        self._sizes[record.message_id] = size
+        self.bytes += size
+        self._evict()
+
+    def _discard(self, message_id: int):
+        if message_id in self._entries:
+            del self._entries[message_id]
+            self.bytes -= self._sizes.pop(message_id)
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            message_id, record = next(iter(self._entries.items()))
+            if self.bytes <= self.budget and record.created_at >= cutoff:
+                break
+            self._discard(message_id)
+            self.evicted += 1
+            if self._db is not None:
+                self._spilling[message_id] = record
+        if not self._spilling:
+            return
+        if len(self._spilling) >= FLUSH_MAX_ROWS:
+            if self._flush_now is None or self._flush_now.done():
+                self._flush_now = asyncio.create_task(self.flush())
+        elif self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        await self.flush()
+
+    async def flush(self):
+        """追い出した記録をまとめてディスクへ書く"""
+        async with self._io_lock:
+            records, self._spilling = list(self._spilling.values()), {}
+            if records:
+                await asyncio.to_thread(self._spill, records)
+
+    def _spill(self, records: list):
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO messages (message_id, channel_id, author, content, attachments, created_at, author_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (r.message_id, r.channel_id, r.author, r.content, "\n".join(f"{url}\t{kind or ''}" for url, kind in r.attachments), r.created_at, r.author_id)
+                    for r in records
+                ],
+            )
+            self._db.commit()
+            self.spilled += len(records)
+            self.batches += 1
+            self._since_prune += len(records)
+            if self._since_prune >= PRUNE_EVERY:
+                self._since_prune = 0
+                self._db.execute("DELETE FROM messages WHERE created_at < ?", (time.time() - DISK_TTL_SECONDS,))
+                self._db.commit()
+
+    # ---------- 取り出し（削除時） ----------
+    async def pop_many(self, message_ids) -> dict:
+        """{message_id: CachedMessage} を返し、キャッシュからは取り除く（ディスクは1回の IN 検索でまとめて引く）"""
+        found = {}
+        missing = []
+        for message_id in message_ids:
+            record = self._entries.get(message_id)
+            if record:
+                self._discard(message_id)
+            else:
+                record = self._spilling.pop(message_id, None)
+            if record:
+                found[message_id] = record
+                self.memory_hits += 1
+            else:
+                missing.append(message_id)
+
+        if missing and self._db is not None:
+            async with self._io_lock:
+                rows = await asyncio.to_thread(self._take, missing)
+            for message_id, channel_id, author_id, author, content, attachments, created_at in rows:
+                parsed = tuple(tuple(line.split("\t", 1)) for line in attachments.split("\n") if line)
+                found[message_id] = CachedMessage(message_id, channel_id, author_id, author, content, parsed, created_at)
+                self.disk_hits += 1
+        self.misses += len(message_ids) - len(found)
+        return found
+
+    def _take(self, message_ids: list) -> list:
+        rows = []
+        with self._db_lock:
+            for i in range(0, len(message_ids), SQL_BATCH):
+                batch = message_ids[i:i + SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows += self._db.execute(
+                    f"SELECT message_id, channel_id, author_id, author, content, attachments, created_at FROM messages WHERE message_id IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                self._db.execute(f"DELETE FROM messages WHERE message_id IN ({placeholders})", batch)
+            self._db.commit()
+        return rows
+
+    async def pop(self, message_id: int):
+        return (await self.pop_many([message_id])).get(message_id)
+
+    async def close(self):
+        """停止時: メモリ上の記録もディスクへ移す"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        if self._db is not None:
+            self._spilling.update(self._entries)
+        self._entries.clear()
+        self._sizes.clear()
+        self.bytes = 0
+        if self._db is not None:
+            await self.flush()
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        disk_rows = 0
+        if self._db is not None:
+            with self._db_lock:
+                disk_rows = self._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "budget": self.budget,
+            "unwritten": len(self._spilling),
+            "disk_rows": disk_rows,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "spilled": self.spilled,
+            "batches": self.batches,
+        }
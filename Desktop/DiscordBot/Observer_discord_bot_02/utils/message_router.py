@@ -0,0 +1,144 @@
+# utils/message_router.py
+import asyncio
+import time
+import discord
+
+ALL_CHANNELS = None  # channels() がこれを返すと、そのサーバーの全チャンネルが対象
+
+
+class _Feature:
+    __slots__ = ("name", "channels", "handler", "calls", "errors", "seconds")
+
+    def __init__(self, name: str, channels, handler):
+        self.name = name
+        self.channels = channels
+        self.handler = handler
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+
+class MessageRouter:
+    """全メッセージの入口（bot の on_message はこれだけ）
+
+    Bot・DM の除外とコマンド処理を1回だけ行い、そのあと事前計算した
+    「サーバー → チャンネル → 機能」の表を1回引いて、有効な機能にだけ渡す。
+    どの機能も有効でないサーバーのメッセージは dict を1回引くだけで終わる。
+
+    各 Cog は register() で機能を登録する。channels(guild_id) は
+    そのサーバーで対象とするチャンネルIDの集合（ALL_CHANNELS なら全チャンネル、空なら無効）を返す。
+    表は設定が変わったとき（config_manager.version が進んだとき）に作り直す。
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._features = {}   # 機能名 → _Feature
+        self._table = {}      # guild_id → {channel_id または ALL_CHANNELS: (_Feature, ...)}
+        self._table_version = None
+        # ループはタスクを弱参照でしか持たないので、実行中の処理はここで保持する
+        self._tasks = set()
+
+        # 統計
+        self.received = 0
+        self.ignored = 0
+        self.unrouted = 0
+        self.commands = 0
+        self.rebuilds = 0
+
+    def register(self, name: str, channels, handler):
+        """channels(guild_id) -> set | ALL_CHANNELS、handler(message) はコルーチン関数"""
+        self._features[name] = _Feature(name, channels, handler)
+        self._table_version = None
+
+    def unregister(self, name: str):
+        if self._features.pop(name, None):
+            self._table_version = None
+
+    def invalidate(self):
+        self._table_version = None
+
+    # ---------- 表の作成 ----------
+    def _routes(self):
+        config_manager = getattr(self.bot, "config_manager", None)
+        version = getattr(config_manager, "version", 0)
+        if version != self._table_version:
+            self._table = self._build_table(config_manager)
+            self._table_version = version
+            self.rebuilds += 1
+        return self._table
+
+    def _build_table(self, config_manager) -> dict:
+        table = {}
+        if config_manager is None:
+            return table
+        guild_ids = set()
+        for pair in config_manager.config.get("server_pairs", []):
+            guild_ids.update(g for g in (pair.get("A_ID"), pair.get("B_ID")) if g is not None)
+        for guild_id in guild_ids:
+            routes = {}
+            for feature in self._features.values():
+                channels = feature.channels(guild_id)
+                if channels is ALL_CHANNELS:
+                    routes.setdefault(ALL_CHANNELS, []).append(feature)
+                    continue
+                for channel_id in channels:
+                    routes.setdefault(channel_id, []).append(feature)
+            if routes:
+                table[guild_id] = {key: tuple(features) for key, features in routes.items()}
+        return table
+
+    # ---------- 受信 ----------
+    async def on_message(self, message: discord.Message):
+        self.received += 1
+        if message.author.bot:
+            self.ignored += 1
+            return
+
+        # コマンドはここで1回だけ処理する（DM のコマンドもここで受ける）
+        ctx = await self.bot.get_context(message)
+        if ctx.valid:
+            self.commands += 1
+            await self.bot.invoke(ctx)
+
+        if not message.guild:
+            self.ignored += 1
+            return
+        routes = self._routes().get(message.guild.id)
+        if not routes:
+            self.unrouted += 1
+            return
+        features = routes.get(message.channel.id, ()) + routes.get(ALL_CHANNELS, ())
+        if not features:
+            self.unrouted += 1
+            return
+        for feature in features:
+            # 機能ごとに別タスク（1つの機能の待ちが他を止めない）。作成順に走り出すので順序は保たれる
+            task = asyncio.create_task(self._run(feature, message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, feature: _Feature, message: discord.Message):
+        feature.calls += 1
+        started = time.perf_counter()
+        try:
+            await feature.handler(message)
+        except Exception as e:
+            feature.errors += 1
+            print(f"[WARN] {feature.name} の処理失敗: {e}")
+        finally:
+            feature.seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "ignored": self.ignored,
+            "unrouted": self.unrouted,
+            "commands": self.commands,
+            "routed_guilds": len(self._routes()),
+            "rebuilds": self.rebuilds,
+            "running": len(self._tasks),
+            "features": {
+                f.name: {"calls": f.calls, "errors": f.errors, "avg_ms": round(f.seconds / f.calls * 1000, 2) if f.calls else 0.0}
+                for f in self._features.values()
+            },
+        }
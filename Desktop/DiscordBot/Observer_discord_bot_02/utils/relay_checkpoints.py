@@ -0,0 +1,73 @@
+# utils/relay_checkpoints.py
+import asyncio
+
+SAVE_DELAY_SECONDS = 5.0
+
+
+class RelayCheckpoints:
+    """転送元チャンネルごとの「最後に転送したメッセージID」
+
+    live     : 通常の転送（on_message / 起動時の追いつき）の到達点
+    backfill : backfill コマンドの途中経過 {"after": 次に読む位置, "before": 終端, "relayed": 件数}
+
+    Render のディスクは再デプロイで消えるので、設定と一緒に config（relay_checkpoints /
+    backfill_state）へ持ち、ConfigManager のジャーナル経由で Drive に保存する。
+    メッセージごとにジャーナルへ積まないよう、変更は SAVE_DELAY_SECONDS ごとにまとめて渡す。
+    起動直後は、追いつきが Drive から読んだ到達点を開始位置として確定する（release()）まで
+    ライブ転送の到達点を config に渡さない。先に渡すと停止中の区間を飛ばしてしまう。
+    """
+
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
+        self._live = {}       # channel_id → まだ config に渡していない到達点
+        self._backfill = {}   # channel_id → まだ config に渡していない途中経過（None は削除）
+        self._task = None
+        self._held = True
+
+    def release(self):
+        """追いつきの開始位置が決まった後に呼ぶ。以後はライブ転送の到達点も config に渡す"""
+        self._held = False
+        self.save()
+
+    def get(self, channel_id: int):
+        known = [v for v in (self._live.get(channel_id), self.config_manager.get_relay_checkpoint(channel_id)) if v]
+        return max(known) if known else None
+
+    def advance(self, channel_id: int, message_id: int):
+        """到達点を進める（戻すことはしない）"""
+        if message_id > (self.get(channel_id) or 0):
+            self._live[channel_id] = message_id
+            self._mark()
+
+    def get_backfill(self, channel_id: int):
+        if channel_id in self._backfill:
+            return self._backfill[channel_id]
+        return self.config_manager.get_backfill_state(channel_id)
+
+    def set_backfill(self, channel_id: int, state):
+        self._backfill[channel_id] = dict(state) if state is not None else None
+        self._mark()
+
+    def _mark(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(SAVE_DELAY_SECONDS)
+        self.save()
+
+    def save(self):
+        """溜まっている変更を config に渡す（ファイル・Drive への書き込みは ConfigPersister が行う）"""
+        live = {}
+        if not self._held:
+            live, self._live = self._live, {}
+        backfill, self._backfill = self._backfill, {}
+        for channel_id, message_id in live.items():
+            self.config_manager.advance_relay_checkpoint(channel_id, message_id)
+        for channel_id, state in backfill.items():
+            self.config_manager.set_backfill_state(channel_id, state)
+
+    def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self.save()
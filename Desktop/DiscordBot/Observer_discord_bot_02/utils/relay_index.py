@@ -0,0 +1,118 @@
+# utils/relay_index.py
+import os
+import sqlite3
+import time
+
+INDEX_PATH = os.path.join("data", "relay_index.sqlite3")
+MAX_AGE_SECONDS = 14 * 24 * 3600   # これより古い転送は編集・削除を追わない
+MAX_ROWS = 200_000
+PRUNE_EVERY = 500                  # この件数を記録するごとに古い行を消す
+
+# 転送で送った1通の種類（Embed 本体 / Webhook 本体 / 添付 / リンク / メンション通知）
+KIND_EMBED = "embed"
+KIND_WEBHOOK = "webhook"
+KIND_FILE = "file"
+KIND_LINKS = "links"
+KIND_MENTION = "mention"
+BODY_KINDS = (KIND_EMBED, KIND_WEBHOOK)
+
+
+class RelayIndex:
+    """転送元メッセージID → 転送先に送ったメッセージID の対応表（SQLite）
+
+    主キーが (source_id, dest_message_id) なので、編集・削除イベントからの検索は
+    インデックス1回で済み、履歴をさかのぼる必要はない。
+    MAX_AGE_SECONDS より古い行と MAX_ROWS を超えた分は定期的に消す。
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS relayed ("
+            " source_id INTEGER NOT NULL,"
+            " dest_channel_id INTEGER NOT NULL,"
+            " dest_message_id INTEGER NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (source_id, dest_message_id)"
+            ") WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS relayed_created ON relayed (created_at)")
+        self._db.commit()
+        self._since_prune = 0
+
+        # 統計
+        self.lookups = 0
+        self.lookup_hits = 0
+        self.lookup_seconds = 0.0
+        self.lookup_max_seconds = 0.0
+        self.pruned = 0
+
+    def add(self, source_id: int, dest_channel_id: int, dest_message_id: int, kind: str):
+        self._db.execute(
+            "INSERT OR REPLACE INTO relayed VALUES (?, ?, ?, ?, ?)",
+            (source_id, dest_channel_id, dest_message_id, kind, time.time()),
+        )
+        self._db.commit()
+        self._since_prune += 1
+        if self._since_prune >= PRUNE_EVERY:
+            self.prune()
+
+    def lookup(self, source_id: int) -> list:
+        """[(dest_channel_id, dest_message_id, kind), ...] を送った順で返す"""
+        started = time.perf_counter()
+        rows = self._db.execute(
+            "SELECT dest_channel_id, dest_message_id, kind FROM relayed WHERE source_id = ? ORDER BY dest_message_id",
+            (source_id,),
+        ).fetchall()
+        elapsed = time.perf_counter() - started
+        self.lookups += 1
+        self.lookup_hits += bool(rows)
+        self.lookup_seconds += elapsed
+        self.lookup_max_seconds = max(self.lookup_max_seconds, elapsed)
+        return rows
+
+    def body(self, source_id: int, dest_channel_id: int):
+        """返信先として使う本体メッセージ（Embed / Webhook）の ID。無ければ None"""
+        for channel_id, message_id, kind in self.lookup(source_id):
+            if channel_id == dest_channel_id and kind in BODY_KINDS:
+                return message_id
+        return None
+
+    def remove(self, source_id: int):
+        self._db.execute("DELETE FROM relayed WHERE source_id = ?", (source_id,))
+        self._db.commit()
+
+    def prune(self):
+        self._since_prune = 0
+        cur = self._db.execute("DELETE FROM relayed WHERE created_at < ?", (time.time() - MAX_AGE_SECONDS,))
+        removed = cur.rowcount
+        count = self._db.execute("SELECT COUNT(*) FROM relayed").fetchone()[0]
+        if count > MAX_ROWS:
+            cur = self._db.execute(
+                "DELETE FROM relayed WHERE created_at <= ("
+                " SELECT created_at FROM relayed ORDER BY created_at LIMIT 1 OFFSET ?)",
+                (count - MAX_ROWS - 1,),
+            )
+            removed += cur.rowcount
+        self._db.commit()
+        self.pruned += removed
+
+    def close(self):
+        self._db.close()
+
+    def stats(self) -> dict:
+        rows = self._db.execute("SELECT COUNT(*) FROM relayed").fetchone()[0]
+        return {
+            "rows": rows,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "lookups": self.lookups,
+            "hit_rate": round(self.lookup_hits / self.lookups, 3) if self.lookups else 0.0,
+            "avg_lookup_us": round(self.lookup_seconds / self.lookups * 1e6, 1) if self.lookups else 0.0,
+            "max_lookup_us": round(self.lookup_max_seconds * 1e6, 1),
+            "pruned": self.pruned,
+        }
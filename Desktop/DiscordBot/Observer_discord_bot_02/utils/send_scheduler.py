@@ -0,0 +1,319 @@
+# utils/send_scheduler.py
+import asyncio
+import re
+import time
+import aiohttp
+import discord
+
+# Discord のメッセージ送信は 1チャンネルあたり 5件/5秒 が基本
+DEFAULT_BUCKET_LIMIT = 5
+DEFAULT_BUCKET_WINDOW = 5.0
+IDLE_WORKER_SECONDS = 30     # 空のキューのワーカーを止めるまでの時間
+TICKET_TIMEOUT_SECONDS = 120  # 予約したまま閉じられないチケットを諦めるまでの時間
+MAX_RATE_LIMIT_RETRIES = 3
+
+# レスポンスの URL から送信先を特定する（チャンネル宛て・Webhook 宛て）
+_CHANNEL_ROUTE = re.compile(r"/channels/(\d+)/messages")
+_WEBHOOK_ROUTE = re.compile(r"/webhooks/(\d+)/")
+
+
+class TokenBucket:
+    """送信先ごとの残り枠。成功・429 どちらのレスポンスのヘッダーでも補正する"""
+
+    __slots__ = ("limit", "window", "tokens", "updated", "blocked_until")
+
+    def __init__(self, limit: int = DEFAULT_BUCKET_LIMIT, window: float = DEFAULT_BUCKET_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / self.window)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.window / self.limit)
+
+    def learn(self, headers=None, retry_after: float = None):
+        """X-RateLimit-* ヘッダーの値に合わせる。残りが 0 ならリセットまで、retry_after があればその間止める"""
+        if headers:
+            try:
+                self.limit = max(1, int(headers.get("X-RateLimit-Limit", self.limit)))
+                reset_after = float(headers.get("X-RateLimit-Reset-After", 0))
+                remaining = headers.get("X-RateLimit-Remaining")
+                if reset_after > 0:
+                    self.window = max(self.window, reset_after)
+                if remaining is not None:
+                    now = time.monotonic()
+                    refilled = self.tokens + (now - self.updated) * self.limit / self.window
+                    self.tokens = min(self.limit, refilled, float(remaining))
+                    self.updated = now
+                    if int(remaining) <= 0 and reset_after > 0:
+                        retry_after = max(retry_after or 0, reset_after)
+            except (TypeError, ValueError):
+                pass
+        if retry_after:
+            self.tokens = 0
+            self.blocked_until = time.monotonic() + retry_after
+
+
+class Ticket:
+    """送信先キュー内の順番を先に確保したもの
+
+    reserve() した時点で順番が決まり、中身（send / call）は後から積める。
+    ワーカーは close() されるまで次のチケットへ進まないので、
+    転送の準備（添付の取得など）に時間がかかっても同じ送信先への順序は崩れない。
+    """
+
+    def __init__(self):
+        self._jobs = asyncio.Queue()
+        self.futures = []   # 積んだ順の送信結果（呼び出し側が全件の完了を待つのに使う）
+        self.closed = False
+        self.abandoned = False
+
+    def call(self, func, *args, **kwargs) -> asyncio.Future:
+        """任意の送信コルーチン関数（webhook.send など）を順番に実行する
+
+        レート制限で再試行するときは同じ引数でもう一度呼ぶ（引数の discord.File は開き直す）。
+        添付をクロージャ内に持つ関数は、呼ばれるたびに File を作り直すこと。
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_log_failure)
+        self.futures.append(future)
+        if self.abandoned:
+            _fail(future, args, kwargs)
+            return future
+        self._jobs.put_nowait((func, args, kwargs, future, time.monotonic()))
+        return future
+
+    def send(self, channel, *args, **kwargs) -> asyncio.Future:
+        return self.call(channel.send, *args, **kwargs)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._jobs.put_nowait(None)
+
+    def abandon(self) -> int:
+        """ワーカーが諦めたチケット: 積まれている分も以後積まれる分も失敗させる → 失敗させた件数"""
+        self.abandoned = True
+        self.closed = True
+        count = 0
+        while not self._jobs.empty():
+            job = self._jobs.get_nowait()
+            if job is not None:
+                _fail(job[3], job[1], job[2])
+                count += 1
+        return count
+
+
+def _log_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception():
+        print(f"[WARN] 送信失敗: {future.exception()}")
+
+
+def _fail(future: asyncio.Future, args: tuple, kwargs: dict):
+    """送らずに終わるジョブ: future を失敗させ、渡された discord.File を閉じる"""
+    files = [a for a in args if isinstance(a, discord.File)]
+    if isinstance(kwargs.get("file"), discord.File):
+        files.append(kwargs["file"])
+    files.extend(f for f in kwargs.get("files") or () if isinstance(f, discord.File))
+    for file in files:
+        file.close()
+    if not future.done():
+        future.set_exception(asyncio.TimeoutError("送信チケットが閉じられないまま破棄されました"))
+
+
+def _reopen_files(args: tuple, kwargs: dict):
+    """再試行の前に、送信で閉じられた discord.File をパスから開き直した (args, kwargs) を返す
+
+    discord.py は送信が失敗しても添付を閉じるので、同じ File では送り直せない。
+    パス以外（BytesIO など）から作った File は開き直せないので None を返す（再試行しない）。
+    """
+    def reopen(file: discord.File):
+        if not file.fp.closed:
+            file.reset()
+            return file
+        path = getattr(file.fp, "name", None)
+        if not isinstance(path, str):
+            return None
+        return discord.File(path, filename=file.filename, description=file.description)
+
+    values = list(args)
+    kwargs = dict(kwargs)
+    for i, value in enumerate(values):
+        if isinstance(value, discord.File):
+            values[i] = reopen(value)
+            if values[i] is None:
+                return None
+    if isinstance(kwargs.get("file"), discord.File):
+        kwargs["file"] = reopen(kwargs["file"])
+        if kwargs["file"] is None:
+            return None
+    if kwargs.get("files"):
+        files = [reopen(f) if isinstance(f, discord.File) else f for f in kwargs["files"]]
+        if None in files:
+            return None
+        kwargs["files"] = files
+    return tuple(values), kwargs
+
+
+class _DestinationQueue:
+    __slots__ = ("tickets", "bucket", "worker", "sent", "wait_total", "wait_max", "last_wait")
+
+    def __init__(self):
+        self.tickets = asyncio.Queue()
+        self.bucket = TokenBucket()
+        self.worker = None
+        self.sent = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.last_wait = 0.0
+
+
+class SendScheduler:
+    """送信先チャンネルごとの順序付きキュー
+
+    イベントハンドラは送信を積むだけで待たないので、混雑した送信先の 429 待ちが
+    他の送信先や他のイベント処理を止めることはない。送信先ごとにワーカーが1つずつ
+    並列に動き、同じ送信先の中では積んだ順に送られる。
+    """
+
+    def __init__(self):
+        self._queues = {}  # channel_id → _DestinationQueue
+        self._webhook_channels = {}  # webhook_id → channel_id（レスポンスのヘッダーを送信先に結び付ける）
+        self.abandoned_jobs = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Bot の HTTP セッションに付ける（commands.Bot(http_trace=...)）
+
+        discord.py は成功したレスポンスのヘッダーを返さないので、aiohttp のトレースで
+        送信先チャンネル・Webhook 宛てのレスポンスを見て、429 を受ける前から枠を合わせる。
+        """
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self._on_request_end)
+        return trace
+
+    async def _on_request_end(self, session, context, params: aiohttp.TraceRequestEndParams):
+        path = params.url.path
+        match = _CHANNEL_ROUTE.search(path)
+        if match:
+            channel_id = int(match.group(1))
+        else:
+            match = _WEBHOOK_ROUTE.search(path)
+            channel_id = self._webhook_channels.get(int(match.group(1))) if match else None
+        state = self._queues.get(channel_id)
+        if state is not None and "X-RateLimit-Remaining" in params.response.headers:
+            state.bucket.learn(headers=params.response.headers)
+
+    def reserve(self, channel) -> Ticket:
+        state = self._queues.get(channel.id)
+        if state is None:
+            state = self._queues[channel.id] = _DestinationQueue()
+        ticket = Ticket()
+        state.tickets.put_nowait(ticket)
+        if state.worker is None or state.worker.done():
+            state.worker = asyncio.create_task(self._worker(channel.id, state))
+        return ticket
+
+    def reserve_call(self, channel, func, *args, **kwargs) -> asyncio.Future:
+        """channel 宛ての API 呼び出し（編集・削除など）を1件だけ積む"""
+        ticket = self.reserve(channel)
+        future = ticket.call(func, *args, **kwargs)
+        ticket.close()
+        return future
+
+    def send(self, channel, *args, **kwargs) -> asyncio.Future:
+        """1件だけ送る場合の省略形"""
+        return self.reserve_call(channel, channel.send, *args, **kwargs)
+
+    async def _worker(self, channel_id: int, state: _DestinationQueue):
+        while True:
+            try:
+                ticket = await asyncio.wait_for(state.tickets.get(), IDLE_WORKER_SECONDS)
+            except asyncio.TimeoutError:
+                if state.tickets.empty():
+                    # await を挟まずに外すので、この後の reserve() は新しいキューを作る
+                    if self._queues.get(channel_id) is state:
+                        del self._queues[channel_id]
+                    return
+                continue
+            await self._run_ticket(channel_id, state, ticket)
+
+    async def _run_ticket(self, channel_id: int, state: _DestinationQueue, ticket: Ticket):
+        while True:
+            try:
+                job = await asyncio.wait_for(ticket._jobs.get(), TICKET_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                count = ticket.abandon()
+                self.abandoned_jobs += count
+                print(f"[WARN] 閉じられないまま放置された送信チケットを破棄しました（未送信 {count} 件）")
+                return
+            if job is None:
+                return
+            func, args, kwargs, future, enqueued_at = job
+            if future.done():
+                continue
+            webhook = getattr(func, "__self__", None)
+            if isinstance(webhook, discord.Webhook):
+                self._webhook_channels[webhook.id] = channel_id
+            wait = time.monotonic() - enqueued_at
+            state.last_wait = wait
+            state.wait_total += wait
+            state.wait_max = max(state.wait_max, wait)
+            await self._execute(state, func, args, kwargs, future)
+
+    async def _execute(self, state: _DestinationQueue, func, args, kwargs, future: asyncio.Future):
+        for _ in range(MAX_RATE_LIMIT_RETRIES + 1):
+            await state.bucket.take()
+            try:
+                result = await func(*args, **kwargs)
+            except discord.RateLimited as e:
+                # max_ratelimit_timeout を超える待ちは discord.py ではなくこちらで待つ
+                state.bucket.learn(retry_after=e.retry_after)
+                retry = _reopen_files(args, kwargs)
+            except discord.HTTPException as e:
+                if e.status != 429:
+                    future.set_exception(e)
+                    return
+                state.bucket.learn(headers=getattr(e.response, "headers", None), retry_after=1.0)
+                retry = _reopen_files(args, kwargs)
+            except Exception as e:
+                future.set_exception(e)
+                return
+            else:
+                state.sent += 1
+                future.set_result(result)
+                return
+            if retry is None:
+                future.set_exception(RuntimeError("レート制限を受けましたが、添付を開き直せないため再試行しません"))
+                return
+            args, kwargs = retry
+        future.set_exception(RuntimeError("レート制限の再試行回数を超えました"))
+
+    def depth(self, channel_id: int) -> int:
+        """channel_id 宛てで送信待ちのチケット数"""
+        state = self._queues.get(channel_id)
+        return state.tickets.qsize() if state else 0
+
+    def stats(self, top: int = 5) -> dict:
+        queues = []
+        for channel_id, state in self._queues.items():
+            depth = state.tickets.qsize()
+            queues.append({
+                "channel": channel_id,
+                "depth": depth,
+                "sent": state.sent,
+                "avg_wait": round(state.wait_total / state.sent, 3) if state.sent else 0.0,
+                "max_wait": round(state.wait_max, 3),
+            })
+        queues.sort(key=lambda q: q["depth"], reverse=True)
+        return {"destinations": len(self._queues), "abandoned_jobs": self.abandoned_jobs, "busiest": queues[:top]}
@@ -0,0 +1,103 @@
+# utils/webhook_pool.py
+import asyncio
+import time
+import discord
+
+WEBHOOK_NAME = "Observer Relay"
+# Manage Webhooks 権限が無いチャンネルを再確認するまでの時間（秒）
+UNAVAILABLE_RETRY_SECONDS = 600
+
+
+class WebhookPool:
+    """転送先チャンネルごとに Bot 所有の Webhook を1つ作って使い回す
+
+    Webhook が削除されていた場合は作り直して1回だけ再送する。
+    権限不足で使えないチャンネルはしばらく None を返し、呼び出し側は通常送信に戻す。
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._webhooks = {}     # channel_id → discord.Webhook
+        self._unavailable = {}  # channel_id → 再確認する時刻（monotonic）
+        self._locks = {}        # channel_id → asyncio.Lock（同時に二重作成しない）
+
+        # 統計
+        self.created = 0
+        self.reused = 0
+        self.recovered = 0
+        self.fallbacks = 0
+
+    async def get(self, channel: discord.TextChannel):
+        webhook = self._webhooks.get(channel.id)
+        if webhook:
+            return webhook
+        retry_at = self._unavailable.get(channel.id)
+        if retry_at and time.monotonic() < retry_at:
+            return None
+        if not channel.permissions_for(channel.guild.me).manage_webhooks:
+            self._mark_unavailable(channel.id)
+            return None
+
+        lock = self._locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            webhook = self._webhooks.get(channel.id)
+            if webhook:
+                return webhook
+            try:
+                for existing in await channel.webhooks():
+                    if existing.name == WEBHOOK_NAME and existing.token and existing.user and existing.user.id == self.bot.user.id:
+                        webhook = existing
+                        self.reused += 1
+                        break
+                if webhook is None:
+                    webhook = await channel.create_webhook(name=WEBHOOK_NAME, reason="転送用 Webhook")
+                    self.created += 1
+            except discord.Forbidden:
+                self._mark_unavailable(channel.id)
+                return None
+            self._webhooks[channel.id] = webhook
+            self._unavailable.pop(channel.id, None)
+            return webhook
+
+    def invalidate(self, channel_id: int):
+        self._webhooks.pop(channel_id, None)
+
+    def _mark_unavailable(self, channel_id: int):
+        self._unavailable[channel_id] = time.monotonic() + UNAVAILABLE_RETRY_SECONDS
+        self._webhooks.pop(channel_id, None)
+
+    async def send(self, channel: discord.TextChannel, make_files=None, **kwargs):
+        """Webhook で送信して WebhookMessage を返す。Webhook が使えなければ None
+
+        make_files は添付（discord.File のリスト）を返すコルーチン関数。
+        discord.py は送信が失敗しても File を閉じるので、再送のたびに作り直す。
+        """
+        for _ in range(2):
+            webhook = await self.get(channel)
+            if webhook is None:
+                self.fallbacks += 1
+                return None
+            if make_files:
+                kwargs["files"] = await make_files()
+            try:
+                return await webhook.send(wait=True, **kwargs)
+            except discord.NotFound:
+                # Webhook が削除されていた → 作り直して再送
+                self.invalidate(channel.id)
+                self.recovered += 1
+            except discord.Forbidden:
+                self._mark_unavailable(channel.id)
+                self.fallbacks += 1
+                return None
+        self.fallbacks += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._webhooks),
+            "unavailable": len(self._unavailable),
+            "created": self.created,
+            "reused": self.reused,
+            "recovered": self.recovered,
+            "fallbacks": self.fallbacks,
+        }